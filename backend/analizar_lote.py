@@ -0,0 +1,59 @@
+"""
+Rellena `historial_clinico.analisis_ia` con análisis de IA por lotes.
+
+Uso:
+    python analizar_lote.py --todas                        # todas las consultas sin análisis
+    python analizar_lote.py --doctor 3 --concurrencia 8
+    python analizar_lote.py --consultas 10,11,12 --reanalizar
+
+Escribe una línea NDJSON por consulta en la salida estándar (según terminan)
+y el resumen del lote en la salida de errores. Sin --reanalizar solo se
+procesan las consultas sin análisis, así que tras un corte basta con
+relanzar el mismo comando.
+"""
+import sys
+import json
+import asyncio
+import argparse
+
+from app import analisis_lote, openrouter
+
+
+async def ejecutar(filtro, concurrencia):
+    try:
+        async for linea in analisis_lote.analizar_lote(filtro, concurrencia):
+            if "resumen_lote" in linea:
+                return linea["resumen_lote"]
+            print(json.dumps(linea, ensure_ascii=False, default=str), flush=True)
+    finally:
+        await openrouter.cerrar_cliente()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consultas", type=lambda v: [int(x) for x in v.split(",") if x], help="ids separados por comas")
+    parser.add_argument("--paciente", type=int)
+    parser.add_argument("--doctor", type=int)
+    parser.add_argument("--todas", action="store_true", help="Todas las consultas (sin otro filtro)")
+    parser.add_argument("--reanalizar", action="store_true", help="Incluye las consultas que ya tienen análisis")
+    parser.add_argument("--concurrencia", type=int, default=analisis_lote.IA_LOTE_CONCURRENCIA)
+    args = parser.parse_args()
+
+    filtro = analisis_lote.FiltroLote(
+        consulta_ids=args.consultas,
+        paciente_id=args.paciente,
+        doctor_id=args.doctor,
+        todas=args.todas,
+        solo_pendientes=not args.reanalizar,
+    )
+    try:
+        resumen = asyncio.run(ejecutar(filtro, args.concurrencia))
+    except ValueError as e:
+        print(f"✗ {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(resumen, ensure_ascii=False), file=sys.stderr)
+    return 0 if resumen["errores"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
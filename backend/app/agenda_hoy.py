@@ -0,0 +1,103 @@
+# agenda_hoy.py
+"""
+Índice en memoria de las citas del día: teléfono del paciente -> citas de hoy.
+
+Se carga con una sola consulta la primera vez que se usa cada día (y se
+recarga cada AGENDA_RECARGA_S segundos) y `create_cita` / `delete_cita` lo
+mantienen al día, de modo que el check-in se resuelve con una búsqueda en
+diccionario y un UPDATE de `estado`.
+
+El índice es por proceso. Si el teléfono no está en el índice (cita creada
+desde otro worker, paciente sin cita hoy...) el check-in usa la consulta
+original contra la base de datos, así que un fallo del índice nunca da una
+respuesta distinta, solo más lenta.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from . import models
+
+AGENDA_RECARGA_S = float(os.getenv("AGENDA_RECARGA_S", 300))
+
+
+@dataclass
+class CitaHoy:
+    id: int
+    paciente_id: int
+    nombre_paciente: str
+    fecha_cita: datetime
+    estado: Optional[str] = None
+
+
+class AgendaHoy:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fecha = None
+        self._cargada_en = 0.0
+        self._por_telefono = {}  # telefono -> [CitaHoy] ordenadas por fecha_cita
+
+    def _vigente(self) -> bool:
+        return self._fecha == date.today() and time.monotonic() - self._cargada_en < AGENDA_RECARGA_S
+
+    def cargar(self, db: Session):
+        """Carga las citas de hoy (cita + paciente) con una sola consulta."""
+        hoy = date.today()
+        filas = db.execute(
+            select(models.Cita.id, models.Cita.paciente_id, models.Cita.fecha_cita, models.Cita.estado,
+                   models.Paciente.telefono, models.Paciente.nombre)
+            .join(models.Paciente, models.Paciente.id == models.Cita.paciente_id)
+            .where(models.Cita.fecha_cita >= hoy, models.Cita.fecha_cita < hoy + timedelta(days=1))
+            .order_by(models.Cita.fecha_cita)
+        ).all()
+        por_telefono = {}
+        for fila in filas:
+            if fila.telefono:
+                por_telefono.setdefault(fila.telefono, []).append(
+                    CitaHoy(fila.id, fila.paciente_id, fila.nombre, fila.fecha_cita, fila.estado)
+                )
+        with self._lock:
+            self._por_telefono = por_telefono
+            self._fecha = hoy
+            self._cargada_en = time.monotonic()
+
+    def citas_de(self, db: Session, telefono: str):
+        """Citas de hoy del teléfono (lista vacía si no hay ninguna en el índice)."""
+        if not self._vigente():
+            self.cargar(db)
+        with self._lock:
+            return list(self._por_telefono.get(telefono, ()))
+
+    def agregar(self, cita: models.Cita, paciente: models.Paciente):
+        """Registra una cita nueva si es de hoy y el índice está cargado."""
+        if paciente is None or not paciente.telefono or cita.fecha_cita is None:
+            return
+        with self._lock:
+            if self._fecha is None or cita.fecha_cita.date() != self._fecha:
+                return
+            citas = self._por_telefono.setdefault(paciente.telefono, [])
+            citas.append(CitaHoy(cita.id, paciente.id, paciente.nombre, cita.fecha_cita, cita.estado))
+            citas.sort(key=lambda c: c.fecha_cita)
+
+    def quitar(self, cita_id: int):
+        with self._lock:
+            for telefono, citas in list(self._por_telefono.items()):
+                restantes = [c for c in citas if c.id != cita_id]
+                if len(restantes) != len(citas):
+                    if restantes:
+                        self._por_telefono[telefono] = restantes
+                    else:
+                        del self._por_telefono[telefono]
+                    return
+
+    def invalidar(self):
+        """Fuerza la recarga en el próximo uso (p. ej. si cambia el teléfono de un paciente)."""
+        with self._lock:
+            self._fecha = None
+
+
+agenda_hoy = AgendaHoy()
@@ -0,0 +1,158 @@
+# analisis_lote.py
+"""
+Análisis de IA por lotes: rellena `historial_clinico.analisis_ia` para un
+conjunto de consultas en un solo trabajo.
+
+Las consultas se leen por páginas de id (consultas cortas, sin cursor
+abierto durante todo el trabajo), se analizan con como mucho `concurrencia`
+llamadas simultáneas (pasando por la caché y el single-flight de
+`openrouter`) y cada resultado se guarda en cuanto llega. Los resultados se
+devuelven en orden de finalización, uno por línea, y al final un resumen.
+
+Lo usan `POST /ia/analyze-batch` (NDJSON) y `python analizar_lote.py`.
+"""
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from . import models, openrouter
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger("uvicorn.error")
+
+IA_LOTE_CONCURRENCIA = int(os.getenv("IA_LOTE_CONCURRENCIA", 4))
+IA_LOTE_CONCURRENCIA_MAX = int(os.getenv("IA_LOTE_CONCURRENCIA_MAX", 16))
+IA_LOTE_PAGINA = 500
+
+_FIN = object()
+
+
+@dataclass
+class FiltroLote:
+    consulta_ids: Optional[List[int]] = None
+    paciente_id: Optional[int] = None
+    doctor_id: Optional[int] = None
+    todas: bool = False
+    # Por defecto solo las consultas sin análisis (el lote se puede relanzar tras un corte)
+    solo_pendientes: bool = True
+
+    def validar(self):
+        if not (self.consulta_ids or self.paciente_id or self.doctor_id or self.todas):
+            raise ValueError("Indique consulta_ids, paciente_id, doctor_id o todas")
+
+    def criterios(self):
+        HistorialClinico = models.HistorialClinico
+        criterios = []
+        if self.consulta_ids:
+            criterios.append(HistorialClinico.id.in_(self.consulta_ids))
+        if self.paciente_id:
+            criterios.append(HistorialClinico.paciente_id == self.paciente_id)
+        if self.doctor_id:
+            criterios.append(HistorialClinico.doctor_id == self.doctor_id)
+        if self.solo_pendientes:
+            criterios.append(HistorialClinico.analisis_ia.is_(None))
+        return criterios
+
+
+async def _paginas(filtro: FiltroLote):
+    """Páginas de (id, diagnostico) ordenadas por id."""
+    HistorialClinico = models.HistorialClinico
+    ultimo_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            filas = (await db.execute(
+                select(HistorialClinico.id, HistorialClinico.diagnostico)
+                .where(HistorialClinico.id > ultimo_id, *filtro.criterios())
+                .order_by(HistorialClinico.id)
+                .limit(IA_LOTE_PAGINA)
+            )).all()
+        if not filas:
+            return
+        yield filas
+        ultimo_id = filas[-1].id
+
+
+async def _guardar(consulta_id: int, analisis: dict):
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(models.HistorialClinico)
+            .where(models.HistorialClinico.id == consulta_id)
+            .values(analisis_ia=analisis)
+        )
+        await db.commit()
+
+
+async def analizar_y_guardar(consulta_id: int, diagnostico: Optional[str]) -> dict:
+    """Línea de resultado de una consulta; los errores se devuelven, no se lanzan."""
+    diagnostico = (diagnostico or "").strip()
+    if not diagnostico:
+        return {"consulta_id": consulta_id, "ok": False, "error": "La consulta no tiene diagnóstico"}
+    try:
+        analisis, origen = await openrouter.analizar_diagnostico(diagnostico)
+        await _guardar(consulta_id, analisis)
+    except HTTPException as e:
+        return {"consulta_id": consulta_id, "ok": False, "error": e.detail}
+    except Exception as e:
+        logger.exception(f"Error analizando la consulta {consulta_id}")
+        return {"consulta_id": consulta_id, "ok": False, "error": str(e)}
+    return {"consulta_id": consulta_id, "ok": True, "origen": origen, "analisis": analisis}
+
+
+async def analizar_lote(filtro: FiltroLote, concurrencia: int = IA_LOTE_CONCURRENCIA):
+    """
+    Genera las líneas de resultado a medida que terminan y, al final,
+    {"resumen_lote": {...}}. Si se deja de consumir (cliente desconectado),
+    se cancelan los análisis en curso.
+    """
+    filtro.validar()
+    concurrencia = max(1, min(concurrencia, IA_LOTE_CONCURRENCIA_MAX))
+    resultados = asyncio.Queue()
+    semaforo = asyncio.Semaphore(concurrencia)
+    tareas = set()
+
+    async def procesar(fila):
+        try:
+            await resultados.put(await analizar_y_guardar(fila.id, fila.diagnostico))
+        finally:
+            semaforo.release()
+
+    async def productor():
+        try:
+            async for filas in _paginas(filtro):
+                for fila in filas:
+                    await semaforo.acquire()
+                    tarea = asyncio.create_task(procesar(fila))
+                    tareas.add(tarea)
+                    tarea.add_done_callback(tareas.discard)
+            await asyncio.gather(*tareas)
+        finally:
+            await resultados.put(_FIN)
+
+    inicio = time.perf_counter()
+    total = correctas = 0
+    tarea_productor = asyncio.create_task(productor())
+    try:
+        while True:
+            linea = await resultados.get()
+            if linea is _FIN:
+                break
+            total += 1
+            correctas += linea["ok"]
+            yield linea
+        await tarea_productor  # Propaga un error al leer las consultas
+    finally:
+        tarea_productor.cancel()
+        for tarea in list(tareas):
+            tarea.cancel()
+
+    yield {"resumen_lote": {
+        "total": total,
+        "correctas": correctas,
+        "errores": total - correctas,
+        "duracion_s": round(time.perf_counter() - inicio, 3),
+        "concurrencia": concurrencia,
+    }}
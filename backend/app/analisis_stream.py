@@ -0,0 +1,248 @@
+# analisis_stream.py
+"""
+Modo streaming de `/ia/analyze`.
+
+Pide la respuesta a OpenRouter con `stream: true` y reenvía los tokens según
+llegan. Un parser JSON incremental sigue el texto del modelo y, en cuanto se
+cierra cada cadena, emite el `resumen`, cada recomendación y cada riesgo, sin
+esperar al final de la respuesta. Al terminar se emite el análisis completo
+(validado igual que en el modo normal) y se guarda en la caché.
+
+El modelo es el mejor del enrutador (sin petición duplicada: los tokens ya se
+han enviado al cliente) y el resultado se le notifica igual que en
+`openrouter._intento`, de modo que los fallos en streaming también abren el
+circuito. La respuesta completa tiene el mismo plazo que `completar_enrutado`
+(IA_PRESUPUESTO_S); agotado, se emite un error 504.
+"""
+import json
+import asyncio
+import time
+import logging
+import httpx
+from fastapi import HTTPException
+from . import openrouter
+from .metricas import peticiones_openrouter, latencia_openrouter, registrar_uso_openrouter
+from .cache_ia import cache_analisis, clave_analisis
+
+logger = logging.getLogger("uvicorn.error")
+
+# Eventos emitidos por `eventos_analisis`
+TOKEN = "token"
+RESUMEN = "resumen"
+RECOMENDACION = "recomendacion"
+RIESGO = "riesgo"
+FINAL = "final"
+ERROR = "error"
+
+# Clave del array en el objeto raíz -> evento de cada elemento
+EVENTOS_LISTA = {"recomendaciones": RECOMENDACION, "riesgos": RIESGO}
+
+
+class ParserAnalisisIncremental:
+    """
+    Parser JSON incremental para {"resumen": ..., "recomendaciones": [...], "riesgos": [...]}.
+
+    `alimentar(texto)` recibe trozos arbitrarios y devuelve los campos que se
+    han completado con ellos: [(RESUMEN, str) | (RECOMENDACION, str) | (RIESGO, str)].
+    Ignora el texto anterior al primer "{" y tolera claves desconocidas y
+    valores anidados (solo emite cadenas en las posiciones conocidas).
+    """
+    def __init__(self):
+        self._pila = []  # [{"tipo": "obj", "clave", "espera_clave"} | {"tipo": "arr", "clave"}]
+        self._en_cadena = False
+        self._escape = False
+        self._cadena = []
+        self._terminado = False
+
+    def _cerrar_cadena(self):
+        try:
+            valor = json.loads('"' + "".join(self._cadena) + '"')
+        except json.JSONDecodeError:
+            valor = "".join(self._cadena)
+        self._cadena = []
+        cima = self._pila[-1]
+        if cima["tipo"] == "obj":
+            if cima["espera_clave"]:
+                cima["clave"] = valor
+                cima["espera_clave"] = False
+                return None
+            if len(self._pila) == 1 and cima["clave"] == "resumen":
+                return (RESUMEN, valor)
+            return None
+        if len(self._pila) == 2 and cima["clave"] in EVENTOS_LISTA:
+            return (EVENTOS_LISTA[cima["clave"]], valor)
+        return None
+
+    def alimentar(self, texto: str):
+        eventos = []
+        for c in texto:
+            if self._terminado:
+                break
+            if self._en_cadena:
+                if self._escape:
+                    self._escape = False
+                    self._cadena.append(c)
+                elif c == "\\":
+                    self._escape = True
+                    self._cadena.append(c)
+                elif c == '"':
+                    self._en_cadena = False
+                    evento = self._cerrar_cadena()
+                    if evento:
+                        eventos.append(evento)
+                else:
+                    self._cadena.append(c)
+                continue
+
+            if not self._pila:
+                if c == "{":
+                    self._pila.append({"tipo": "obj", "clave": None, "espera_clave": True})
+                continue
+
+            cima = self._pila[-1]
+            if c == '"':
+                self._en_cadena = True
+            elif c == "{":
+                self._pila.append({"tipo": "obj", "clave": None, "espera_clave": True})
+            elif c == "[":
+                self._pila.append({"tipo": "arr", "clave": cima.get("clave")})
+            elif c in "}]":
+                self._pila.pop()
+                if not self._pila:
+                    self._terminado = True
+            elif c == "," and cima["tipo"] == "obj":
+                cima["espera_clave"] = True
+        return eventos
+
+
+async def tokens_openrouter(prompt: str, modelo: str, limite: float = None):
+    """
+    Trozos de texto de la respuesta en streaming de OpenRouter. `limite` es el
+    instante (reloj del event loop) en que se abandona la respuesta con un 504.
+    """
+    configuracion = openrouter.configuracion
+    if not configuracion.api_key:
+        raise HTTPException(status_code=500, detail="API_KEY no configurada")
+
+    payload = {
+        "model": modelo,
+        "messages": [{"role": "user", "content": prompt}],
+        "stream": True,
+    }
+    loop = asyncio.get_running_loop()
+
+    def con_plazo(espera):
+        # Cada espera a OpenRouter (conexión, cabeceras, cada línea) usa lo que queda del plazo
+        if limite is None:
+            return espera
+        return asyncio.wait_for(espera, max(0.0, limite - loop.time()))
+
+    cliente = openrouter.obtener_cliente()
+    peticion = cliente.build_request(
+        "POST",
+        configuracion.url,
+        headers={"Authorization": f"Bearer {configuracion.api_key}"},
+        json=payload,
+    )
+    inicio = time.perf_counter()
+    try:
+        response = await con_plazo(cliente.send(peticion, stream=True))
+        try:
+            if response.status_code >= 400:
+                peticiones_openrouter.inc(modelo, f"http_{response.status_code}")
+                await con_plazo(response.aread())
+                logger.error("OpenRouter HTTP error: %s - %s", response.status_code, response.text)
+                raise HTTPException(status_code=502, detail=f"Error de OpenRouter: {response.status_code}")
+            lineas = response.aiter_lines()
+            while True:
+                try:
+                    linea = await con_plazo(anext(lineas))
+                except StopAsyncIteration:
+                    break
+                # Las líneas que empiezan por ":" son comentarios (keep-alive) de SSE
+                if not linea.startswith("data:"):
+                    continue
+                datos = linea[5:].strip()
+                if datos == "[DONE]":
+                    break
+                try:
+                    evento = json.loads(datos)
+                    # El último evento trae el consumo de tokens
+                    registrar_uso_openrouter(modelo, evento.get("usage"))
+                    if not evento.get("choices"):
+                        continue
+                    trozo = evento["choices"][0].get("delta", {}).get("content")
+                except (json.JSONDecodeError, KeyError, IndexError, TypeError, AttributeError):
+                    logger.warning("Evento inesperado de OpenRouter: %s", datos[:200])
+                    continue
+                if trozo:
+                    yield trozo
+        finally:
+            await response.aclose()
+        peticiones_openrouter.inc(modelo, "ok")
+        latencia_openrouter.observar(modelo, valor=time.perf_counter() - inicio)
+    except (asyncio.TimeoutError, httpx.TimeoutException):
+        peticiones_openrouter.inc(modelo, "timeout")
+        logger.error("OpenRouter no completó la respuesta en streaming (%s) dentro del plazo", modelo)
+        raise HTTPException(status_code=504, detail="OpenRouter no respondió a tiempo")
+    except httpx.RequestError as e:
+        peticiones_openrouter.inc(modelo, "error_conexion")
+        logger.error("Error de conexión con OpenRouter: %s", e)
+        raise HTTPException(status_code=502, detail="No se pudo conectar con OpenRouter")
+
+
+def _eventos_de(resultado: dict):
+    yield RESUMEN, resultado["resumen"]
+    for recomendacion in resultado["recomendaciones"]:
+        yield RECOMENDACION, recomendacion
+    for riesgo in resultado["riesgos"]:
+        yield RIESGO, riesgo
+    yield FINAL, resultado
+
+
+async def eventos_analisis(diagnostico: str):
+    """
+    Genera (evento, datos) para el diagnóstico. Si el análisis está en caché
+    se emiten directamente sus campos; si no, los tokens y los campos según
+    se completan. Los errores de OpenRouter se emiten como evento ERROR.
+    """
+    modelo = openrouter.configuracion.modelo
+    clave = clave_analisis(diagnostico, modelo, openrouter.VERSION_PROMPT)
+    resultado, _ = await cache_analisis.obtener(clave)
+    if resultado is not None:
+        for evento in _eventos_de(resultado):
+            yield evento
+        return
+
+    parser = ParserAnalisisIncremental()
+    texto = []
+    inicio = time.perf_counter()
+    limite = asyncio.get_running_loop().time() + openrouter.configuracion.presupuesto_s
+    # En streaming no hay petición duplicada: se usa el mejor modelo disponible
+    elegido = openrouter.enrutador_modelos.orden()[0]
+    openrouter.enrutador_modelos.reservar(elegido)
+    try:
+        async for trozo in tokens_openrouter(openrouter.construir_prompt(diagnostico), elegido.nombre, limite):
+            texto.append(trozo)
+            yield TOKEN, trozo
+            for evento in parser.alimentar(trozo):
+                yield evento
+        contenido = "".join(texto).strip()
+        if not contenido:
+            raise HTTPException(status_code=502, detail="OpenRouter devolvió respuesta vacía")
+    except HTTPException as e:
+        if e.status_code != 500:
+            # 500 = error de configuración (API_KEY): no es culpa del modelo
+            elegido.registrar_fallo()
+        yield ERROR, {"status_code": e.status_code, "detail": e.detail}
+        return
+    finally:
+        # Si el cliente se desconecta a mitad no cuenta como fallo ni como éxito
+        elegido.prueba_en_curso = False
+    elegido.registrar_exito(time.perf_counter() - inicio)
+    cache_analisis.registrar_llamada(time.perf_counter() - inicio)
+
+    resultado, valido = openrouter.interpretar_con_validez(contenido)
+    if valido:
+        await cache_analisis.guardar(clave, diagnostico, modelo, openrouter.VERSION_PROMPT, resultado)
+    yield FINAL, resultado
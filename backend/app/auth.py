@@ -0,0 +1,139 @@
+# auth.py
+"""
+Dependencias de autenticación.
+
+`get_current_user` resuelve el usuario del token sin ir a la base de datos
+en cada petición:
+  - el resultado de verificar/decodificar cada token se memoriza hasta su `exp`;
+  - el usuario resuelto se guarda en una caché TTL/LRU indexada por (sub, iat).
+Cualquier UPDATE/DELETE de un `Usuario` a través del ORM invalida sus entradas
+en este proceso; los demás workers lo reflejan como mucho tras PRINCIPAL_CACHE_TTL.
+
+`get_token_claims` / `get_current_doctor_id` exponen el doctor_id y el rol
+incluidos en el token en el login, sin consultar la base de datos.
+"""
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .cache import TTLCache
+from .database import get_db
+from .models import Usuario
+from .utils import decode_access_token
+
+PRINCIPAL_CACHE_TAMANO = int(os.getenv("PRINCIPAL_CACHE_TAMANO", 4096))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+
+ROL_DOCTOR = "doctor"
+ROL_USUARIO = "usuario"
+
+# token -> payload verificado
+cache_tokens = TTLCache(maxsize=PRINCIPAL_CACHE_TAMANO, ttl=PRINCIPAL_CACHE_TTL)
+# (sub, iat) -> Principal
+cache_principales = TTLCache(maxsize=PRINCIPAL_CACHE_TAMANO, ttl=PRINCIPAL_CACHE_TTL)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Copia inmutable de los datos del usuario autenticado (segura para compartir entre peticiones)."""
+    id: int
+    nombre: str
+    apellidos: str
+    correo_electronico: str
+    profesion: Optional[str] = None
+
+    @classmethod
+    def desde_usuario(cls, usuario: Usuario) -> "Principal":
+        return cls(
+            id=usuario.id,
+            nombre=usuario.nombre,
+            apellidos=usuario.apellidos,
+            correo_electronico=usuario.correo_electronico,
+            profesion=usuario.profesion,
+        )
+
+
+def decodificar_token(token: str):
+    """Como `decode_access_token`, pero memoriza los tokens válidos hasta que expiran."""
+    payload = cache_tokens.get(token)
+    if payload is not None:
+        return payload
+    payload = decode_access_token(token)
+    if payload is not None:
+        cache_tokens.set(token, payload, ttl=payload.get("exp", 0) - time.time())
+    return payload
+
+
+def invalidar_usuario(usuario_id: int):
+    """Elimina de la caché los principals de ese usuario."""
+    cache_principales.eliminar_si(lambda clave, principal: principal.id == usuario_id)
+
+
+@event.listens_for(Usuario, "after_update")
+@event.listens_for(Usuario, "after_delete")
+def _invalidar_tras_cambio(mapper, connection, target):
+    invalidar_usuario(target.id)
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    credentials_exception = HTTPException(
+        status_code=401,
+        detail="No autorizado",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    payload = decodificar_token(token)
+    if payload is None:
+        raise credentials_exception
+
+    email: str = payload.get("sub")
+    if email is None:
+        raise credentials_exception
+
+    clave = (email, payload.get("iat"))
+    principal = cache_principales.get(clave)
+    if principal is not None:
+        return principal
+
+    user = db.query(Usuario).filter(Usuario.correo_electronico == email).first()
+    if user is None:
+        raise credentials_exception
+    principal = Principal.desde_usuario(user)
+    cache_principales.set(clave, principal, ttl=payload.get("exp", 0) - time.time())
+    return principal
+
+
+@dataclass(frozen=True)
+class TokenClaims:
+    sub: str
+    doctor_id: Optional[int] = None
+    rol: str = ROL_USUARIO
+
+
+def get_token_claims(token: str = Depends(oauth2_scheme)) -> TokenClaims:
+    """Claims del token verificado; no consulta la base de datos."""
+    payload = decodificar_token(token)
+    if payload is None or payload.get("sub") is None:
+        raise HTTPException(
+            status_code=401,
+            detail="No autorizado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return TokenClaims(
+        sub=payload["sub"],
+        doctor_id=payload.get("doctor_id"),
+        rol=payload.get("rol", ROL_USUARIO),
+    )
+
+
+def get_current_doctor_id(claims: TokenClaims = Depends(get_token_claims)) -> int:
+    """doctor_id del token; 403 si el usuario no es doctor."""
+    if claims.doctor_id is None:
+        raise HTTPException(status_code=403, detail="El usuario no está registrado como doctor")
+    return claims.doctor_id
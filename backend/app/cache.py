@@ -0,0 +1,105 @@
+# cache.py
+"""
+Caché en memoria acotada (LRU) con caducidad por entrada (TTL).
+Es segura entre hilos: las rutas síncronas se ejecutan en el threadpool.
+
+`VueloUnico` agrupa llamadas asíncronas concurrentes con la misma clave.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+_AUSENTE = object()
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._datos = OrderedDict()  # clave -> (expira_en, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, clave, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave, _AUSENTE)
+            if entrada is _AUSENTE:
+                self.misses += 1
+                return default
+            expira_en, valor = entrada
+            if expira_en <= time.monotonic():
+                del self._datos[clave]
+                self.misses += 1
+                return default
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return valor
+
+    def set(self, clave, valor, ttl: float = None):
+        """Guarda `valor`; `ttl` permite una caducidad menor que la por defecto."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+
+    def pop(self, clave, default=None):
+        with self._lock:
+            entrada = self._datos.pop(clave, _AUSENTE)
+        return default if entrada is _AUSENTE else entrada[1]
+
+    def eliminar_si(self, predicado):
+        """Elimina las entradas cuyo (clave, valor) cumpla `predicado`."""
+        with self._lock:
+            claves = [clave for clave, (_, valor) in self._datos.items() if predicado(clave, valor)]
+            for clave in claves:
+                del self._datos[clave]
+        return len(claves)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class VueloUnico:
+    """
+    Single-flight: las llamadas concurrentes con la misma clave comparten una
+    sola ejecución y reciben su resultado (o su excepción).
+
+    La ejecución corre en su propia tarea, así que si la petición que la
+    inició se cancela (cliente desconectado) las demás siguen esperándola.
+    Solo para el event loop: no es segura entre hilos.
+    """
+    def __init__(self):
+        self._en_vuelo = {}  # clave -> asyncio.Task
+        self.ejecuciones = 0
+        self.agrupadas = 0
+
+    def _terminada(self, clave, tarea):
+        if self._en_vuelo.get(clave) is tarea:
+            del self._en_vuelo[clave]
+        if not tarea.cancelled():
+            tarea.exception()  # Marca la excepción como recuperada aunque nadie espere ya
+
+    async def ejecutar(self, clave, crear_corutina):
+        """Devuelve (resultado, agrupada); agrupada es True si se reutilizó una ejecución en curso."""
+        tarea = self._en_vuelo.get(clave)
+        agrupada = tarea is not None
+        if agrupada:
+            self.agrupadas += 1
+        else:
+            self.ejecuciones += 1
+            tarea = asyncio.ensure_future(crear_corutina())
+            self._en_vuelo[clave] = tarea
+            tarea.add_done_callback(lambda t: self._terminada(clave, t))
+        return await asyncio.shield(tarea), agrupada
+
+    def estadisticas(self) -> dict:
+        return {"ejecuciones": self.ejecuciones, "agrupadas": self.agrupadas, "en_vuelo": len(self._en_vuelo)}
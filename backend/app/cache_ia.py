@@ -0,0 +1,150 @@
+# cache_ia.py
+"""
+Caché de dos niveles para los análisis de IA de `/ia/analyze`:
+
+  1. memoria: `TTLCache` LRU por proceso (IA_CACHE_TAMANO entradas);
+  2. base de datos: tabla `analisis_ia_cache`, compartida entre workers y
+     reinicios, con caducidad IA_CACHE_TTL_S.
+
+La clave es un sha256 del diagnóstico normalizado (minúsculas, sin tildes ni
+espacios/puntuación sobrantes), el modelo y la versión del prompt: cambiar
+el modelo o el prompt invalida la caché sin borrar nada.
+
+Las filas caducadas se ignoran al leer y se borran en bloque como mucho una
+vez cada IA_CACHE_PURGA_S segundos, al guardar.
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+import unicodedata
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from . import models
+from .cache import TTLCache
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger("uvicorn.error")
+
+IA_CACHE_TAMANO = int(os.getenv("IA_CACHE_TAMANO", 2048))
+IA_CACHE_TTL_S = float(os.getenv("IA_CACHE_TTL_S", 7 * 24 * 3600))
+IA_CACHE_TTL_MEMORIA_S = float(os.getenv("IA_CACHE_TTL_MEMORIA_S", 3600))
+IA_CACHE_PURGA_S = float(os.getenv("IA_CACHE_PURGA_S", 3600))
+
+MEMORIA = "memoria"
+BD = "bd"
+
+
+def normalizar_diagnostico(texto: str) -> str:
+    """Texto usado en la clave: "Caries  profunda en 36." -> "caries profunda en 36"."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"\s+", " ", texto)
+    return texto.strip(" .,;:!?¡¿\"'")
+
+
+def clave_analisis(diagnostico: str, modelo: str, version_prompt: str) -> str:
+    base = "\x1f".join((normalizar_diagnostico(diagnostico), modelo, version_prompt))
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+class CacheAnalisis:
+    def __init__(self):
+        self.memoria = TTLCache(maxsize=IA_CACHE_TAMANO, ttl=IA_CACHE_TTL_MEMORIA_S)
+        self.aciertos_memoria = 0
+        self.aciertos_bd = 0
+        self.fallos = 0
+        # Tiempo de las llamadas reales a OpenRouter, para estimar lo que ahorran los aciertos
+        self.llamadas = 0
+        self.segundos_llamadas = 0.0
+        self._purgada_en = time.monotonic()
+
+    async def obtener(self, clave: str):
+        """Devuelve (resultado, nivel) o (None, None) si no está o ha caducado."""
+        resultado = self.memoria.get(clave)
+        if resultado is not None:
+            self.aciertos_memoria += 1
+            return resultado, MEMORIA
+
+        try:
+            async with AsyncSessionLocal() as db:
+                fila = (await db.execute(
+                    select(models.AnalisisIACache.resultado, models.AnalisisIACache.expira_en)
+                    .where(models.AnalisisIACache.clave == clave)
+                )).first()
+        except Exception:
+            logger.exception("No se pudo leer la caché de análisis")
+            fila = None
+        if fila is not None:
+            restante = (fila.expira_en - datetime.utcnow()).total_seconds()
+            if restante > 0:
+                self.memoria.set(clave, fila.resultado, ttl=restante)
+                self.aciertos_bd += 1
+                return fila.resultado, BD
+        self.fallos += 1
+        return None, None
+
+    async def guardar(self, clave: str, diagnostico: str, modelo: str, version_prompt: str, resultado: dict):
+        self.memoria.set(clave, resultado)
+        expira_en = datetime.utcnow() + timedelta(seconds=IA_CACHE_TTL_S)
+        try:
+            async with AsyncSessionLocal() as db:
+                fila = (await db.execute(
+                    select(models.AnalisisIACache).where(models.AnalisisIACache.clave == clave)
+                )).scalars().first()
+                if fila is None:
+                    db.add(models.AnalisisIACache(
+                        clave=clave, modelo=modelo, version_prompt=version_prompt,
+                        diagnostico=normalizar_diagnostico(diagnostico),
+                        resultado=resultado, expira_en=expira_en,
+                    ))
+                else:
+                    # Fila caducada: se renueva
+                    fila.resultado = resultado
+                    fila.expira_en = expira_en
+                await db.commit()
+        except IntegrityError:
+            # Otro worker la guardó a la vez: vale la suya
+            pass
+        except Exception:
+            # La caché nunca debe romper el análisis
+            logger.exception("No se pudo guardar el análisis en la caché")
+            return
+
+        if time.monotonic() - self._purgada_en > IA_CACHE_PURGA_S:
+            self._purgada_en = time.monotonic()
+            try:
+                await self.purgar()
+            except Exception:
+                logger.exception("No se pudo purgar la caché de análisis")
+
+    async def purgar(self) -> int:
+        """Borra de la base de datos las entradas caducadas."""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                delete(models.AnalisisIACache).where(models.AnalisisIACache.expira_en <= datetime.utcnow())
+            )
+            await db.commit()
+        return result.rowcount
+
+    def registrar_llamada(self, segundos: float):
+        self.llamadas += 1
+        self.segundos_llamadas += segundos
+
+    def estadisticas(self) -> dict:
+        consultas = self.aciertos_memoria + self.aciertos_bd + self.fallos
+        media = self.segundos_llamadas / self.llamadas if self.llamadas else 0.0
+        return {
+            "aciertos_memoria": self.aciertos_memoria,
+            "aciertos_bd": self.aciertos_bd,
+            "fallos": self.fallos,
+            "tasa_aciertos": round((consultas - self.fallos) / consultas, 3) if consultas else None,
+            "entradas_memoria": len(self.memoria),
+            "latencia_media_openrouter_s": round(media, 3),
+            "segundos_ahorrados_estimados": round((consultas - self.fallos) * media, 1),
+        }
+
+
+cache_analisis = CacheAnalisis()
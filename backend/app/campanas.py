@@ -0,0 +1,222 @@
+# campanas.py
+"""
+Campañas de recordatorios de cita ("su cita es mañana").
+
+Una campaña recorre las citas de una ventana de fechas con una sola consulta
+(cita JOIN paciente) leída en streaming, renderiza los recordatorios de cada
+lote y los envía con concurrencia acotada por el pool SMTP compartido.
+
+Tras cada lote se guarda en `campana_recordatorio` el progreso (enviados,
+fallidos, último id de cita procesado), de modo que una campaña interrumpida
+se reanuda desde ese punto. Como mucho se reenvía el lote en curso.
+
+Se lanza desde `POST /email/campanas/recordatorios` o con
+`python campana_recordatorios.py`.
+"""
+import os
+import time
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from sqlalchemy import select, update, func
+from . import models
+from .database import AsyncSessionLocal
+from .email_service import obtener_pool_smtp, generar_mensaje_recordatorio_cita
+
+logger = logging.getLogger("uvicorn.error")
+
+CAMPANA_CONCURRENCIA = int(os.getenv("CAMPANA_CONCURRENCIA", 20))
+CAMPANA_LOTE = int(os.getenv("CAMPANA_LOTE", 200))
+# Fallos que se guardan con detalle en la campaña (el contador los incluye todos)
+CAMPANA_MAX_FALLOS_GUARDADOS = 100
+
+EN_CURSO = "en_curso"
+COMPLETADA = "completada"
+INTERRUMPIDA = "interrumpida"
+
+
+def ventana_manana():
+    """(desde, hasta) de las citas de mañana."""
+    manana = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    return manana, manana + timedelta(days=1)
+
+
+def _destinatario():
+    # El correo de la cita tiene prioridad sobre el del paciente. El frontend guarda
+    # "" (no NULL) en las citas sin correo: también entonces se usa el del paciente.
+    return func.coalesce(func.nullif(models.Cita.correo_electronico, ""), models.Paciente.correo_electronico)
+
+
+def consulta_citas(desde: datetime, hasta: datetime, despues_de: int = 0):
+    """Citas de la ventana con destinatario, ordenadas por id a partir de `despues_de`."""
+    Cita, Paciente = models.Cita, models.Paciente
+    destinatario = _destinatario()
+    return (
+        select(Cita.id, Cita.fecha_cita, Cita.detalle_cita, destinatario.label("destinatario"),
+               Paciente.nombre, Paciente.apellidos)
+        .join(Paciente, Paciente.id == Cita.paciente_id)
+        .where(Cita.fecha_cita >= desde, Cita.fecha_cita < hasta, Cita.id > despues_de,
+               destinatario.is_not(None), destinatario != "")
+        .order_by(Cita.id)
+    )
+
+
+def mensaje_recordatorio(fila):
+    return generar_mensaje_recordatorio_cita(
+        destinatario=fila.destinatario,
+        nombre_paciente=f"{fila.nombre} {fila.apellidos}",
+        fecha_cita=fila.fecha_cita.strftime("%Y-%m-%d"),
+        hora_cita=fila.fecha_cita.strftime("%H:%M"),
+        motivo=fila.detalle_cita or "Consulta general",
+    )
+
+
+def informe(campana: models.CampanaRecordatorio) -> dict:
+    procesados = campana.enviados + campana.fallidos
+    return {
+        "id": campana.id,
+        "estado": campana.estado,
+        "desde": campana.desde,
+        "hasta": campana.hasta,
+        "total": campana.total,
+        "enviados": campana.enviados,
+        "fallidos": campana.fallidos,
+        "pendientes": max(campana.total - procesados, 0),
+        "duracion_s": round(campana.duracion_s, 3),
+        "mensajes_por_s": round(procesados / campana.duracion_s, 1) if campana.duracion_s else None,
+        "fallos": campana.fallos or [],
+    }
+
+
+async def crear_campana(desde: datetime, hasta: datetime) -> models.CampanaRecordatorio:
+    if hasta <= desde:
+        raise ValueError("'hasta' debe ser posterior a 'desde'")
+    async with AsyncSessionLocal() as db:
+        subconsulta = consulta_citas(desde, hasta).subquery()
+        total = (await db.execute(select(func.count()).select_from(subconsulta))).scalar_one()
+        campana = models.CampanaRecordatorio(
+            desde=desde, hasta=hasta, estado=EN_CURSO, ultimo_cita_id=0,
+            total=total, enviados=0, fallidos=0, duracion_s=0,
+        )
+        db.add(campana)
+        await db.commit()
+        return campana
+
+
+async def obtener_campana(campana_id: int):
+    async with AsyncSessionLocal() as db:
+        return await db.get(models.CampanaRecordatorio, campana_id)
+
+
+async def _guardar_cierre(campana_id: int, **valores):
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(models.CampanaRecordatorio).where(models.CampanaRecordatorio.id == campana_id).values(**valores)
+        )
+        await db.commit()
+
+
+async def ejecutar_campana(campana_id: int, concurrencia: int = CAMPANA_CONCURRENCIA) -> dict:
+    """Envía (o reanuda) la campaña y devuelve su informe."""
+    async with AsyncSessionLocal() as db:
+        campana = await db.get(models.CampanaRecordatorio, campana_id)
+        if campana is None:
+            raise ValueError(f"Campaña {campana_id} no encontrada")
+        if campana.estado == COMPLETADA:
+            return informe(campana)
+        campana.estado = EN_CURSO
+        await db.commit()
+
+        semaforo = asyncio.Semaphore(concurrencia)
+        duracion_previa = campana.duracion_s
+        inicio = time.perf_counter()
+        estado = INTERRUMPIDA
+        error = None
+        try:
+            # Dentro del try: sin configuración SMTP, ConfiguracionSMTP() lanza
+            # ValueError y la campaña debe quedar interrumpida con el motivo.
+            pool = obtener_pool_smtp()
+
+            async def enviar(mensaje):
+                async with semaforo:
+                    await pool.enviar(mensaje)
+
+            async with AsyncSessionLocal() as lectura:
+                stmt = consulta_citas(campana.desde, campana.hasta, campana.ultimo_cita_id)
+                resultado = await lectura.stream(stmt.execution_options(yield_per=CAMPANA_LOTE))
+                async for filas in resultado.partitions(CAMPANA_LOTE):
+                    mensajes = [mensaje_recordatorio(fila) for fila in filas]
+                    resultados = await asyncio.gather(*(enviar(m) for m in mensajes), return_exceptions=True)
+
+                    fallos = [
+                        {"cita_id": fila.id, "destinatario": fila.destinatario, "error": str(r)[:300]}
+                        for fila, r in zip(filas, resultados) if isinstance(r, BaseException)
+                    ]
+                    # Punto de control del lote
+                    campana.enviados += len(filas) - len(fallos)
+                    campana.fallidos += len(fallos)
+                    campana.ultimo_cita_id = filas[-1].id
+                    campana.duracion_s = duracion_previa + time.perf_counter() - inicio
+                    if fallos:
+                        guardados = campana.fallos or []
+                        campana.fallos = (guardados + fallos)[:CAMPANA_MAX_FALLOS_GUARDADOS]
+                    await db.commit()
+            estado = COMPLETADA
+        except Exception as e:
+            error = str(e)[:300]
+            raise
+        finally:
+            # En sesión aparte: si se canceló a mitad de un commit, `db` ya no es utilizable.
+            # Los contadores solo se guardan en los puntos de control.
+            campana.estado = estado
+            campana.duracion_s = duracion_previa + time.perf_counter() - inicio
+            campana.terminada_en = datetime.utcnow() if estado == COMPLETADA else None
+            cierre = {"estado": estado, "duracion_s": campana.duracion_s, "terminada_en": campana.terminada_en}
+            if error is not None:
+                # Fallo de la campaña entera (no de una cita): se guarda junto a los fallos
+                fallos = (campana.fallos or [])[:CAMPANA_MAX_FALLOS_GUARDADOS - 1]
+                campana.fallos = cierre["fallos"] = fallos + [{"cita_id": None, "destinatario": None, "error": error}]
+            try:
+                if estado != COMPLETADA:
+                    await db.rollback()
+                await _guardar_cierre(campana_id, **cierre)
+            except Exception:
+                # Queda "en_curso" en la base de datos; se puede reanudar igualmente
+                logger.exception(f"No se pudo guardar el estado final de la campaña {campana_id}")
+
+        datos = informe(campana)
+        logger.info(
+            f"Campaña {campana.id}: {datos['enviados']} enviados, {datos['fallidos']} fallidos "
+            f"en {datos['duracion_s']} s ({datos['mensajes_por_s']} msg/s)"
+        )
+        return datos
+
+
+# Campañas lanzadas en segundo plano desde la API (por id)
+_en_ejecucion = {}
+
+def lanzar(campana_id: int) -> bool:
+    """Ejecuta la campaña en segundo plano; False si ya se está ejecutando en este proceso."""
+    tarea = _en_ejecucion.get(campana_id)
+    if tarea is not None and not tarea.done():
+        return False
+
+    async def ejecutar():
+        try:
+            await ejecutar_campana(campana_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Error en la campaña {campana_id}")
+        finally:
+            _en_ejecucion.pop(campana_id, None)
+
+    _en_ejecucion[campana_id] = asyncio.create_task(ejecutar())
+    return True
+
+async def detener():
+    """Interrumpe las campañas en curso (quedan reanudables)."""
+    tareas = list(_en_ejecucion.values())
+    for tarea in tareas:
+        tarea.cancel()
+    await asyncio.gather(*tareas, return_exceptions=True)
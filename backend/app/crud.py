@@ -1,54 +1,46 @@
 # crud.py
 
 # Operaciones CRUD seguras para todos los modelos
-from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func    
+from sqlalchemy import func, update
 from datetime import date, timedelta
 from . import models, schemas
-from .utils import get_password_hash
+from .agenda_hoy import agenda_hoy
 
-# ==================== USUARIO ====================
-def create_usuario(db: Session, usuario: schemas.UsuarioCreate):
+ESTADO_EN_SALA = "En sala de espera"
+
+# ==================== PAGINACIÓN ====================
+# Los listados se paginan por keyset sobre `id`: el cliente envía el último id
+# recibido como `cursor` y obtiene las filas siguientes, sin OFFSET.
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+FILAS_POR_LOTE_STREAM = 500
+
+def paginar(query, modelo, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    """Devuelve hasta `limit` filas con id > cursor, ordenadas por id."""
+    if cursor is not None:
+        query = query.filter(modelo.id > cursor)
+    return query.order_by(modelo.id).limit(min(limit, LIMITE_MAXIMO)).all()
+
+def contar(db: Session, modelo, *criterios) -> int:
+    """Número de filas de `modelo` que cumplen `criterios` (X-Total-Count de los listados)."""
+    return db.query(func.count(modelo.id)).filter(*criterios).scalar()
+
+def iterar(query, modelo, cursor: int = None):
     """
-    Crea un usuario con la contraseña hasheada.
-    Si la profesión no es 'paciente' (case-insensitive) también crea un registro en `doctor`.
+    Recorre todas las filas de la consulta en lotes (`yield_per`) para que el
+    consumo de memoria no dependa del tamaño de la tabla.
     """
-    existing = db.query(models.Usuario).filter(models.Usuario.correo_electronico == usuario.correo_electronico).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="El correo ya está registrado")
-
-    usr_data = usuario.dict()
-    usr_data['contrasena'] = get_password_hash(usr_data['contrasena'])
-    db_usuario = models.Usuario(**usr_data)
-    db.add(db_usuario)
-    db.commit()
-    db.refresh(db_usuario)
-
-    # Registrar como doctor si la profesion no es 'paciente'
-    profesion = (db_usuario.profesion or "").strip().lower()
-    if profesion and profesion != "paciente":
-        existing_doc = db.query(models.Doctor).filter(models.Doctor.correo_electronico == db_usuario.correo_electronico).first()
-        if not existing_doc:
-            doctor = models.Doctor(
-                nombre=db_usuario.nombre,
-                apellidos=db_usuario.apellidos,
-                consultorio=None,
-                profesion=db_usuario.profesion,
-                telefono_celular=None,
-                correo_electronico=db_usuario.correo_electronico
-            )
-            db.add(doctor)
-            db.commit()
-            db.refresh(doctor)
-
-    return db_usuario
+    if cursor is not None:
+        query = query.filter(modelo.id > cursor)
+    yield from query.order_by(modelo.id).yield_per(FILAS_POR_LOTE_STREAM)
 
+# ==================== USUARIO ====================
 def get_usuario_by_email(db: Session, email: str):
     return db.query(models.Usuario).filter(models.Usuario.correo_electronico == email).first()
 
-def get_usuarios(db: Session):
-    return db.query(models.Usuario).all()
+def get_usuarios(db: Session, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    return paginar(db.query(models.Usuario), models.Usuario, cursor, limit)
 
 # ==================== DOCTOR ====================
 def create_doctor(db: Session, doctor: schemas.DoctorCreate):
@@ -58,22 +50,26 @@ def create_doctor(db: Session, doctor: schemas.DoctorCreate):
     db.refresh(db_doctor)
     return db_doctor
 
-def get_doctores(db: Session):
-    return db.query(models.Doctor).all()
+def get_doctores(db: Session, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    return paginar(db.query(models.Doctor), models.Doctor, cursor, limit)
 
 def get_doctor(db: Session, doctor_id: int):
     return db.query(models.Doctor).filter(models.Doctor.id == doctor_id).first()
 
 # ==================== PACIENTE ====================
 def create_paciente(db: Session, paciente: schemas.PacienteCreate):
-    db_paciente = models.Paciente(**paciente.dict(exclude={"doctor_id"}))
+    db_paciente = models.Paciente(**paciente.dict())
     db.add(db_paciente)
     db.commit()
     db.refresh(db_paciente)
     return db_paciente
 
-def get_pacientes(db: Session):
-    return db.query(models.Paciente).all()
+def get_pacientes(db: Session, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    return paginar(db.query(models.Paciente), models.Paciente, cursor, limit)
+
+def get_pacientes_by_doctor(db: Session, doctor_id: int, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    query = db.query(models.Paciente).filter(models.Paciente.doctor_id == doctor_id)
+    return paginar(query, models.Paciente, cursor, limit)
 
 def get_paciente(db: Session, paciente_id: int):
     return db.query(models.Paciente).filter(models.Paciente.id == paciente_id).first()
@@ -81,10 +77,15 @@ def get_paciente(db: Session, paciente_id: int):
 def update_paciente(db: Session, paciente_id: int, paciente_update: schemas.PacienteCreate):
     paciente = get_paciente(db, paciente_id)
     if paciente:
-        for key, value in paciente_update.dict().items():
+        datos = paciente_update.dict()
+        # No desasignar al doctor si el formulario de edición no envía doctor_id
+        if datos.get("doctor_id") is None:
+            datos.pop("doctor_id", None)
+        for key, value in datos.items():
             setattr(paciente, key, value)
         db.commit()
         db.refresh(paciente)
+        agenda_hoy.invalidar()  # puede haber cambiado el teléfono o el nombre
     return paciente
 
 def delete_paciente(db: Session, paciente_id: int):
@@ -94,6 +95,7 @@ def delete_paciente(db: Session, paciente_id: int):
         db.query(models.HistorialClinico).filter(models.HistorialClinico.paciente_id == paciente_id).delete()
         db.delete(paciente)
         db.commit()
+        agenda_hoy.invalidar()
     return paciente
 
 # ==================== HISTORIAL CLÍNICO ====================
@@ -112,21 +114,23 @@ def create_feedback(db: Session, feedback: schemas.FeedbackCreate):
     db.refresh(db_feedback)
     return db_feedback
 
-def get_feedback_by_paciente(db: Session, paciente_id: int):
-    return db.query(models.Feedback).filter(models.Feedback.paciente_id == paciente_id).all()
+def get_feedback_by_paciente(db: Session, paciente_id: int, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    query = db.query(models.Feedback).filter(models.Feedback.paciente_id == paciente_id)
+    return paginar(query, models.Feedback, cursor, limit)
     
 
-def get_historiales(db: Session):
-    return db.query(models.HistorialClinico).all()
+def get_historiales(db: Session, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    return paginar(db.query(models.HistorialClinico), models.HistorialClinico, cursor, limit)
 
 def get_historial(db: Session, historial_id: int):
     return db.query(models.HistorialClinico).filter(models.HistorialClinico.id == historial_id).first()
 
-def get_historiales_by_paciente(db: Session, paciente_id: int):
-    """Obtiene todos los historiales clínicos de un paciente específico"""
-    return db.query(models.HistorialClinico).filter(
+def get_historiales_by_paciente(db: Session, paciente_id: int, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    """Obtiene los historiales clínicos de un paciente específico"""
+    query = db.query(models.HistorialClinico).filter(
         models.HistorialClinico.paciente_id == paciente_id
-    ).all()
+    )
+    return paginar(query, models.HistorialClinico, cursor, limit)
 
 def update_historial(db: Session, historial_id: int, historial_update: schemas.HistorialClinicoCreate):
     historial = get_historial(db, historial_id)
@@ -150,31 +154,28 @@ def create_cita(db: Session, cita: schemas.CitaCreate):
     db.add(db_cita)
     db.commit()
     db.refresh(db_cita)
+    agenda_hoy.agregar(db_cita, get_paciente(db, db_cita.paciente_id))
     return db_cita
 
-def get_citas(db: Session):
-    return db.query(models.Cita).all()
-
-def get_cita(db: Session, cita_id: int):
-    return db.query(models.Cita).filter(models.Cita.id == cita_id).first()
-
-# ==================== CITA ====================
-def create_cita(db: Session, cita: schemas.CitaCreate):
-    db_cita = models.Cita(**cita.dict())
-    db.add(db_cita)
-    db.commit()
-    db.refresh(db_cita)
-    return db_cita
-
-def get_citas(db: Session):
-    return db.query(models.Cita).all()
+def get_citas(db: Session, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    return paginar(db.query(models.Cita), models.Cita, cursor, limit)
 
 def get_cita(db: Session, cita_id: int):
     return db.query(models.Cita).filter(models.Cita.id == cita_id).first()
 
-
-
 def checkin_paciente(db: Session, telefono: str):
+    # Camino rápido: índice en memoria de las citas de hoy + un UPDATE
+    for cita in agenda_hoy.citas_de(db, telefono):
+        actualizadas = db.execute(
+            update(models.Cita).where(models.Cita.id == cita.id).values(estado=ESTADO_EN_SALA)
+        ).rowcount
+        db.commit()
+        if actualizadas:
+            cita.estado = ESTADO_EN_SALA
+            return cita, f"¡Llegada confirmada, {cita.nombre_paciente}! Pasa a la sala de espera."
+        # La cita se eliminó desde otro worker
+        agenda_hoy.quitar(cita.id)
+
     # buscar al paciente por telefono
     paciente = db.query(models.Paciente).filter(models.Paciente.telefono == telefono).first()
     if not paciente:
@@ -194,9 +195,11 @@ def checkin_paciente(db: Session, telefono: str):
         return None, f"Hola {paciente.nombre}, no tienes ninguna cita programada para hoy."
     
     # actualizar el estado 
-    cita.estado = "En sala de espera"
+    cita.estado = ESTADO_EN_SALA
     db.commit()
     db.refresh(cita)
+    # La cita no estaba en el índice (creada desde otro worker): recargar en el próximo check-in
+    agenda_hoy.invalidar()
     
     return cita, f"¡Llegada confirmada, {paciente.nombre}! Pasa a la sala de espera."
 
@@ -208,8 +211,8 @@ def create_consultorio(db: Session, consultorio: schemas.ConsultorioCreate):
     db.refresh(db_consultorio)
     return db_consultorio
 
-def get_consultorios(db: Session):
-    return db.query(models.Consultorio).all()
+def get_consultorios(db: Session, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    return paginar(db.query(models.Consultorio), models.Consultorio, cursor, limit)
 
 # ==================== DOCTOR CONSULTORIO ====================
 def create_doctor_consultorio(db: Session, dc: schemas.DoctorConsultorioCreate):
@@ -219,5 +222,5 @@ def create_doctor_consultorio(db: Session, dc: schemas.DoctorConsultorioCreate):
     db.refresh(db_dc)
     return db_dc
 
-def get_doctor_consultorios(db: Session):
-    return db.query(models.DoctorConsultorio).all()
+def get_doctor_consultorios(db: Session, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    return paginar(db.query(models.DoctorConsultorio), models.DoctorConsultorio, cursor, limit)
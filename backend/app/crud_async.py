@@ -0,0 +1,157 @@
+# crud_async.py
+
+# Variantes asíncronas (AsyncSession) de las operaciones CRUD usadas por las rutas `async def`.
+# Mantienen los mismos nombres y la misma semántica que crud.py.
+from fastapi import HTTPException
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas
+from .crud import LIMITE_POR_DEFECTO, LIMITE_MAXIMO
+from .utils import get_password_hash_async
+from .agenda_hoy import agenda_hoy
+from . import outbox
+
+async def paginar(db: AsyncSession, stmt, modelo, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    """Devuelve hasta `limit` filas con id > cursor, ordenadas por id."""
+    if cursor is not None:
+        stmt = stmt.where(modelo.id > cursor)
+    result = await db.execute(stmt.order_by(modelo.id).limit(min(limit, LIMITE_MAXIMO)))
+    return result.scalars().all()
+
+async def paginar_filas(db: AsyncSession, stmt, modelo, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    """Como `paginar`, para un `select` de columnas: devuelve las filas como tuplas."""
+    if cursor is not None:
+        stmt = stmt.where(modelo.id > cursor)
+    result = await db.execute(stmt.order_by(modelo.id).limit(min(limit, LIMITE_MAXIMO)))
+    return result.all()
+
+async def contar(db: AsyncSession, modelo, *criterios) -> int:
+    """Número de filas de `modelo` que cumplen `criterios` (X-Total-Count de los listados)."""
+    return (await db.execute(select(func.count(modelo.id)).where(*criterios))).scalar_one()
+
+# ==================== USUARIO ====================
+async def create_usuario(db: AsyncSession, usuario: schemas.UsuarioCreate):
+    """
+    Crea un usuario con la contraseña hasheada (en el pool de procesos de bcrypt).
+    Si la profesión no es 'paciente' (case-insensitive) también crea un registro en `doctor`.
+    """
+    if await get_usuario_by_email(db, usuario.correo_electronico):
+        raise HTTPException(status_code=400, detail="El correo ya está registrado")
+
+    usr_data = usuario.dict()
+    usr_data['contrasena'] = await get_password_hash_async(usr_data['contrasena'])
+    db_usuario = models.Usuario(**usr_data)
+    db.add(db_usuario)
+
+    # Registrar como doctor si la profesion no es 'paciente'
+    profesion = (db_usuario.profesion or "").strip().lower()
+    if profesion and profesion != "paciente":
+        result = await db.execute(select(models.Doctor.id).where(models.Doctor.correo_electronico == db_usuario.correo_electronico))
+        if result.scalars().first() is None:
+            db.add(models.Doctor(
+                nombre=db_usuario.nombre,
+                apellidos=db_usuario.apellidos,
+                consultorio=None,
+                profesion=db_usuario.profesion,
+                telefono_celular=None,
+                correo_electronico=db_usuario.correo_electronico
+            ))
+
+    await db.commit()
+    await db.refresh(db_usuario)
+    return db_usuario
+
+async def get_usuario_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(models.Usuario).where(models.Usuario.correo_electronico == email))
+    return result.scalars().first()
+
+async def get_usuario_con_doctor(db: AsyncSession, email: str):
+    """
+    Devuelve (usuario, doctor_id) con una sola consulta (LEFT JOIN por correo).
+    doctor_id es None si el usuario no está registrado como doctor.
+    """
+    result = await db.execute(
+        select(models.Usuario, models.Doctor.id)
+        .outerjoin(models.Doctor, models.Doctor.correo_electronico == models.Usuario.correo_electronico)
+        .where(models.Usuario.correo_electronico == email)
+        .order_by(models.Doctor.id)
+        .limit(1)
+    )
+    fila = result.first()
+    return (fila[0], fila[1]) if fila else (None, None)
+
+# ==================== PACIENTE ====================
+async def get_paciente(db: AsyncSession, paciente_id: int):
+    return await db.get(models.Paciente, paciente_id)
+
+async def get_pacientes(db: AsyncSession, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    return await paginar(db, select(models.Paciente), models.Paciente, cursor, limit)
+
+async def get_pacientes_by_doctor(db: AsyncSession, doctor_id: int, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    stmt = select(models.Paciente).where(models.Paciente.doctor_id == doctor_id)
+    return await paginar(db, stmt, models.Paciente, cursor, limit)
+
+# ==================== HISTORIAL CLÍNICO ====================
+async def get_historial(db: AsyncSession, historial_id: int):
+    return await db.get(models.HistorialClinico, historial_id)
+
+async def get_historiales_by_paciente(db: AsyncSession, paciente_id: int, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    stmt = select(models.HistorialClinico).where(models.HistorialClinico.paciente_id == paciente_id)
+    return await paginar(db, stmt, models.HistorialClinico, cursor, limit)
+
+async def guardar_analisis_ia(db: AsyncSession, historial_id: int, analisis: dict):
+    """Guarda el análisis de IA en `analisis_ia`. Devuelve None si el historial no existe."""
+    historial = await get_historial(db, historial_id)
+    if historial:
+        historial.analisis_ia = analisis
+        await db.commit()
+    return historial
+
+# ==================== CITA ====================
+async def create_cita(db: AsyncSession, cita: schemas.CitaCreate):
+    """
+    Crea la cita y, si tiene correo, encola sus correos en `correo_saliente`
+    en la misma transacción (los envía el trabajador de outbox.py).
+    """
+    db_cita = models.Cita(**cita.dict())
+    db.add(db_cita)
+    paciente = await get_paciente(db, db_cita.paciente_id)
+    if db_cita.correo_electronico and paciente:
+        await db.flush()  # id de la cita para los correos
+        for correo in outbox.correos_de_cita(db_cita, paciente):
+            correo.cita_id = db_cita.id
+            db.add(correo)
+    await db.commit()
+    await db.refresh(db_cita)
+    agenda_hoy.agregar(db_cita, paciente)
+    return db_cita
+
+async def get_citas(db: AsyncSession, cursor: int = None, limit: int = LIMITE_POR_DEFECTO):
+    return await paginar(db, select(models.Cita), models.Cita, cursor, limit)
+
+async def get_cita(db: AsyncSession, cita_id: int):
+    return await db.get(models.Cita, cita_id)
+
+async def delete_cita(db: AsyncSession, cita_id: int):
+    cita = await get_cita(db, cita_id)
+    if cita:
+        await db.execute(cancelar_correos_de_cita(cita_id))
+        await db.delete(cita)
+        await db.commit()
+        agenda_hoy.quitar(cita_id)
+    return cita
+
+def cancelar_correos_de_cita(cita_id: int):
+    """UPDATE que cancela los correos aún pendientes de una cita."""
+    return (
+        update(models.CorreoSaliente)
+        .where(models.CorreoSaliente.cita_id == cita_id, models.CorreoSaliente.estado == outbox.PENDIENTE)
+        .values(estado=outbox.CANCELADO)
+    )
+
+async def get_correos_de_cita(db: AsyncSession, cita_id: int):
+    result = await db.execute(
+        select(models.CorreoSaliente).where(models.CorreoSaliente.cita_id == cita_id)
+        .order_by(models.CorreoSaliente.programado_para)
+    )
+    return result.scalars().all()
@@ -1,8 +1,13 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 from dotenv import load_dotenv
 from pathlib import Path
+from .pool_metrics import MetricasPool, pool_con_metricas
+from .instrumentacion_sql import instrumentar
 
 # Obtener la ruta del directorio backend
 backend_dir = Path(__file__).resolve().parent.parent
@@ -18,17 +23,79 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Usar los nombres de variables en .env
 MYSQL_USER = os.getenv("DB_USER")
 MYSQL_PASSWORD = os.getenv("DB_PASSWORD")
 MYSQL_HOST = os.getenv("DB_HOST")
 MYSQL_DB = os.getenv("DB_NAME")
 
-
-SQLALCHEMY_DATABASE_URL = (
+# DATABASE_URL permite sustituir MySQL (p. ej. sqlite:///./test.db en pruebas)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or (
     f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DB}"
 )
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True)
+# Driver asíncrono equivalente a cada driver síncrono
+DRIVERS_ASINCRONOS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql+mysqldb": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+def url_asincrona(url: str) -> str:
+    """Traduce la URL síncrona a la del driver asíncrono (aiomysql / aiosqlite)."""
+    url = make_url(url)
+    driver = DRIVERS_ASINCRONOS.get(url.drivername, url.drivername)
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or url_asincrona(SQLALCHEMY_DATABASE_URL)
+
+connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+
+# Pool de conexiones (valores por worker de uvicorn).
+# DB_POOL_PRE_PING=true comprueba la conexión en cada checkout (pesimista);
+# con false solo se confía en DB_POOL_RECYCLE para descartar conexiones viejas.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 3600))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes", "si")
+
+metricas_pool = MetricasPool("sync")
+metricas_pool_async = MetricasPool("async")
+
+def opciones_pool(url: str, pool_cls, metricas: MetricasPool) -> dict:
+    opciones = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    # SQLite en memoria usa un pool de una sola conexión sin tamaño configurable
+    if ":memory:" not in url:
+        opciones.update({
+            "poolclass": pool_con_metricas(pool_cls, metricas),
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+        })
+    return opciones
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args=connect_args,
+    **opciones_pool(SQLALCHEMY_DATABASE_URL, QueuePool, metricas_pool),
+)
+metricas_pool.escuchar(engine.pool)
+instrumentar(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+
+# Motor asíncrono: las rutas `async def` lo usan para no bloquear el event loop
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    **opciones_pool(ASYNC_DATABASE_URL, AsyncAdaptedQueuePool, metricas_pool_async),
+)
+metricas_pool_async.escuchar(async_engine.sync_engine.pool)
+instrumentar(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+Base = declarative_base()
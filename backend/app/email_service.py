@@ -1,233 +1,276 @@
 """
 Servicio de envío de correos electrónicos
+
+Los envíos usan un pool de conexiones SMTP persistentes (`PoolSMTP`): cada
+conexión se abre, hace STARTTLS y login una sola vez y se reutiliza mientras
+siga sana. Para pruebas locales basta un servidor sin TLS ni autenticación
+(p. ej. `python -m aiosmtpd -n -l localhost:1025` con SMTP_STARTTLS=false y
+sin SMTP_USER).
+
+Los mensajes se generan con las plantillas precompiladas de `email_templates.py`.
 """
 import os
+import time
+import asyncio
 import logging
-from email.mime.text import MIMEText
+from contextlib import asynccontextmanager
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 import aiosmtplib
+from .metricas import envios_smtp, latencia_smtp, conexiones_smtp
+from .email_templates import (
+    MensajeRenderizado,
+    renderizar,
+    CONFIRMACION_CITA,
+    SEGUIMIENTO_RUTINARIO,
+    FEEDBACK_POSTOPERATORIO,
+    RECORDATORIO_CITA,
+)
 
 logger = logging.getLogger("uvicorn.error")
 
-async def enviar_correo_confirmacion_cita(
+
+class ConfiguracionSMTP:
+    """Configuración SMTP leída de las variables de entorno."""
+    def __init__(self):
+        self.servidor = os.getenv("SMTP_SERVER")
+        self.puerto = int(os.getenv("SMTP_PORT", 587))
+        self.usuario = os.getenv("SMTP_USER")
+        self.password = os.getenv("SMTP_PASSWORD")
+        self.remitente = os.getenv("FROM_EMAIL")
+        self.starttls = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes", "si")
+        self.timeout = float(os.getenv("SMTP_TIMEOUT", 30))
+        self.tamano_pool = int(os.getenv("SMTP_POOL_TAMANO", 3))
+        # Una conexión inactiva más de este tiempo se comprueba con NOOP antes de reutilizarla
+        self.comprobar_tras_s = float(os.getenv("SMTP_COMPROBAR_TRAS_S", 10))
+        # ... y se descarta sin más si lleva inactiva más de este tiempo
+        self.inactividad_max_s = float(os.getenv("SMTP_INACTIVIDAD_MAX_S", 120))
+
+    def validar(self):
+        # Servidor y remitente son obligatorios; las credenciales solo si el servidor pide login
+        if not all([self.servidor, self.remitente]) or (self.usuario and not self.password):
+            logger.error("Configuración de correo incompleta")
+            raise ValueError("Configuración de correo incompleta en variables de entorno")
+
+
+class PoolSMTP:
+    """
+    Pool acotado de conexiones SMTP persistentes.
+
+    - Como mucho `tamano_pool` conexiones simultáneas; el resto espera turno.
+    - Las conexiones inactivas se comprueban con NOOP (o se descartan si llevan
+      demasiado tiempo paradas) antes de reutilizarse.
+    - Si una conexión falla durante su uso se descarta; `enviar` reintenta una
+      vez con una conexión nueva cuando el servidor cerró la existente.
+    """
+    def __init__(self, config: ConfiguracionSMTP):
+        config.validar()
+        self.config = config
+        self._semaforo = asyncio.Semaphore(config.tamano_pool)
+        self._libres = []  # [(smtp, ultimo_uso)]
+        self.conexiones_abiertas = 0
+        self.reconexiones = 0
+
+    async def _conectar(self):
+        config = self.config
+        smtp = aiosmtplib.SMTP(
+            hostname=config.servidor,
+            port=config.puerto,
+            use_tls=False,  # No usar TLS en la conexión inicial
+            start_tls=config.starttls,  # STARTTLS tras conectar (si está activado)
+            timeout=config.timeout,
+        )
+        await smtp.connect()
+        if config.usuario:
+            await smtp.login(config.usuario, config.password)
+        self.conexiones_abiertas += 1
+        conexiones_smtp.inc()
+        logger.info(f"Conexión SMTP abierta con {config.servidor}:{config.puerto}")
+        return smtp
+
+    async def _descartar(self, smtp):
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    async def _obtener(self):
+        """Devuelve una conexión sana: reutiliza la más reciente o abre una nueva."""
+        while self._libres:
+            smtp, ultimo_uso = self._libres.pop()
+            inactiva = time.monotonic() - ultimo_uso
+            if not smtp.is_connected or inactiva > self.config.inactividad_max_s:
+                await self._descartar(smtp)
+                continue
+            if inactiva > self.config.comprobar_tras_s:
+                try:
+                    await smtp.noop()
+                except Exception:
+                    await self._descartar(smtp)
+                    continue
+            return smtp
+        return await self._conectar()
+
+    @asynccontextmanager
+    async def conexion(self):
+        """Presta una conexión del pool durante el bloque `async with`."""
+        async with self._semaforo:
+            smtp = await self._obtener()
+            try:
+                yield smtp
+            except BaseException:
+                await self._descartar(smtp)
+                raise
+            if smtp.is_connected:
+                self._libres.append((smtp, time.monotonic()))
+
+    async def _enviar_por(self, smtp, mensaje):
+        inicio = time.perf_counter()
+        try:
+            if isinstance(mensaje, MensajeRenderizado):
+                # Mensaje de plantilla: ya son bytes, sin pasar por el generador de `email`
+                remitente = self.config.remitente
+                await smtp.sendmail(remitente, [mensaje.destinatario], mensaje.como_bytes(remitente))
+            else:
+                if not mensaje.get("From"):
+                    mensaje["From"] = self.config.remitente
+                await smtp.send_message(mensaje)
+        except Exception:
+            envios_smtp.inc("error")
+            raise
+        envios_smtp.inc("ok")
+        latencia_smtp.observar(valor=time.perf_counter() - inicio)
+
+    async def enviar(self, mensaje, smtp=None):
+        """
+        Envía `mensaje` (de `email` o `MensajeRenderizado`). Si se pasa `smtp`
+        (de `conexion()`) se usa esa conexión; si no, se toma una del pool.
+        """
+        if smtp is not None:
+            await self._enviar_por(smtp, mensaje)
+            return True
+        try:
+            async with self.conexion() as smtp:
+                await self._enviar_por(smtp, mensaje)
+        except aiosmtplib.SMTPServerDisconnected:
+            # El servidor cerró la conexión reutilizada: un reintento con una nueva
+            self.reconexiones += 1
+            async with self.conexion() as smtp:
+                await self._enviar_por(smtp, mensaje)
+        return True
+
+    async def cerrar(self):
+        libres, self._libres = self._libres, []
+        for smtp, _ in libres:
+            await self._descartar(smtp)
+
+
+_pool_smtp = None
+_pool_smtp_loop = None
+
+def obtener_pool_smtp() -> PoolSMTP:
+    """Pool SMTP del event loop actual (se crea en el primer uso)."""
+    global _pool_smtp, _pool_smtp_loop
+    loop = asyncio.get_running_loop()
+    if _pool_smtp is None or _pool_smtp_loop is not loop:
+        _pool_smtp = PoolSMTP(ConfiguracionSMTP())
+        _pool_smtp_loop = loop
+    return _pool_smtp
+
+async def cerrar_pool_smtp():
+    global _pool_smtp, _pool_smtp_loop
+    if _pool_smtp is not None:
+        await _pool_smtp.cerrar()
+    _pool_smtp = None
+    _pool_smtp_loop = None
+
+def generar_mensaje_confirmacion_cita(
     destinatario: str,
     nombre_paciente: str,
     fecha_cita: str,
     hora_cita: str,
     motivo: str = "Consulta dental"
-):
+) -> MensajeRenderizado:
     """
-    Envía un correo de confirmación de cita
+    Genera el correo de confirmación de cita
     """
-    smtp_server = os.getenv("SMTP_SERVER")
-    smtp_port = int(os.getenv("SMTP_PORT", 587))
-    smtp_user = os.getenv("SMTP_USER")
-    smtp_password = os.getenv("SMTP_PASSWORD")
-    from_email = os.getenv("FROM_EMAIL")
-
-    # Validar configuración
-    if not all([smtp_server, smtp_user, smtp_password, from_email]):
-        logger.error("Configuración de correo incompleta")
-        raise ValueError("Configuración de correo incompleta en variables de entorno")
-    
-    logger.info(f"Intentando enviar correo a {destinatario}")
-    logger.info(f"SMTP Server: {smtp_server}:{smtp_port}")
-    logger.info(f"SMTP User: {smtp_user}")
-
-    # Crear mensaje
-    mensaje = MIMEMultipart("alternative")
-    mensaje["Subject"] = f"Confirmación de Cita - {fecha_cita}"
-    mensaje["From"] = from_email
-    mensaje["To"] = destinatario
-
-    # Cuerpo del correo en texto plano
-    texto_plano = f"""Estimado/a {nombre_paciente},
-
-Su cita ha sido confirmada para el día {fecha_cita} a las {hora_cita}.
-Motivo: {motivo}
-
-Por favor, llegue 10 minutos antes de su cita.
+    return renderizar(
+        CONFIRMACION_CITA, destinatario,
+        nombre_paciente=nombre_paciente, fecha_cita=fecha_cita, hora_cita=hora_cita, motivo=motivo,
+    )
 
-Saludos,
-Clínica Dental
-"""
 
-    # Cuerpo del correo en HTML
-    html = f"""
-    <html>
-      <head>
-        <style>
-          body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-          .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-          .header {{ background-color: #4F46E5; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
-          .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 5px 5px; }}
-          .cita-info {{ background-color: white; padding: 20px; border-left: 4px solid #4F46E5; margin: 20px 0; }}
-          .footer {{ text-align: center; margin-top: 20px; font-size: 12px; color: #666; }}
-          h1 {{ margin: 0; }}
-          .highlight {{ color: #4F46E5; font-weight: bold; }}
-        </style>
-      </head>
-      <body>
-        <div class="container">
-          <div class="header">
-            <h1>🦷 Confirmación de Cita</h1>
-          </div>
-          <div class="content">
-            <p>Estimado/a <strong>{nombre_paciente}</strong>,</p>
-            
-            <p>Su cita ha sido confirmada exitosamente. A continuación los detalles:</p>
-            
-            <div class="cita-info">
-              <p><strong>📅 Fecha:</strong> <span class="highlight">{fecha_cita}</span></p>
-              <p><strong>🕐 Hora:</strong> <span class="highlight">{hora_cita}</span></p>
-              <p><strong>📋 Motivo:</strong> {motivo}</p>
-            </div>
-            
-            <p><strong>Recomendaciones:</strong></p>
-            <ul>
-              <li>Por favor, llegue <strong>10 minutos antes</strong> de su cita</li>
-              <li>Traiga su identificación y tarjeta de seguro (si aplica)</li>
-              <li>Si necesita cancelar, hágalo con al menos 24 horas de anticipación</li>
-            </ul>
-            
-            <div class="footer">
-              <p>Clínica Dental | Cuidando tu sonrisa</p>
-            </div>
-          </div>
-        </div>
-      </body>
-    </html>
+def generar_mensaje_recordatorio_cita(
+    destinatario: str,
+    nombre_paciente: str,
+    fecha_cita: str,
+    hora_cita: str,
+    motivo: str = "Consulta general"
+) -> MensajeRenderizado:
     """
+    Genera el recordatorio de una cita próxima (campañas de recordatorios)
+    """
+    return renderizar(
+        RECORDATORIO_CITA, destinatario,
+        nombre_paciente=nombre_paciente, fecha_cita=fecha_cita, hora_cita=hora_cita, motivo=motivo,
+    )
 
-    # Adjuntar ambas versiones
-    parte_texto = MIMEText(texto_plano, "plain", "utf-8")
-    parte_html = MIMEText(html, "html", "utf-8")
-    
-    mensaje.attach(parte_texto)
-    mensaje.attach(parte_html)
 
+async def enviar_correo_confirmacion_cita(
+    destinatario: str,
+    nombre_paciente: str,
+    fecha_cita: str,
+    hora_cita: str,
+    motivo: str = "Consulta dental"
+):
+    """
+    Envía un correo de confirmación de cita
+    """
+    logger.info(f"Intentando enviar correo a {destinatario}")
+    mensaje = generar_mensaje_confirmacion_cita(destinatario, nombre_paciente, fecha_cita, hora_cita, motivo)
     try:
-        # Conectar al servidor SMTP
-        logger.info("Conectando al servidor SMTP...")
-        smtp = aiosmtplib.SMTP(
-            hostname=smtp_server,
-            port=smtp_port,
-            use_tls=False,  # No usar TLS en la conexión inicial
-            start_tls=True   # Pero sí permitir STARTTLS después
-        )
-        
-        await smtp.connect()
-        logger.info("Conexión establecida")
-        
-        # STARTTLS se maneja automáticamente con start_tls=True
-        logger.info("Iniciando STARTTLS...")
-        
-        await smtp.login(smtp_user, smtp_password)
-        logger.info("Login exitoso")
-        
-        await smtp.send_message(mensaje)
+        await obtener_pool_smtp().enviar(mensaje)
         logger.info(f"Correo enviado exitosamente a {destinatario}")
-        
-        await smtp.quit()
-        logger.info("Conexión cerrada")
-        
         return True
-        
     except Exception as e:
         logger.error(f"Error al enviar correo: {str(e)}")
         logger.exception("Traceback completo:")
         raise
 
 
+ETAPAS_SEGUIMIENTO = {
+    "2_hours": ("Recordatorio: Evita alimentos oscuros",
+                "Recomendación: Evite alimentos y bebidas que manchen durante las próximas 24 horas."),
+    "3_days": ("Recordatorio: Sensibilidad normal tras el tratamiento",
+               "Nota: Es normal experimentar algo de sensibilidad hasta 3-5 días. Use analgesia según indicación."),
+}
+
 def generar_mensaje_seguimiento_rutinario(
     destinatario: str,
     nombre_paciente: str,
     procedimiento: str,
     etapa: str
-) -> MIMEMultipart:
+) -> MensajeRenderizado:
     """
-    Devuelve un objeto MIMEMultipart listo para enviar vía Gmail.
+    Genera el mensaje de seguimiento rutinario.
 
     - `etapa` ejemplos: "2_hours", "3_days", o texto libre para personalizar.
     """
-    etapa_map = {
-        "2_hours": ("Recordatorio: Evita alimentos oscuros", 
-                    "Recomendación: Evite alimentos y bebidas que manchen durante las próximas 24 horas."),
-        "3_days": ("Recordatorio: Sensibilidad normal tras el tratamiento",
-                   "Nota: Es normal experimentar algo de sensibilidad hasta 3-5 días. Use analgesia según indicación."),
-    }
-    subject_extra, body_extra = etapa_map.get(etapa, (f"Seguimiento: {etapa}", ""))
-
-    mensaje = MIMEMultipart("alternative")
-    mensaje["Subject"] = f"{subject_extra} — {procedimiento}"
-    mensaje["To"] = destinatario
-
-    texto = f"""Estimado/a {nombre_paciente},
-
-Este es un mensaje automático de seguimiento tras su procedimiento: {procedimiento}.
-
-{body_extra}
-
-Si observa algo inusual (sangrado persistente, dolor intenso o fiebre), contacte con la clínica.
-
-Atentamente,
-Clínica Dental
-"""
-    html = f"""
-    <html>
-      <body style="font-family: Arial, sans-serif; color:#333;">
-        <div style="max-width:600px;margin:0 auto;padding:16px;">
-          <h2 style="color:#4F46E5;margin:0 0 8px 0;">{subject_extra}</h2>
-          <p>Estimado/a <strong>{nombre_paciente}</strong>,</p>
-          <p>Este mensaje es un recordatorio automático tras su procedimiento: <strong>{procedimiento}</strong>.</p>
-          <div style="background:#fff;padding:12px;border-left:4px solid #4F46E5;margin:12px 0;">
-            <p style="margin:0;">{body_extra}</p>
-          </div>
-          <p style="margin-top:12px;">Si observa algo inusual (sangrado persistente, dolor intenso o fiebre), contacte con la clínica.</p>
-          <p style="color:#666;font-size:12px;margin-top:20px;">Clínica Dental | Cuidando tu sonrisa</p>
-        </div>
-      </body>
-    </html>
-    """
-
-    parte_texto = MIMEText(texto, "plain", "utf-8")
-    parte_html = MIMEText(html, "html", "utf-8")
-    mensaje.attach(parte_texto)
-    mensaje.attach(parte_html)
-    return mensaje
+    titulo, nota = ETAPAS_SEGUIMIENTO.get(etapa, (f"Seguimiento: {etapa}", ""))
+    return renderizar(
+        SEGUIMIENTO_RUTINARIO, destinatario,
+        nombre_paciente=nombre_paciente, procedimiento=procedimiento, titulo=titulo, nota=nota,
+    )
 
 
-async def enviar_mensaje(mensaje: MIMEMultipart) -> bool:
+async def enviar_mensaje(mensaje: MIMEMultipart | MensajeRenderizado) -> bool:
     """
-    Envia un objeto MIMEMultipart usando la configuración SMTP de entorno.
-    Retorna True si se envi� correctamente, lanza excepción en caso contrario.
+    Envia un objeto MIMEMultipart (o un mensaje de plantilla) por una conexión del pool SMTP.
+    Retorna True si se envió correctamente, lanza excepción en caso contrario.
     """
-    smtp_server = os.getenv("SMTP_SERVER")
-    smtp_port = int(os.getenv("SMTP_PORT", 587))
-    smtp_user = os.getenv("SMTP_USER")
-    smtp_password = os.getenv("SMTP_PASSWORD")
-    from_email = os.getenv("FROM_EMAIL")
-
-    if not all([smtp_server, smtp_user, smtp_password, from_email]):
-      logger.error("Configuración de correo incompleta (en enviar_mensaje)")
-      raise ValueError("Configuración de correo incompleta en variables de entorno")
-
-    # Asegurar que exista el campo From
-    if not mensaje.get("From"):
-      mensaje["From"] = from_email
-
     try:
-      smtp = aiosmtplib.SMTP(
-        hostname=smtp_server,
-        port=smtp_port,
-        use_tls=False,
-        start_tls=True,
-      )
-      await smtp.connect()
-      await smtp.login(smtp_user, smtp_password)
-      await smtp.send_message(mensaje)
-      await smtp.quit()
+      await obtener_pool_smtp().enviar(mensaje)
       logger.info(f"Correo enviado a {mensaje.get('To')}")
       return True
     except Exception as e:
@@ -236,70 +279,13 @@ async def enviar_mensaje(mensaje: MIMEMultipart) -> bool:
       raise
 
 
-async def enviar_tres_correos_demo(
-    destinatario: str,
-    nombre_paciente: str,
-    fecha_cita: str,
-    hora_cita: str,
-    motivo: str = "Consulta general",
-    procedimiento: str = "Procedimiento",
-    formulario_url: str = None,
-    paciente_id: int = None
-  ) -> bool:
-    """
-    Envía tres correos de demostración tras registro/agendamiento:
-      1) Confirmación (usa enviar_correo_confirmacion_cita)
-      2) Mensaje de seguimiento rutinario (ej. 2_hours)
-      3) Solicitud de feedback post-operatorio (ej. 24 horas)
-
-    Nota: en producción estos se programarían para enviarse más tarde; aquí
-    se envían inmediatamente para demostrar su existencia.
-    """
-    # Intentar enviar la confirmación (función existente)
-    await enviar_correo_confirmacion_cita(
-      destinatario=destinatario,
-      nombre_paciente=nombre_paciente,
-      fecha_cita=fecha_cita,
-      hora_cita=hora_cita,
-      motivo=motivo,
-    )
-
-    # Enviar mensaje de seguimiento rutinario (2_hours) inmediatamente
-    try:
-      seguimiento = generar_mensaje_seguimiento_rutinario(
-        destinatario=destinatario,
-        nombre_paciente=nombre_paciente,
-        procedimiento=procedimiento,
-        etapa="2_hours",
-      )
-      await enviar_mensaje(seguimiento)
-    except Exception:
-      logger.warning("Fallo enviando mensaje de seguimiento rutinario (demo)")
-
-    # Enviar solicitud de feedback postoperatorio (24 horas) inmediatamente
-    try:
-      formulario_url = formulario_url or os.getenv("FORMULARIO_URL", "http://localhost:8000/feedback")
-      feedback = generar_mensaje_postoperatorio_feedback(
-        destinatario=destinatario,
-        nombre_paciente=nombre_paciente,
-        procedimiento=procedimiento,
-        horas_postop=24,
-        paciente_id=paciente_id  # <-- asegúrate de tener esta variable disponible
-    )
-      await enviar_mensaje(feedback)
-    except Exception:
-      logger.warning("Fallo enviando mensaje de feedback postoperatorio (demo)")
-
-    return True
-
-
 def generar_mensaje_postoperatorio_feedback(
     destinatario: str,
     nombre_paciente: str,
     procedimiento: str,
     horas_postop: int,
     paciente_id: int
-) -> MIMEMultipart:
+) -> MensajeRenderizado:
     """
     Genera el correo que solicita feedback postoperatorio (escala 1-10).
     - `horas_postop`: 24, 48 o 72 (se inserta en asunto y cuerpo).
@@ -307,52 +293,8 @@ def generar_mensaje_postoperatorio_feedback(
     """
     # Ajustar esta URL según el dominio real de tu frontend
     formulario_url = f"http://localhost:5173/feedback/{paciente_id}"
-    
-    mensaje = MIMEMultipart("alternative")
-    mensaje["Subject"] = f"Formulario post-operatorio — {procedimiento} — {horas_postop} horas"
-    mensaje["To"] = destinatario
-
-    texto = f"""Estimado/a {nombre_paciente},
-
-Por favor complete este breve formulario de seguimiento {horas_postop} horas después de su intervención ({procedimiento}).
-
-En el formulario podrá valorar (1-10) su:
- - Dolor
- - Sangrado
- - Inflamación
-
-Acceda al formulario aquí: {formulario_url}
-
-Su respuesta nos ayuda a detectar y actuar ante complicaciones de forma temprana.
-
-Gracias,
-Clínica Dental
-"""
-    html = f"""
-    <html>
-      <body style="font-family: Arial, sans-serif; color:#333;">
-        <div style="max-width:600px;margin:0 auto;padding:16px;">
-          <h2 style="color:#4F46E5;margin:0 0 8px 0;">Seguimiento post-operatorio — {horas_postop} horas</h2>
-          <p>Estimado/a <strong>{nombre_paciente}</strong>,</p>
-          <p>Le rogamos complete este breve formulario tras su intervención: <strong>{procedimiento}</strong>.</p>
-          <ul>
-            <li>Valore su dolor (1 = ninguno, 10 = máximo)</li>
-            <li>Valore el sangrado (1 = ninguno, 10 = severo)</li>
-            <li>Valore la inflamación (1 = mínima, 10 = severa)</li>
-          </ul>
-          <p style="text-align:center;margin:18px 0;">
-            <a href="{formulario_url}" style="background:#4F46E5;color:#fff;padding:12px 18px;border-radius:6px;text-decoration:none;display:inline-block;">
-              Completar formulario
-            </a>
-          </p>
-          <p style="color:#666;font-size:12px;">Su respuesta es confidencial y se usa para seguimiento clínico.</p>
-        </div>
-      </body>
-    </html>
-    """
-
-    parte_texto = MIMEText(texto, "plain", "utf-8")
-    parte_html = MIMEText(html, "html", "utf-8")
-    mensaje.attach(parte_texto)
-    mensaje.attach(parte_html)
-    return mensaje
+    return renderizar(
+        FEEDBACK_POSTOPERATORIO, destinatario,
+        nombre_paciente=nombre_paciente, procedimiento=procedimiento,
+        horas_postop=horas_postop, formulario_url=formulario_url,
+    )
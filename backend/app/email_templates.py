@@ -0,0 +1,273 @@
+# email_templates.py
+"""
+Registro de plantillas de correo.
+
+Cada plantilla (asunto, texto plano y HTML) se compila con `string.Template`
+una sola vez al importar el módulo, y el esqueleto MIME (cabeceras
+multipart, separadores y cabeceras de cada parte) se precalcula como bytes.
+Renderizar un mensaje solo sustituye variables, escapa las del HTML y
+codifica en base64 las dos partes; no se construye ningún árbol `MIMEMultipart`.
+
+El resultado (`MensajeRenderizado`) son los bytes listos para `sendmail`;
+`PoolSMTP.enviar` los acepta igual que un mensaje de `email`.
+"""
+import base64
+import html
+import secrets
+from email.header import Header
+from string import Template
+
+CONFIRMACION_CITA = "confirmacion_cita"
+SEGUIMIENTO_RUTINARIO = "seguimiento_rutinario"
+FEEDBACK_POSTOPERATORIO = "feedback_postoperatorio"
+RECORDATORIO_CITA = "recordatorio_cita"
+
+CRLF = b"\r\n"
+
+
+def _base64(texto: str) -> bytes:
+    # Líneas de 76 caracteres terminadas en CRLF, como MIMEText con utf-8
+    return base64.encodebytes(texto.encode("utf-8")).replace(b"\n", CRLF)
+
+
+def _cabecera(valor) -> str:
+    # Sin saltos de línea: evita inyectar cabeceras desde los datos del paciente
+    return str(valor).replace("\r", " ").replace("\n", " ")
+
+
+class MensajeRenderizado:
+    """Mensaje ya codificado; `como_bytes` añade el remitente."""
+    __slots__ = ("destinatario", "asunto", "_cuerpo")
+
+    def __init__(self, destinatario: str, asunto: str, cuerpo: bytes):
+        self.destinatario = destinatario
+        self.asunto = asunto
+        self._cuerpo = cuerpo
+
+    def get(self, cabecera: str, default=None):
+        # Compatibilidad con el uso de `mensaje.get("To")` en los logs
+        return {"To": self.destinatario, "Subject": self.asunto}.get(cabecera, default)
+
+    def como_bytes(self, remitente: str) -> bytes:
+        return b"From: " + _cabecera(remitente).encode("utf-8") + CRLF + self._cuerpo
+
+
+class PlantillaCorreo:
+    """Plantilla compilada de un correo multipart/alternative (texto + HTML)."""
+
+    def __init__(self, nombre: str, asunto: str, texto: str, html: str):
+        self.nombre = nombre
+        self.asunto = Template(asunto)
+        self.texto = Template(texto)
+        self.html = Template(html)
+        # La frontera no puede aparecer en las partes: "_" y "." no existen en base64
+        frontera = f"=_clinica.{nombre}.{secrets.token_hex(8)}"
+        self._inicio = (
+            f"MIME-Version: 1.0\r\n"
+            f'Content-Type: multipart/alternative; boundary="{frontera}"\r\n'
+            f"\r\n"
+            f"--{frontera}\r\n"
+            f'Content-Type: text/plain; charset="utf-8"\r\n'
+            f"Content-Transfer-Encoding: base64\r\n"
+            f"\r\n"
+        ).encode("ascii")
+        self._separador = (
+            f"--{frontera}\r\n"
+            f'Content-Type: text/html; charset="utf-8"\r\n'
+            f"Content-Transfer-Encoding: base64\r\n"
+            f"\r\n"
+        ).encode("ascii")
+        self._fin = f"--{frontera}--\r\n".encode("ascii")
+
+    def renderizar(self, destinatario: str, **variables) -> MensajeRenderizado:
+        asunto = _cabecera(self.asunto.substitute(variables))
+        escapadas = {clave: html.escape(str(valor)) for clave, valor in variables.items()}
+        cuerpo = b"".join((
+            b"To: ", _cabecera(destinatario).encode("utf-8"), CRLF,
+            b"Subject: ", Header(asunto, "utf-8").encode(linesep="\r\n").encode("ascii"), CRLF,
+            self._inicio,
+            _base64(self.texto.substitute(variables)),
+            self._separador,
+            _base64(self.html.substitute(escapadas)),
+            self._fin,
+        ))
+        return MensajeRenderizado(destinatario, asunto, cuerpo)
+
+
+PLANTILLAS = {}
+
+def registrar(plantilla: PlantillaCorreo):
+    PLANTILLAS[plantilla.nombre] = plantilla
+    return plantilla
+
+def renderizar(nombre: str, destinatario: str, **variables) -> MensajeRenderizado:
+    return PLANTILLAS[nombre].renderizar(destinatario, **variables)
+
+
+registrar(PlantillaCorreo(
+    CONFIRMACION_CITA,
+    asunto="Confirmación de Cita - $fecha_cita",
+    texto="""Estimado/a $nombre_paciente,
+
+Su cita ha sido confirmada para el día $fecha_cita a las $hora_cita.
+Motivo: $motivo
+
+Por favor, llegue 10 minutos antes de su cita.
+
+Saludos,
+Clínica Dental
+""",
+    html="""
+    <html>
+      <head>
+        <style>
+          body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+          .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+          .header { background-color: #4F46E5; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }
+          .content { background-color: #f9f9f9; padding: 30px; border-radius: 0 0 5px 5px; }
+          .cita-info { background-color: white; padding: 20px; border-left: 4px solid #4F46E5; margin: 20px 0; }
+          .footer { text-align: center; margin-top: 20px; font-size: 12px; color: #666; }
+          h1 { margin: 0; }
+          .highlight { color: #4F46E5; font-weight: bold; }
+        </style>
+      </head>
+      <body>
+        <div class="container">
+          <div class="header">
+            <h1>🦷 Confirmación de Cita</h1>
+          </div>
+          <div class="content">
+            <p>Estimado/a <strong>$nombre_paciente</strong>,</p>
+
+            <p>Su cita ha sido confirmada exitosamente. A continuación los detalles:</p>
+
+            <div class="cita-info">
+              <p><strong>📅 Fecha:</strong> <span class="highlight">$fecha_cita</span></p>
+              <p><strong>🕐 Hora:</strong> <span class="highlight">$hora_cita</span></p>
+              <p><strong>📋 Motivo:</strong> $motivo</p>
+            </div>
+
+            <p><strong>Recomendaciones:</strong></p>
+            <ul>
+              <li>Por favor, llegue <strong>10 minutos antes</strong> de su cita</li>
+              <li>Traiga su identificación y tarjeta de seguro (si aplica)</li>
+              <li>Si necesita cancelar, hágalo con al menos 24 horas de anticipación</li>
+            </ul>
+
+            <div class="footer">
+              <p>Clínica Dental | Cuidando tu sonrisa</p>
+            </div>
+          </div>
+        </div>
+      </body>
+    </html>
+    """,
+))
+
+registrar(PlantillaCorreo(
+    SEGUIMIENTO_RUTINARIO,
+    asunto="$titulo — $procedimiento",
+    texto="""Estimado/a $nombre_paciente,
+
+Este es un mensaje automático de seguimiento tras su procedimiento: $procedimiento.
+
+$nota
+
+Si observa algo inusual (sangrado persistente, dolor intenso o fiebre), contacte con la clínica.
+
+Atentamente,
+Clínica Dental
+""",
+    html="""
+    <html>
+      <body style="font-family: Arial, sans-serif; color:#333;">
+        <div style="max-width:600px;margin:0 auto;padding:16px;">
+          <h2 style="color:#4F46E5;margin:0 0 8px 0;">$titulo</h2>
+          <p>Estimado/a <strong>$nombre_paciente</strong>,</p>
+          <p>Este mensaje es un recordatorio automático tras su procedimiento: <strong>$procedimiento</strong>.</p>
+          <div style="background:#fff;padding:12px;border-left:4px solid #4F46E5;margin:12px 0;">
+            <p style="margin:0;">$nota</p>
+          </div>
+          <p style="margin-top:12px;">Si observa algo inusual (sangrado persistente, dolor intenso o fiebre), contacte con la clínica.</p>
+          <p style="color:#666;font-size:12px;margin-top:20px;">Clínica Dental | Cuidando tu sonrisa</p>
+        </div>
+      </body>
+    </html>
+    """,
+))
+
+registrar(PlantillaCorreo(
+    FEEDBACK_POSTOPERATORIO,
+    asunto="Formulario post-operatorio — $procedimiento — $horas_postop horas",
+    texto="""Estimado/a $nombre_paciente,
+
+Por favor complete este breve formulario de seguimiento $horas_postop horas después de su intervención ($procedimiento).
+
+En el formulario podrá valorar (1-10) su:
+ - Dolor
+ - Sangrado
+ - Inflamación
+
+Acceda al formulario aquí: $formulario_url
+
+Su respuesta nos ayuda a detectar y actuar ante complicaciones de forma temprana.
+
+Gracias,
+Clínica Dental
+""",
+    html="""
+    <html>
+      <body style="font-family: Arial, sans-serif; color:#333;">
+        <div style="max-width:600px;margin:0 auto;padding:16px;">
+          <h2 style="color:#4F46E5;margin:0 0 8px 0;">Seguimiento post-operatorio — $horas_postop horas</h2>
+          <p>Estimado/a <strong>$nombre_paciente</strong>,</p>
+          <p>Le rogamos complete este breve formulario tras su intervención: <strong>$procedimiento</strong>.</p>
+          <ul>
+            <li>Valore su dolor (1 = ninguno, 10 = máximo)</li>
+            <li>Valore el sangrado (1 = ninguno, 10 = severo)</li>
+            <li>Valore la inflamación (1 = mínima, 10 = severa)</li>
+          </ul>
+          <p style="text-align:center;margin:18px 0;">
+            <a href="$formulario_url" style="background:#4F46E5;color:#fff;padding:12px 18px;border-radius:6px;text-decoration:none;display:inline-block;">
+              Completar formulario
+            </a>
+          </p>
+          <p style="color:#666;font-size:12px;">Su respuesta es confidencial y se usa para seguimiento clínico.</p>
+        </div>
+      </body>
+    </html>
+    """,
+))
+
+registrar(PlantillaCorreo(
+    RECORDATORIO_CITA,
+    asunto="Recordatorio: su cita es el $fecha_cita a las $hora_cita",
+    texto="""Estimado/a $nombre_paciente,
+
+Le recordamos que tiene una cita el día $fecha_cita a las $hora_cita.
+Motivo: $motivo
+
+Por favor, llegue 10 minutos antes. Si no puede asistir, avísenos con antelación.
+
+Saludos,
+Clínica Dental
+""",
+    html="""
+    <html>
+      <body style="font-family: Arial, sans-serif; color:#333;">
+        <div style="max-width:600px;margin:0 auto;padding:16px;">
+          <h2 style="color:#4F46E5;margin:0 0 8px 0;">Recordatorio de cita</h2>
+          <p>Estimado/a <strong>$nombre_paciente</strong>,</p>
+          <p>Le recordamos que tiene una cita programada:</p>
+          <div style="background:#fff;padding:12px;border-left:4px solid #4F46E5;margin:12px 0;">
+            <p style="margin:0;"><strong>📅 Fecha:</strong> $fecha_cita</p>
+            <p style="margin:0;"><strong>🕐 Hora:</strong> $hora_cita</p>
+            <p style="margin:0;"><strong>📋 Motivo:</strong> $motivo</p>
+          </div>
+          <p>Por favor, llegue <strong>10 minutos antes</strong>. Si no puede asistir, avísenos con antelación.</p>
+          <p style="color:#666;font-size:12px;margin-top:20px;">Clínica Dental | Cuidando tu sonrisa</p>
+        </div>
+      </body>
+    </html>
+    """,
+))
@@ -0,0 +1,129 @@
+# enrutador_ia.py
+"""
+Estado de salud de los modelos de OpenRouter para el enrutado por latencia.
+
+Por cada modelo de OPENROUTER_MODELS se guarda la latencia (EWMA y ventana
+de las últimas muestras para el p95) y la tasa de errores (EWMA). Un
+circuit breaker abre el modelo tras IA_CIRCUITO_FALLOS fallos seguidos: se
+salta durante IA_CIRCUITO_ABIERTO_S segundos y después se deja pasar una
+sola petición de prueba (semiabierto); si sale bien el circuito se cierra.
+
+`openrouter.completar_enrutado` usa `EnrutadorModelos.orden()` para elegir
+el modelo, los de reserva y el momento de lanzar la petición duplicada.
+"""
+import os
+import time
+from collections import deque
+
+IA_EWMA_ALFA = float(os.getenv("IA_EWMA_ALFA", 0.2))
+IA_CIRCUITO_FALLOS = int(os.getenv("IA_CIRCUITO_FALLOS", 3))
+IA_CIRCUITO_ABIERTO_S = float(os.getenv("IA_CIRCUITO_ABIERTO_S", 30))
+IA_VENTANA_LATENCIAS = int(os.getenv("IA_VENTANA_LATENCIAS", 200))
+# Con menos muestras el p95 no es fiable y se usa IA_HEDGE_DEFECTO_S
+IA_HEDGE_MIN_MUESTRAS = int(os.getenv("IA_HEDGE_MIN_MUESTRAS", 20))
+IA_HEDGE_DEFECTO_S = float(os.getenv("IA_HEDGE_DEFECTO_S", 8))
+IA_HEDGE_MIN_S = float(os.getenv("IA_HEDGE_MIN_S", 0.5))
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+
+class EstadoModelo:
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.latencia_ewma = None
+        self.tasa_errores = 0.0
+        self.latencias = deque(maxlen=IA_VENTANA_LATENCIAS)
+        self.fallos_seguidos = 0
+        self.abierto_hasta = 0.0
+        self.prueba_en_curso = False
+        self.peticiones = 0
+        self.errores = 0
+
+    def circuito(self, ahora: float = None) -> str:
+        if self.fallos_seguidos < IA_CIRCUITO_FALLOS:
+            return CERRADO
+        if (ahora or time.monotonic()) < self.abierto_hasta:
+            return ABIERTO
+        return SEMIABIERTO
+
+    def disponible(self, ahora: float = None) -> bool:
+        estado = self.circuito(ahora)
+        return estado == CERRADO or (estado == SEMIABIERTO and not self.prueba_en_curso)
+
+    def p95(self):
+        if len(self.latencias) < IA_HEDGE_MIN_MUESTRAS:
+            return None
+        ordenadas = sorted(self.latencias)
+        return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))]
+
+    def espera_hedge(self) -> float:
+        """Segundos tras los que se lanza una segunda petición si la primera no ha respondido."""
+        p95 = self.p95()
+        return max(IA_HEDGE_MIN_S, p95 if p95 is not None else IA_HEDGE_DEFECTO_S)
+
+    def puntuacion(self) -> float:
+        """Menor es mejor: latencia esperada penalizada por la tasa de errores."""
+        latencia = self.latencia_ewma if self.latencia_ewma is not None else IA_HEDGE_DEFECTO_S / 2
+        return latencia * (1 + 4 * self.tasa_errores)
+
+    def registrar_exito(self, segundos: float):
+        self.peticiones += 1
+        self.latencias.append(segundos)
+        if self.latencia_ewma is None:
+            self.latencia_ewma = segundos
+        else:
+            self.latencia_ewma += IA_EWMA_ALFA * (segundos - self.latencia_ewma)
+        self.tasa_errores *= 1 - IA_EWMA_ALFA
+        self.fallos_seguidos = 0
+        self.prueba_en_curso = False
+
+    def registrar_fallo(self):
+        self.peticiones += 1
+        self.errores += 1
+        self.tasa_errores += IA_EWMA_ALFA * (1 - self.tasa_errores)
+        self.fallos_seguidos += 1
+        self.prueba_en_curso = False
+        if self.fallos_seguidos >= IA_CIRCUITO_FALLOS:
+            self.abierto_hasta = time.monotonic() + IA_CIRCUITO_ABIERTO_S
+
+    def resumen(self) -> dict:
+        p95 = self.p95()
+        return {
+            "modelo": self.nombre,
+            "circuito": self.circuito(),
+            "latencia_ewma_s": round(self.latencia_ewma, 3) if self.latencia_ewma is not None else None,
+            "latencia_p95_s": round(p95, 3) if p95 is not None else None,
+            "tasa_errores": round(self.tasa_errores, 3),
+            "peticiones": self.peticiones,
+            "errores": self.errores,
+        }
+
+
+class EnrutadorModelos:
+    def __init__(self, modelos):
+        self.modelos = {nombre: EstadoModelo(nombre) for nombre in modelos}
+
+    def configurar(self, modelos):
+        """Sustituye la lista de modelos conservando el estado de los que siguen."""
+        self.modelos = {nombre: self.modelos.get(nombre) or EstadoModelo(nombre) for nombre in modelos}
+
+    def orden(self):
+        """
+        Modelos disponibles, del mejor al peor. Si todos tienen el circuito
+        abierto se devuelve el que antes se reabre, para no fallar sin intentarlo.
+        """
+        ahora = time.monotonic()
+        disponibles = [m for m in self.modelos.values() if m.disponible(ahora)]
+        if not disponibles:
+            return [min(self.modelos.values(), key=lambda m: m.abierto_hasta)]
+        return sorted(disponibles, key=EstadoModelo.puntuacion)
+
+    def reservar(self, modelo: EstadoModelo):
+        """Marca la petición de prueba de un modelo semiabierto."""
+        if modelo.circuito() == SEMIABIERTO:
+            modelo.prueba_en_curso = True
+
+    def estadisticas(self) -> list:
+        return [m.resumen() for m in self.modelos.values()]
@@ -1,17 +1,131 @@
 # feedback_submitter.py
 """
 Módulo para recibir y guardar feedback de pacientes en la base de datos.
+
+Usa el motor compartido de `app.database`, de modo que `/feedback-form`
+escribe en la misma base de datos (y el mismo pool) que `/feedback`.
+Los envíos individuales del formulario se agrupan durante unos milisegundos
+y se insertan con un único INSERT multi-fila.
 """
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.models import Feedback, Base
+import asyncio
 import datetime
 import os
+from sqlalchemy import insert
+from app.database import SessionLocal, engine
+from app.models import Feedback
+
+# Micro-lotes: cuánto se espera para agrupar envíos y tamaño máximo por INSERT
+FEEDBACK_LOTE_ESPERA_MS = float(os.getenv("FEEDBACK_LOTE_ESPERA_MS", 5))
+FEEDBACK_LOTE_MAX = int(os.getenv("FEEDBACK_LOTE_MAX", 500))
+# Máximo de encuestas por petición en /feedback-form/bulk (todas van en una transacción)
+FEEDBACK_BULK_MAX = int(os.getenv("FEEDBACK_BULK_MAX", 1000))
+
+def fila_feedback(
+    paciente_id: int,
+    nivel_dolor: int,
+    control_medicacion: str,
+    sangrado: str,
+    inflamacion: str,
+    fiebre: bool,
+    dificultad_tragar: bool,
+    mal_sabor: bool,
+    entumecimiento: bool,
+    doctor_id: int = None
+) -> dict:
+    """Construye la fila a insertar en `feedback`."""
+    return {
+        "paciente_id": paciente_id,
+        "nivel_dolor": nivel_dolor,
+        "control_medicacion": control_medicacion,
+        "sangrado": sangrado,
+        "inflamacion": inflamacion,
+        "fiebre": fiebre,
+        "dificultad_tragar": dificultad_tragar,
+        "mal_sabor": mal_sabor,
+        "entumecimiento": entumecimiento,
+        "fecha_registro": datetime.datetime.utcnow(),
+        "doctor_id": doctor_id,
+    }
+
+def insertar_feedbacks(filas: list[dict]) -> list[int]:
+    """
+    Inserta las filas con INSERT multi-fila (en bloques de FEEDBACK_LOTE_MAX)
+    dentro de una transacción y devuelve los ids en el mismo orden.
+    """
+    ids = []
+    with engine.begin() as conn:
+        for inicio in range(0, len(filas), FEEDBACK_LOTE_MAX):
+            bloque = filas[inicio:inicio + FEEDBACK_LOTE_MAX]
+            stmt = insert(Feedback).values(bloque)
+            if engine.dialect.insert_returning:
+                result = conn.execute(stmt.returning(Feedback.id))
+                ids.extend(sorted(row.id for row in result))
+            else:
+                # MySQL devuelve en lastrowid el id de la primera fila del INSERT;
+                # InnoDB asigna ids consecutivos a un INSERT multi-fila simple.
+                result = conn.execute(stmt)
+                ids.extend(range(result.lastrowid, result.lastrowid + len(bloque)))
+    return ids
+
+class LoteadorFeedback:
+    """
+    Agrupa los envíos que llegan en una ventana de `espera_ms` y los inserta
+    juntos. Cada llamada a `guardar` espera a que su lote se escriba y recibe
+    el id de su fila (o la excepción del lote).
+    """
+    def __init__(self, espera_ms: float = FEEDBACK_LOTE_ESPERA_MS, max_lote: int = FEEDBACK_LOTE_MAX):
+        self.espera = espera_ms / 1000
+        self.max_lote = max_lote
+        self._pendientes = []
+        self._temporizador = None
+        # El bucle solo guarda referencias débiles a las tareas: sin este
+        # conjunto una escritura en curso podría recolectarse y dejar
+        # colgados los `guardar` de su lote.
+        self._tareas = set()
+
+    async def guardar(self, fila: dict) -> int:
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        self._pendientes.append((fila, futuro))
+        if len(self._pendientes) >= self.max_lote:
+            self._vaciar()
+        elif self._temporizador is None:
+            self._temporizador = loop.call_later(self.espera, self._vaciar)
+        return await futuro
+
+    def _vaciar(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        lote, self._pendientes = self._pendientes, []
+        if lote:
+            tarea = asyncio.get_running_loop().create_task(self._escribir(lote))
+            self._tareas.add(tarea)
+            tarea.add_done_callback(self._tareas.discard)
+
+    async def detener(self):
+        """Escribe lo pendiente y espera a que terminen los lotes en curso."""
+        self._vaciar()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+
+    async def _escribir(self, lote):
+        try:
+            ids = await asyncio.to_thread(insertar_feedbacks, [fila for fila, _ in lote])
+        except Exception as e:
+            if len(lote) == 1:
+                if not lote[0][1].done():
+                    lote[0][1].set_exception(e)
+                return
+            # Una fila inválida (p. ej. paciente inexistente) no debe hacer
+            # fallar al resto: se reintenta fila a fila.
+            for item in lote:
+                await self._escribir([item])
+            return
+        for (_, futuro), feedback_id in zip(lote, ids):
+            if not futuro.done():
+                futuro.set_result(feedback_id)
 
-# Configuración de la base de datos (ajusta la URL según tu entorno)
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+loteador_feedback = LoteadorFeedback()
 
 # Función para guardar feedback
 def guardar_feedback(
@@ -28,7 +142,7 @@ def guardar_feedback(
 ):
     session = SessionLocal()
     try:
-        feedback = Feedback(
+        feedback = Feedback(**fila_feedback(
             paciente_id=paciente_id,
             nivel_dolor=nivel_dolor,
             control_medicacion=control_medicacion,
@@ -38,9 +152,8 @@ def guardar_feedback(
             dificultad_tragar=dificultad_tragar,
             mal_sabor=mal_sabor,
             entumecimiento=entumecimiento,
-            fecha_registro=datetime.datetime.utcnow(),
             doctor_id=doctor_id
-        )
+        ))
         session.add(feedback)
         session.commit()
         session.refresh(feedback)
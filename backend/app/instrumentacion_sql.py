@@ -0,0 +1,168 @@
+# instrumentacion_sql.py
+"""
+Instrumentación de las consultas SQL por petición.
+
+Los eventos `before/after_cursor_execute` de los motores síncrono y asíncrono
+cuentan cada sentencia y su duración en las estadísticas de la petición en
+curso (un `ContextVar` que fija `MiddlewareSQL`; llega también al threadpool
+de las rutas síncronas y a los greenlets de SQLAlchemy async).
+
+- Consulta lenta: si una sentencia tarda más de SQL_LENTA_MS se registra en el
+  log con los parámetros reducidos a una huella (número, tipos y hash), sin
+  sus valores: son datos clínicos.
+- Probable N+1: si una misma forma de sentencia (SQL sin espacios repetidos ni
+  listas IN/VALUES expandidas) se repite SQL_N_MAS_1_UMBRAL veces o más en una
+  petición, se avisa una vez por petición.
+- Con SQL_DEBUG_CABECERAS=true las respuestas llevan X-SQL-Consultas,
+  X-SQL-Tiempo-Ms y X-SQL-N-Mas-1; siempre se publican en `/metrics`.
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+from contextvars import ContextVar
+from sqlalchemy import event
+from .metricas import registro, ruta_de
+
+logger = logging.getLogger("uvicorn.error")
+
+SQL_LENTA_MS = float(os.getenv("SQL_LENTA_MS", 200))
+SQL_N_MAS_1_UMBRAL = int(os.getenv("SQL_N_MAS_1_UMBRAL", 5))
+SQL_DEBUG_CABECERAS = os.getenv("SQL_DEBUG_CABECERAS", "false").lower() in ("1", "true", "yes", "si")
+
+_estadisticas = ContextVar("estadisticas_sql", default=None)
+_INICIO = "_instrumentacion_sql_inicio"
+
+consultas_por_peticion = registro.histograma(
+    "sql_consultas_por_peticion", "Sentencias SQL ejecutadas por petición", ("ruta",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500))
+tiempo_sql_por_peticion = registro.histograma(
+    "sql_tiempo_por_peticion_segundos", "Tiempo total de base de datos por petición", ("ruta",))
+consultas_lentas = registro.contador(
+    "sql_consultas_lentas_total", "Sentencias más lentas que SQL_LENTA_MS", ("ruta",))
+n_mas_1 = registro.contador(
+    "sql_n_mas_1_total", "Peticiones con una sentencia repetida SQL_N_MAS_1_UMBRAL veces o más", ("ruta",))
+
+_ESPACIOS = re.compile(r"\s+")
+_LISTAS = re.compile(r"\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*\)")
+_VALUES_MULTIPLES = re.compile(r"(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_formas = {}  # sentencia -> forma (las sentencias de SQLAlchemy se repiten: se memoriza)
+
+
+def forma_sentencia(sql: str) -> str:
+    """SQL normalizado: IN (?, ?, ?) -> IN (...), VALUES (..), (..) -> VALUES (..) ..."""
+    forma = _formas.get(sql)
+    if forma is None:
+        forma = _ESPACIOS.sub(" ", sql).strip()
+        forma = _LISTAS.sub("(...)", forma)
+        forma = _VALUES_MULTIPLES.sub(r"\1 ...", forma)
+        if len(_formas) < 5000:
+            _formas[sql] = forma
+    return forma
+
+
+def huella_parametros(parametros) -> str:
+    """Resumen de los parámetros sin sus valores: cuántos, de qué tipo y un hash."""
+    if not parametros:
+        return "sin parámetros"
+    if isinstance(parametros, (list, tuple)) and parametros and isinstance(parametros[0], (list, tuple, dict)):
+        # executemany
+        return f"{len(parametros)} filas, huella {hashlib.sha1(repr(parametros).encode()).hexdigest()[:10]}"
+    valores = parametros.values() if isinstance(parametros, dict) else parametros
+    tipos = ",".join(type(v).__name__ for v in valores)
+    return f"({tipos}) huella {hashlib.sha1(repr(parametros).encode()).hexdigest()[:10]}"
+
+
+class EstadisticasSQL:
+    __slots__ = ("consultas", "segundos", "lentas", "formas")
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+        self.lentas = 0
+        self.formas = {}  # forma -> veces
+
+    def repetidas(self):
+        """Formas ejecutadas SQL_N_MAS_1_UMBRAL veces o más, de más a menos."""
+        return sorted(
+            ((forma, veces) for forma, veces in self.formas.items() if veces >= SQL_N_MAS_1_UMBRAL),
+            key=lambda fv: -fv[1],
+        )
+
+
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    # Una conexión ejecuta una sentencia cada vez: basta un único instante, que
+    # la siguiente sobrescribe (si la sentencia falla `after_cursor_execute` no
+    # se dispara y no debe quedar nada acumulado en la conexión del pool)
+    conn.info[_INICIO] = time.perf_counter()
+
+
+def _despues(conn, cursor, statement, parameters, context, executemany):
+    inicio = conn.info.pop(_INICIO, None)
+    if inicio is None:
+        return
+    duracion = time.perf_counter() - inicio
+    estadisticas = _estadisticas.get()
+    if estadisticas is not None:
+        estadisticas.consultas += 1
+        estadisticas.segundos += duracion
+        forma = forma_sentencia(statement)
+        estadisticas.formas[forma] = estadisticas.formas.get(forma, 0) + 1
+    if duracion * 1000 >= SQL_LENTA_MS:
+        if estadisticas is not None:
+            estadisticas.lentas += 1
+        logger.warning(
+            f"Consulta lenta ({duracion * 1000:.0f} ms): {forma_sentencia(statement)[:500]} "
+            f"[{huella_parametros(parameters)}]"
+        )
+
+
+def instrumentar(engine):
+    """Registra los eventos en un motor síncrono (o el `sync_engine` de uno asíncrono)."""
+    event.listen(engine, "before_cursor_execute", _antes)
+    event.listen(engine, "after_cursor_execute", _despues)
+
+
+class MiddlewareSQL:
+    """Abre las estadísticas SQL de cada petición y las publica al terminar."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estadisticas = EstadisticasSQL()
+        token = _estadisticas.set(estadisticas)
+
+        async def enviar(mensaje):
+            if SQL_DEBUG_CABECERAS and mensaje["type"] == "http.response.start":
+                cabeceras = list(mensaje.get("headers", []))
+                cabeceras += [
+                    (b"x-sql-consultas", str(estadisticas.consultas).encode()),
+                    (b"x-sql-tiempo-ms", f"{estadisticas.segundos * 1000:.1f}".encode()),
+                    (b"x-sql-n-mas-1", str(len(estadisticas.repetidas())).encode()),
+                ]
+                mensaje = {**mensaje, "headers": cabeceras}
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _estadisticas.reset(token)
+            ruta = ruta_de(scope)
+            consultas_por_peticion.observar(ruta, valor=estadisticas.consultas)
+            tiempo_sql_por_peticion.observar(ruta, valor=estadisticas.segundos)
+            if estadisticas.lentas:
+                consultas_lentas.inc(ruta, valor=estadisticas.lentas)
+            repetidas = estadisticas.repetidas()
+            if repetidas:
+                n_mas_1.inc(ruta)
+                forma, veces = repetidas[0]
+                logger.warning(
+                    f"Probable N+1 en {scope['method']} {ruta}: {veces} ejecuciones de "
+                    f"{forma[:300]} ({estadisticas.consultas} consultas en total)"
+                )
@@ -0,0 +1,253 @@
+# metricas.py
+"""
+Métricas de la aplicación en formato de texto de Prometheus (`GET /metrics`).
+
+- `MiddlewareMetricas`: middleware ASGI que mide cada petición por ruta
+  (plantilla, p. ej. /pacientes/{paciente_id}), método y código de estado:
+  histograma de latencia, contador de peticiones y peticiones en curso.
+  Las rutas de streaming cuentan hasta que se envía el último trozo.
+- Contadores de llamadas externas: envíos SMTP, peticiones y tokens de
+  OpenRouter (los incrementan `email_service`, `openrouter` y `analisis_stream`).
+- Al exponer se añaden los pools de base de datos y la caché de análisis.
+
+Sin dependencias: cada operación en el camino de la petición es una búsqueda
+en un diccionario y unas sumas bajo un lock. Los valores son por proceso:
+con varios workers de uvicorn cada uno expone los suyos.
+"""
+import time
+import threading
+from bisect import bisect_left
+
+# Buckets de latencia en segundos (rutas de base de datos hasta llamadas a OpenRouter)
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Etiqueta de las peticiones que no corresponden a ninguna ruta (404): evita
+# una serie por cada URL inventada
+SIN_RUTA = "sin_ruta"
+
+
+def _formatear_etiquetas(nombres, valores) -> str:
+    if not nombres:
+        return ""
+    pares = []
+    for nombre, valor in zip(nombres, valores):
+        valor = str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pares.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+
+def _numero(valor) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+class Metrica:
+    tipo = None
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+        self._series = {}  # tupla de valores de etiquetas -> valor
+
+    def cabecera(self):
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Contador(Metrica):
+    tipo = "counter"
+
+    def inc(self, *etiquetas, valor: float = 1):
+        with self._lock:
+            self._series[etiquetas] = self._series.get(etiquetas, 0) + valor
+
+    def exponer(self):
+        lineas = self.cabecera()
+        with self._lock:
+            series = list(self._series.items())
+        for etiquetas, valor in series:
+            lineas.append(f"{self.nombre}{_formatear_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}")
+        return lineas
+
+
+class Indicador(Metrica):
+    """Gauge: valor que sube y baja."""
+    tipo = "gauge"
+
+    def inc(self, *etiquetas, valor: float = 1):
+        with self._lock:
+            self._series[etiquetas] = self._series.get(etiquetas, 0) + valor
+
+    def dec(self, *etiquetas, valor: float = 1):
+        self.inc(*etiquetas, valor=-valor)
+
+    def set(self, *etiquetas, valor: float):
+        with self._lock:
+            self._series[etiquetas] = valor
+
+    exponer = Contador.exponer
+
+
+class Histograma(Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+
+    def observar(self, *etiquetas, valor: float):
+        # Se guarda la cuenta del bucket exacto; los acumulados se calculan al exponer
+        indice = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exponer(self):
+        lineas = self.cabecera()
+        with self._lock:
+            series = [(etiquetas, list(cuentas), suma, total) for etiquetas, (cuentas, suma, total) in self._series.items()]
+        nombres_le = self.etiquetas + ("le",)
+        for etiquetas, cuentas, suma, total in series:
+            acumulado = 0
+            for limite, cuenta in zip(self.buckets + (float("inf"),), cuentas):
+                acumulado += cuenta
+                lineas.append(f"{self.nombre}_bucket{_formatear_etiquetas(nombres_le, etiquetas + (_numero(limite),))} {acumulado}")
+            base = _formatear_etiquetas(self.etiquetas, etiquetas)
+            lineas.append(f"{self.nombre}_sum{base} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{base} {total}")
+        return lineas
+
+
+def lineas_de(nombre: str, ayuda: str, muestras, etiquetas=(), tipo: str = "gauge"):
+    """Líneas de una métrica calculada al exponer; `muestras` = [(valores de etiquetas, valor)]."""
+    lineas = [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+    for valores, valor in muestras:
+        lineas.append(f"{nombre}{_formatear_etiquetas(etiquetas, valores)} {_numero(valor)}")
+    return lineas
+
+
+class Registro:
+    def __init__(self):
+        self.metricas = []
+        self.recolectores = []  # funciones que devuelven líneas al exponer
+
+    def registrar(self, metrica):
+        self.metricas.append(metrica)
+        return metrica
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self.registrar(Contador(nombre, ayuda, etiquetas))
+
+    def indicador(self, nombre, ayuda, etiquetas=()):
+        return self.registrar(Indicador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        return self.registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def recolector(self, funcion):
+        """Registra una función que calcula métricas en el momento de exponer."""
+        self.recolectores.append(funcion)
+        return funcion
+
+    def exponer(self) -> str:
+        lineas = []
+        for metrica in self.metricas:
+            lineas.extend(metrica.exponer())
+        for funcion in self.recolectores:
+            lineas.extend(funcion())
+        return "\n".join(lineas) + "\n"
+
+
+registro = Registro()
+
+# HTTP
+peticiones_http = registro.contador(
+    "http_peticiones_total", "Peticiones HTTP atendidas", ("metodo", "ruta", "estado"))
+latencia_http = registro.histograma(
+    "http_latencia_segundos", "Duración de las peticiones HTTP", ("metodo", "ruta"))
+peticiones_en_curso = registro.indicador(
+    "http_peticiones_en_curso", "Peticiones HTTP en curso")
+
+# Llamadas externas
+envios_smtp = registro.contador(
+    "smtp_envios_total", "Correos enviados por SMTP", ("resultado",))
+latencia_smtp = registro.histograma(
+    "smtp_envio_segundos", "Duración de los envíos SMTP")
+conexiones_smtp = registro.contador(
+    "smtp_conexiones_abiertas_total", "Conexiones SMTP abiertas")
+peticiones_openrouter = registro.contador(
+    "openrouter_peticiones_total", "Peticiones a OpenRouter", ("modelo", "resultado"))
+latencia_openrouter = registro.histograma(
+    "openrouter_latencia_segundos", "Duración de las peticiones a OpenRouter", ("modelo",))
+tokens_openrouter = registro.contador(
+    "openrouter_tokens_total", "Tokens consumidos en OpenRouter", ("modelo", "tipo"))
+
+
+def registrar_uso_openrouter(modelo: str, uso: dict):
+    """Suma los tokens del campo `usage` de una respuesta de OpenRouter."""
+    if not isinstance(uso, dict):
+        return
+    for campo, tipo in (("prompt_tokens", "prompt"), ("completion_tokens", "respuesta")):
+        valor = uso.get(campo)
+        if isinstance(valor, (int, float)):
+            tokens_openrouter.inc(modelo, tipo, valor=valor)
+
+
+def ruta_de(scope) -> str:
+    """
+    Plantilla de la ruta atendida (p. ej. /ia/trabajos/{trabajo_id}). Según la
+    versión de FastAPI, `scope["route"]` de un router incluido lleva o no el
+    prefijo; los segmentos que le falten se toman de la URL (los prefijos son fijos).
+    """
+    ruta = scope.get("route")
+    plantilla = getattr(ruta, "path_format", None) or getattr(ruta, "path", None)
+    if not plantilla:
+        return SIN_RUTA
+    segmentos = scope["path"].split("/")
+    faltan = len(segmentos) - len(plantilla.split("/"))
+    if faltan > 0:
+        return "/".join(segmentos[:faltan + 1]) + plantilla
+    return plantilla
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI (sin `BaseHTTPMiddleware`, que añade una tarea y una cola
+    por petición). La ruta se lee de `scope["route"]`, que FastAPI rellena al
+    enrutar, así que el coste no depende del número de rutas.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = 500
+        inicio = time.perf_counter()
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        peticiones_en_curso.inc()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            peticiones_en_curso.dec()
+            ruta = ruta_de(scope)
+            metodo = scope["method"]
+            peticiones_http.inc(metodo, ruta, str(estado))
+            latencia_http.observar(metodo, ruta, valor=duracion)
@@ -3,7 +3,7 @@
 
 
 # Modelos de datos para la base de datos clínica
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime, Time, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime, Time, JSON, Index, Float
 from sqlalchemy.orm import relationship
 from .database import Base
 import datetime
@@ -29,7 +29,7 @@ class Doctor(Base):
     consultorio = Column(String(300))
     profesion = Column(String(300))
     telefono_celular = Column(String(300))
-    correo_electronico = Column(String(300))
+    correo_electronico = Column(String(300), index=True)  # login: join Usuario -> Doctor por correo
     historiales = relationship("HistorialClinico", back_populates="doctor")
     citas = relationship("Cita", back_populates="doctor")
     doctor_consultorios = relationship("DoctorConsultorio", back_populates="doctor")
@@ -48,10 +48,16 @@ class Paciente(Base):
     telefono = Column(String(300))
     correo_electronico = Column(String(300))
     fecha_nacimiento = Column(DateTime)
+    doctor_id = Column(Integer, ForeignKey("doctor.id"), nullable=True)  # Doctor que registró al paciente
     feedback = relationship("Feedback", back_populates="paciente")
     historiales = relationship("HistorialClinico", back_populates="paciente")
     citas = relationship("Cita", back_populates="paciente")
 
+    __table_args__ = (
+        Index("ix_paciente_telefono", "telefono"),  # check-in por teléfono
+        Index("ix_paciente_doctor_id_id", "doctor_id", "id"),  # /pacientes/doctor/{id} paginado por id
+    )
+
 class Feedback(Base):
     __tablename__ = "feedback"
     id = Column(Integer, primary_key=True, index=True)
@@ -70,6 +76,10 @@ class Feedback(Base):
     doctor_id = Column(Integer, ForeignKey("doctor.id"), nullable=True) # Relación con el doctor que lo creó
     doctor = relationship("Doctor", backref="pacientes")
 
+    __table_args__ = (
+        Index("ix_feedback_paciente_id_fecha_registro", "paciente_id", "fecha_registro"),
+    )
+
 # Historial Clínico
 class HistorialClinico(Base):
     __tablename__ = "historial_clinico"
@@ -84,6 +94,10 @@ class HistorialClinico(Base):
     paciente = relationship("Paciente", back_populates="historiales")
     doctor = relationship("Doctor", back_populates="historiales")
 
+    __table_args__ = (
+        Index("ix_historial_clinico_paciente_id_id", "paciente_id", "id"),  # historiales por paciente paginados por id
+    )
+
 # Cita
 class Cita(Base):
     __tablename__ = "cita"
@@ -101,6 +115,12 @@ class Cita(Base):
     consultorio = relationship("Consultorio", back_populates="citas")
     estado = Column(String(50), default="Pendiente")
 
+    __table_args__ = (
+        Index("ix_cita_paciente_id_fecha_cita", "paciente_id", "fecha_cita"),  # cita del día en el check-in
+        Index("ix_cita_fecha_cita", "fecha_cita"),  # carga de la agenda del día
+        Index("ix_cita_doctor_id_fecha_cita", "doctor_id", "fecha_cita"),  # agenda de un doctor por fechas
+    )
+
 # Consultorio
 class Consultorio(Base):
     __tablename__ = "consultorio"
@@ -120,3 +140,74 @@ class DoctorConsultorio(Base):
     doctor_id = Column(Integer, ForeignKey("doctor.id"))
     consultorio = relationship("Consultorio", back_populates="doctor_consultorios")
     doctor = relationship("Doctor", back_populates="doctor_consultorios")
+
+# Correo saliente (outbox): se escribe en la misma transacción que la cita
+# y lo envía el trabajador en segundo plano cuando llega `programado_para`.
+class CorreoSaliente(Base):
+    __tablename__ = "correo_saliente"
+    id = Column(Integer, primary_key=True, index=True)
+    cita_id = Column(Integer, ForeignKey("cita.id", ondelete="SET NULL"), nullable=True, index=True)
+    tipo = Column(String(50), nullable=False)  # confirmacion_cita / seguimiento_rutinario / feedback_postoperatorio
+    destinatario = Column(String(300), nullable=False)
+    datos = Column(JSON, nullable=False)  # Parámetros para generar el mensaje
+    estado = Column(String(20), nullable=False, default="pendiente")  # pendiente / enviando / enviado / fallido / cancelado
+    intentos = Column(Integer, nullable=False, default=0)
+    programado_para = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    reclamado_en = Column(DateTime, nullable=True)
+    enviado_en = Column(DateTime, nullable=True)
+    ultimo_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_correo_saliente_estado_programado", "estado", "programado_para"),
+    )
+
+# Campaña de recordatorios de cita: progreso y resultado. `ultimo_cita_id` es
+# el punto de control para reanudar la campaña si el proceso se interrumpe.
+class CampanaRecordatorio(Base):
+    __tablename__ = "campana_recordatorio"
+    id = Column(Integer, primary_key=True, index=True)
+    desde = Column(DateTime, nullable=False)
+    hasta = Column(DateTime, nullable=False)
+    estado = Column(String(20), nullable=False, default="en_curso")  # en_curso / completada / interrumpida
+    ultimo_cita_id = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+    enviados = Column(Integer, nullable=False, default=0)
+    fallidos = Column(Integer, nullable=False, default=0)
+    fallos = Column(JSON, nullable=True)  # [{cita_id, destinatario, error}] (los primeros)
+    duracion_s = Column(Float, nullable=False, default=0)  # Tiempo de envío acumulado
+    iniciada_en = Column(DateTime, default=datetime.datetime.utcnow)
+    terminada_en = Column(DateTime, nullable=True)
+
+# Caché persistente de análisis de IA (segundo nivel tras la caché en memoria).
+# `clave` = sha256(diagnóstico normalizado + modelo + versión del prompt).
+class AnalisisIACache(Base):
+    __tablename__ = "analisis_ia_cache"
+    id = Column(Integer, primary_key=True, index=True)
+    clave = Column(String(64), nullable=False, unique=True)
+    modelo = Column(String(200), nullable=False)
+    version_prompt = Column(String(20), nullable=False)
+    diagnostico = Column(Text, nullable=False)  # Normalizado, para inspección
+    resultado = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    expira_en = Column(DateTime, nullable=False, index=True)
+
+# Cola persistente de análisis de IA: `POST /ia/trabajos` inserta una fila y
+# los workers de trabajos_ia.py la procesan y guardan el resultado en
+# `historial_clinico.analisis_ia`.
+class TrabajoAnalisisIA(Base):
+    __tablename__ = "trabajo_analisis_ia"
+    id = Column(Integer, primary_key=True, index=True)
+    consulta_id = Column(Integer, ForeignKey("historial_clinico.id", ondelete="CASCADE"), nullable=False, index=True)
+    estado = Column(String(20), nullable=False, default="pendiente")  # pendiente / en_curso / completado / fallido
+    intentos = Column(Integer, nullable=False, default=0)
+    programado_para = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    reclamado_en = Column(DateTime, nullable=True)
+    terminado_en = Column(DateTime, nullable=True)
+    resultado = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_trabajo_analisis_ia_estado_programado", "estado", "programado_para"),
+    )
@@ -0,0 +1,330 @@
+# openrouter.py
+"""
+Cliente de OpenRouter para el análisis de diagnósticos con IA.
+
+La configuración (API_KEY, OPENROUTER_MODELS, OPENROUTER_URL, tiempos de
+espera y límites de conexión) se lee una sola vez al arrancar, y todas las
+peticiones comparten un único `httpx.AsyncClient` con conexiones keep-alive
+(HTTP/2 si está instalado `h2`). El cliente se abre y se cierra en el
+lifespan de la aplicación; fuera de ella (scripts) se crea en el primer uso.
+
+Los análisis se enrutan entre los modelos configurados (`completar_enrutado`):
+se elige el de mejor latencia/errores, se pasa al siguiente si falla, se
+lanza una petición duplicada a otro modelo si la primera tarda más que su
+p95 y todo el análisis tiene un plazo de IA_PRESUPUESTO_S segundos.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import httpx
+from fastapi import HTTPException
+from .cache import VueloUnico
+from .cache_ia import cache_analisis, clave_analisis
+from .enrutador_ia import EnrutadorModelos
+from .metricas import peticiones_openrouter, latencia_openrouter, registrar_uso_openrouter
+
+logger = logging.getLogger("uvicorn.error")
+
+try:
+    import h2  # noqa: F401  (solo para saber si httpx puede usar HTTP/2)
+    HTTP2_DISPONIBLE = True
+except ImportError:
+    HTTP2_DISPONIBLE = False
+
+
+class ConfiguracionOpenRouter:
+    """Configuración de OpenRouter leída de las variables de entorno."""
+    def __init__(self):
+        self.api_key = os.getenv("API_KEY")
+        # Modelo gratuito recomendado
+        self.modelo = os.getenv("OPENROUTER_MODEL", "meta-llama/llama-3.2-3b-instruct:free")
+        # Lista de modelos para el enrutado (separados por comas); el primero es el
+        # que identifica los análisis en la caché
+        self.modelos = [m.strip() for m in os.getenv("OPENROUTER_MODELS", self.modelo).split(",") if m.strip()]
+        self.modelo = self.modelos[0]
+        # Plazo total de un análisis, reintentos y peticiones duplicadas incluidos
+        self.presupuesto_s = float(os.getenv("IA_PRESUPUESTO_S", 20))
+        self.hedge = os.getenv("IA_HEDGE", "true").lower() in ("1", "true", "yes", "si")
+        self.url = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+        self.timeout_conexion = float(os.getenv("OPENROUTER_TIMEOUT_CONEXION", 5))
+        # Los modelos tardan en responder: la lectura tiene un margen mucho mayor
+        self.timeout_lectura = float(os.getenv("OPENROUTER_TIMEOUT_LECTURA", 60))
+        self.max_conexiones = int(os.getenv("OPENROUTER_MAX_CONEXIONES", 20))
+        self.max_keepalive = int(os.getenv("OPENROUTER_MAX_KEEPALIVE", 10))
+        self.keepalive_s = float(os.getenv("OPENROUTER_KEEPALIVE_S", 60))
+        self.http2 = HTTP2_DISPONIBLE and os.getenv("OPENROUTER_HTTP2", "true").lower() in ("1", "true", "yes", "si")
+
+    def crear_cliente(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=self.http2,
+            timeout=httpx.Timeout(self.timeout_lectura, connect=self.timeout_conexion, pool=self.timeout_conexion),
+            limits=httpx.Limits(
+                max_connections=self.max_conexiones,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_s,
+            ),
+            headers={"Content-Type": "application/json"},
+        )
+
+
+configuracion = ConfiguracionOpenRouter()
+
+_cliente = None
+_cliente_loop = None
+
+def abrir_cliente() -> httpx.AsyncClient:
+    """Crea el cliente compartido (se llama desde el lifespan)."""
+    global _cliente, _cliente_loop
+    _cliente = configuracion.crear_cliente()
+    _cliente_loop = asyncio.get_running_loop()
+    logger.info(f"Cliente OpenRouter listo ({'HTTP/2' if configuracion.http2 else 'HTTP/1.1'}, modelo {configuracion.modelo})")
+    return _cliente
+
+def obtener_cliente() -> httpx.AsyncClient:
+    """Cliente compartido del event loop actual (se crea en el primer uso si no existe)."""
+    if _cliente is None or _cliente.is_closed or _cliente_loop is not asyncio.get_running_loop():
+        return abrir_cliente()
+    return _cliente
+
+async def cerrar_cliente():
+    global _cliente, _cliente_loop
+    if _cliente is not None:
+        await _cliente.aclose()
+    _cliente = None
+    _cliente_loop = None
+
+
+# Cambiarla al modificar el prompt: invalida los análisis guardados en caché
+VERSION_PROMPT = "1"
+
+def construir_prompt(diagnostico: str) -> str:
+    return f"""Eres un asistente dental. Analiza el diagnóstico y responde SOLO con JSON válido.
+
+    Diagnóstico: {diagnostico}
+
+    Formato de respuesta (copia y completa EXACTAMENTE):
+    {{"resumen": "tu análisis aquí", "recomendaciones": ["rec1", "rec2", "rec3"], "riesgos": ["riesgo1", "riesgo2"]}}"""
+
+
+def interpretar_respuesta(content: str) -> dict:
+    """Extrae el JSON {resumen, recomendaciones, riesgos} del texto del modelo."""
+    return interpretar_con_validez(content)[0]
+
+
+def interpretar_con_validez(content: str):
+    """(resultado, valido); valido es False si hubo que usar el texto como resumen."""
+    # Extraer solo el JSON válido usando regex
+    json_match = re.search(r'\{[\s\S]*\}', content)
+    if json_match:
+        content = json_match.group(0)
+    content = content.strip()
+
+    try:
+        resultado = json.loads(content)
+    except json.JSONDecodeError:
+        logger.error("Content no es JSON válido después de limpieza: %s", content[:500])
+        # Fallback: devolver contenido como resumen
+        return {
+            "resumen": content,
+            "recomendaciones": ["Revisar análisis manual"],
+            "riesgos": []
+        }, False
+
+    # Validar estructura básica
+    if not isinstance(resultado, dict):
+        resultado = {}
+    if not isinstance(resultado.get("resumen"), str):
+        resultado["resumen"] = content[:200]
+    if not isinstance(resultado.get("recomendaciones"), list):
+        resultado["recomendaciones"] = []
+    if not isinstance(resultado.get("riesgos"), list):
+        resultado["riesgos"] = []
+    return resultado, True
+
+
+async def completar(prompt: str, modelo: str = None, timeout: float = None) -> str:
+    """Envía el prompt a OpenRouter y devuelve el texto de la respuesta."""
+    if not configuracion.api_key:
+        raise HTTPException(status_code=500, detail="API_KEY no configurada")
+
+    payload = {
+        "model": modelo or configuracion.modelo,
+        "messages": [
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    }
+    modelo = payload["model"]
+    opciones = {}
+    if timeout is not None:
+        opciones["timeout"] = httpx.Timeout(timeout, connect=min(timeout, configuracion.timeout_conexion))
+    inicio = time.perf_counter()
+    try:
+        response = await obtener_cliente().post(
+            configuracion.url,
+            headers={"Authorization": f"Bearer {configuracion.api_key}"},
+            json=payload,
+            **opciones,
+        )
+        response.raise_for_status()
+        data = response.json()
+    except httpx.HTTPStatusError as e:
+        peticiones_openrouter.inc(modelo, f"http_{e.response.status_code}")
+        logger.error("OpenRouter HTTP error: %s - %s", e.response.status_code, e.response.text)
+        raise HTTPException(status_code=502, detail=f"Error de OpenRouter: {e.response.status_code}")
+    except httpx.TimeoutException as e:
+        peticiones_openrouter.inc(modelo, "timeout")
+        logger.error("Tiempo agotado esperando a OpenRouter (%s): %s", modelo, e)
+        raise HTTPException(status_code=504, detail="OpenRouter no respondió a tiempo")
+    except httpx.RequestError as e:
+        peticiones_openrouter.inc(modelo, "error_conexion")
+        logger.error("Error de conexión con OpenRouter: %s", e)
+        raise HTTPException(status_code=502, detail="No se pudo conectar con OpenRouter")
+    except ValueError:
+        # 200 con un cuerpo que no es JSON
+        peticiones_openrouter.inc(modelo, "respuesta_invalida")
+        logger.error("OpenRouter devolvió un cuerpo que no es JSON: %s", response.text[:500])
+        raise HTTPException(status_code=502, detail="Respuesta inválida de OpenRouter")
+    except asyncio.CancelledError:
+        # Petición duplicada que perdió o plazo agotado
+        peticiones_openrouter.inc(modelo, "cancelada")
+        raise
+    peticiones_openrouter.inc(modelo, "ok")
+    latencia_openrouter.observar(modelo, valor=time.perf_counter() - inicio)
+    if isinstance(data, dict):
+        registrar_uso_openrouter(modelo, data.get("usage"))
+
+    # Extraer contenido
+    try:
+        content = data["choices"][0]["message"]["content"].strip()
+    except (KeyError, IndexError, TypeError, AttributeError):
+        logger.error("Estructura inesperada de OpenRouter: %s", data)
+        raise HTTPException(status_code=502, detail="Respuesta inválida de OpenRouter")
+
+    if not content:
+        raise HTTPException(status_code=502, detail="OpenRouter devolvió respuesta vacía")
+    return content
+
+
+enrutador_modelos = EnrutadorModelos(configuracion.modelos)
+
+async def _intento(modelo, prompt: str, timeout: float):
+    """Una petición a un modelo, registrando su latencia o su fallo en el enrutador."""
+    enrutador_modelos.reservar(modelo)
+    inicio = time.perf_counter()
+    try:
+        content = await completar(prompt, modelo.nombre, timeout=timeout)
+        modelo.registrar_exito(time.perf_counter() - inicio)
+        return content, modelo.nombre
+    except HTTPException as e:
+        # 500 = error de configuración (API_KEY): no es culpa del modelo
+        if e.status_code != 500:
+            modelo.registrar_fallo()
+        raise
+    finally:
+        # Cancelada (perdió contra la petición duplicada o se agotó el plazo),
+        # error de configuración o cualquier excepción inesperada: la petición
+        # de prueba de un modelo semiabierto termina siempre
+        modelo.prueba_en_curso = False
+
+async def completar_enrutado(prompt: str, presupuesto_s: float = None):
+    """
+    Envía el prompt al mejor modelo disponible y devuelve (texto, modelo).
+
+    Si un modelo falla se pasa al siguiente; si tarda más que su p95 se lanza
+    la misma petición al siguiente modelo (o al mismo si solo hay uno) y se
+    queda la primera respuesta válida. Como mucho hay dos peticiones en vuelo.
+    Agotado el plazo se cancela todo y se responde 504.
+    """
+    loop = asyncio.get_running_loop()
+    inicio = loop.time()
+    limite = inicio + (presupuesto_s or configuracion.presupuesto_s)
+    candidatos = enrutador_modelos.orden()
+    siguiente = 0
+    en_vuelo = {}  # tarea -> EstadoModelo
+    ultimo_error = None
+
+    def lanzar():
+        nonlocal siguiente
+        modelo = candidatos[min(siguiente, len(candidatos) - 1)]
+        siguiente += 1
+        tarea = asyncio.create_task(_intento(modelo, prompt, limite - loop.time()))
+        en_vuelo[tarea] = modelo
+        return modelo
+
+    def programar_hedge(modelo):
+        return loop.time() + modelo.espera_hedge() if configuracion.hedge else None
+
+    try:
+        hedge_en = programar_hedge(lanzar())
+        while en_vuelo:
+            ahora = loop.time()
+            if ahora >= limite:
+                break
+            espera = limite - ahora
+            if hedge_en is not None:
+                espera = min(espera, max(0.0, hedge_en - ahora))
+            hechas, _ = await asyncio.wait(en_vuelo, timeout=espera, return_when=asyncio.FIRST_COMPLETED)
+            for tarea in hechas:
+                en_vuelo.pop(tarea)
+                try:
+                    return tarea.result()
+                except HTTPException as e:
+                    if e.status_code == 500:
+                        raise
+                    ultimo_error = e
+            if hechas and not en_vuelo and siguiente < len(candidatos):
+                # Fallo sin otra petición en curso: se pasa al modelo de reserva
+                hedge_en = programar_hedge(lanzar())
+            elif not hechas and hedge_en is not None and loop.time() >= hedge_en:
+                # La primera petición va lenta: petición duplicada
+                hedge_en = None
+                if len(en_vuelo) < 2:
+                    modelo = lanzar()
+                    logger.info(f"Petición duplicada a {modelo.nombre} tras {round(loop.time() - inicio, 2)} s")
+    finally:
+        for tarea in en_vuelo:
+            tarea.cancel()
+
+    if en_vuelo or loop.time() >= limite:
+        raise HTTPException(status_code=504, detail="El análisis de IA superó el tiempo máximo")
+    raise ultimo_error or HTTPException(status_code=502, detail="Ningún modelo de OpenRouter disponible")
+
+
+ORIGEN_OPENROUTER = "openrouter"
+ORIGEN_AGRUPADA = "agrupada"
+
+# Análisis idénticos simultáneos comparten una sola consulta a caché/OpenRouter
+vuelos_analisis = VueloUnico()
+
+async def _analizar(diagnostico: str, modelo: str, clave: str):
+    resultado, nivel = await cache_analisis.obtener(clave)
+    if resultado is not None:
+        return resultado, nivel
+
+    inicio = time.perf_counter()
+    content, _ = await completar_enrutado(construir_prompt(diagnostico))
+    resultado, valido = interpretar_con_validez(content)
+    cache_analisis.registrar_llamada(time.perf_counter() - inicio)
+    if valido:
+        # Las respuestas que no son JSON no se guardan: la próxima vez se vuelve a preguntar
+        await cache_analisis.guardar(clave, diagnostico, modelo, VERSION_PROMPT, resultado)
+    return resultado, ORIGEN_OPENROUTER
+
+async def analizar_diagnostico(diagnostico: str):
+    """
+    Analiza el diagnóstico y devuelve ({resumen, recomendaciones, riesgos}, origen).
+    `origen` es "memoria" o "bd" si vino de la caché, "agrupada" si reutilizó
+    un análisis idéntico en curso y "openrouter" si no.
+    """
+    modelo = configuracion.modelo
+    clave = clave_analisis(diagnostico, modelo, VERSION_PROMPT)
+    (resultado, origen), agrupada = await vuelos_analisis.ejecutar(
+        clave, lambda: _analizar(diagnostico, modelo, clave)
+    )
+    return resultado, ORIGEN_AGRUPADA if agrupada else origen
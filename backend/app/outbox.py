@@ -0,0 +1,226 @@
+# outbox.py
+"""
+Outbox de correos: los correos de una cita se guardan en `correo_saliente`
+en la misma transacción que la cita y un trabajador en segundo plano los
+envía cuando llega su `programado_para`.
+
+  - confirmación: en cuanto se crea la cita;
+  - seguimiento rutinario: 2 horas después de la cita;
+  - formulario post-operatorio: 24 horas después de la cita.
+
+El trabajador reclama lotes de correos vencidos (SELECT ... FOR UPDATE SKIP
+LOCKED en MySQL, así varios workers de uvicorn no se pisan), los envía por
+el pool SMTP compartido y registra el resultado. Un fallo se reintenta con
+espera exponencial hasta CORREO_MAX_INTENTOS; después queda como `fallido`.
+Un correo `enviando` cuyo reclamo caduca (worker caído a mitad de envío) se
+vuelve a reclamar.
+
+Las fechas son hora local sin zona, igual que `cita.fecha_cita`.
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, and_, or_
+from . import models
+from .database import AsyncSessionLocal
+from .email_service import (
+    ConfiguracionSMTP,
+    obtener_pool_smtp,
+    generar_mensaje_confirmacion_cita,
+    generar_mensaje_seguimiento_rutinario,
+    generar_mensaje_postoperatorio_feedback,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+CORREO_LOTE = int(os.getenv("CORREO_LOTE", 50))
+CORREO_INTERVALO_S = float(os.getenv("CORREO_INTERVALO_S", 5))
+CORREO_MAX_INTENTOS = int(os.getenv("CORREO_MAX_INTENTOS", 5))
+CORREO_REINTENTO_BASE_S = float(os.getenv("CORREO_REINTENTO_BASE_S", 30))
+CORREO_REINTENTO_MAX_S = float(os.getenv("CORREO_REINTENTO_MAX_S", 3600))
+CORREO_RECLAMO_CADUCA_S = float(os.getenv("CORREO_RECLAMO_CADUCA_S", 300))
+
+PENDIENTE = "pendiente"
+ENVIANDO = "enviando"
+ENVIADO = "enviado"
+FALLIDO = "fallido"
+CANCELADO = "cancelado"
+
+CONFIRMACION_CITA = "confirmacion_cita"
+SEGUIMIENTO_RUTINARIO = "seguimiento_rutinario"
+FEEDBACK_POSTOPERATORIO = "feedback_postoperatorio"
+
+# tipo -> función que genera el mensaje a partir de destinatario + datos
+GENERADORES = {
+    CONFIRMACION_CITA: generar_mensaje_confirmacion_cita,
+    SEGUIMIENTO_RUTINARIO: generar_mensaje_seguimiento_rutinario,
+    FEEDBACK_POSTOPERATORIO: generar_mensaje_postoperatorio_feedback,
+}
+
+
+def _hora_local(fecha: datetime) -> datetime:
+    return fecha.astimezone().replace(tzinfo=None) if fecha.tzinfo else fecha
+
+
+def correos_de_cita(cita: models.Cita, paciente: models.Paciente):
+    """Correos (sin guardar) que genera una cita: confirmación y los dos seguimientos."""
+    ahora = datetime.now()
+    fecha_cita = _hora_local(cita.fecha_cita)
+    nombre_completo = f"{paciente.nombre} {paciente.apellidos}"
+    procedimiento = cita.detalle_cita or "Consulta"
+
+    # Fecha y hora por separado (formato: "YYYY-MM-DD HH:MM:SS")
+    fecha_str = str(cita.fecha_cita)
+    hora_str = "Por confirmar"
+    if " " in fecha_str:
+        partes = fecha_str.split(" ")
+        fecha_str = partes[0]
+        hora_str = partes[1][:5] if len(partes) > 1 else hora_str
+
+    def correo(tipo, programado_para, **datos):
+        return models.CorreoSaliente(
+            tipo=tipo,
+            destinatario=cita.correo_electronico,
+            datos=datos,
+            estado=PENDIENTE,
+            intentos=0,
+            programado_para=max(programado_para, ahora),
+        )
+
+    return [
+        correo(CONFIRMACION_CITA, ahora,
+               nombre_paciente=nombre_completo, fecha_cita=fecha_str, hora_cita=hora_str,
+               motivo=cita.detalle_cita or "Consulta general"),
+        correo(SEGUIMIENTO_RUTINARIO, fecha_cita + timedelta(hours=2),
+               nombre_paciente=nombre_completo, procedimiento=procedimiento, etapa="2_hours"),
+        correo(FEEDBACK_POSTOPERATORIO, fecha_cita + timedelta(hours=24),
+               nombre_paciente=nombre_completo, procedimiento=procedimiento, horas_postop=24,
+               paciente_id=paciente.id),
+    ]
+
+
+def espera_reintento(intentos: int) -> timedelta:
+    """Espera exponencial tras el intento número `intentos` (1, 2, ...)."""
+    segundos = CORREO_REINTENTO_BASE_S * 2 ** max(intentos - 1, 0)
+    return timedelta(seconds=min(segundos, CORREO_REINTENTO_MAX_S))
+
+
+class TrabajadorCorreo:
+    """Tarea asyncio que entrega los correos vencidos del outbox."""
+
+    def __init__(self, lote: int = CORREO_LOTE, intervalo: float = CORREO_INTERVALO_S):
+        self.lote = lote
+        self.intervalo = intervalo
+        self._tarea = None
+        self._despertar = None
+        self.enviados = 0
+        self.fallos = 0
+
+    async def reclamar(self):
+        """Marca como `enviando` un lote de correos vencidos y los devuelve."""
+        ahora = datetime.now()
+        caducado = ahora - timedelta(seconds=CORREO_RECLAMO_CADUCA_S)
+        CorreoSaliente = models.CorreoSaliente
+        async with AsyncSessionLocal() as db:
+            async with db.begin():
+                result = await db.execute(
+                    select(CorreoSaliente)
+                    .where(or_(
+                        and_(CorreoSaliente.estado == PENDIENTE, CorreoSaliente.programado_para <= ahora),
+                        and_(CorreoSaliente.estado == ENVIANDO, CorreoSaliente.reclamado_en < caducado),
+                    ))
+                    .order_by(CorreoSaliente.programado_para)
+                    .limit(self.lote)
+                    .with_for_update(skip_locked=True)
+                )
+                correos = result.scalars().all()
+                for correo in correos:
+                    correo.estado = ENVIANDO
+                    correo.reclamado_en = ahora
+                    correo.intentos += 1
+        return correos
+
+    async def _enviar(self, correo: models.CorreoSaliente):
+        mensaje = GENERADORES[correo.tipo](destinatario=correo.destinatario, **correo.datos)
+        await obtener_pool_smtp().enviar(mensaje)
+
+    async def procesar_lote(self) -> int:
+        """Reclama, envía y registra un lote. Devuelve cuántos correos se procesaron."""
+        correos = await self.reclamar()
+        if not correos:
+            return 0
+        # El pool SMTP limita las conexiones simultáneas
+        resultados = await asyncio.gather(*(self._enviar(c) for c in correos), return_exceptions=True)
+
+        ahora = datetime.now()
+        CorreoSaliente = models.CorreoSaliente
+        enviados = [c.id for c, r in zip(correos, resultados) if not isinstance(r, BaseException)]
+        async with AsyncSessionLocal() as db:
+            async with db.begin():
+                if enviados:
+                    await db.execute(
+                        update(CorreoSaliente).where(CorreoSaliente.id.in_(enviados))
+                        .values(estado=ENVIADO, enviado_en=ahora, ultimo_error=None)
+                    )
+                for correo, resultado in zip(correos, resultados):
+                    if not isinstance(resultado, BaseException):
+                        continue
+                    logger.warning(f"Fallo enviando correo {correo.id} ({correo.tipo}) a {correo.destinatario}: {resultado}")
+                    if correo.intentos >= CORREO_MAX_INTENTOS:
+                        valores = {"estado": FALLIDO}
+                    else:
+                        valores = {"estado": PENDIENTE, "programado_para": ahora + espera_reintento(correo.intentos)}
+                    await db.execute(
+                        update(CorreoSaliente).where(CorreoSaliente.id == correo.id)
+                        .values(ultimo_error=str(resultado)[:1000], **valores)
+                    )
+        self.enviados += len(enviados)
+        self.fallos += len(correos) - len(enviados)
+        return len(correos)
+
+    async def _bucle(self):
+        while True:
+            try:
+                procesados = await self.procesar_lote()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error en el trabajador de correo")
+                procesados = 0
+            if procesados < self.lote:
+                # Lote incompleto: no queda nada vencido, esperar al siguiente aviso o intervalo
+                try:
+                    await asyncio.wait_for(self._despertar.wait(), timeout=self.intervalo)
+                except asyncio.TimeoutError:
+                    pass
+                self._despertar.clear()
+
+    def avisar(self):
+        """Despierta al trabajador (p. ej. tras encolar una confirmación)."""
+        if self._despertar is not None:
+            self._despertar.set()
+
+    def iniciar(self) -> bool:
+        """Arranca el trabajador si hay configuración SMTP; sin ella los correos quedan pendientes."""
+        try:
+            ConfiguracionSMTP().validar()
+        except ValueError:
+            logger.warning("Trabajador de correo desactivado: falta configuración SMTP")
+            return False
+        self._despertar = asyncio.Event()
+        self._tarea = asyncio.create_task(self._bucle())
+        return True
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+        self._tarea = None
+        self._despertar = None
+
+
+trabajador_correo = TrabajadorCorreo()
@@ -0,0 +1,87 @@
+# pool_metrics.py
+"""
+Métricas del pool de conexiones de SQLAlchemy.
+
+Los contadores de checkout/checkin/conexiones se alimentan con eventos del
+pool; el tiempo de espera de checkout y los timeouts se miden en una subclase
+del pool (`_do_get`), que es donde SQLAlchemy bloquea cuando el pool está lleno.
+Los valores son por proceso: con varios workers de uvicorn cada uno tiene el suyo.
+"""
+import os
+import threading
+import time
+from sqlalchemy import event, exc
+
+class MetricasPool:
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.pool = None
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.conexiones_creadas = 0
+        self.conexiones_invalidadas = 0
+        self.timeouts = 0
+        self.esperas = 0
+        self.espera_total_s = 0.0
+        self.espera_max_s = 0.0
+
+    def registrar_espera(self, segundos: float, timeout: bool = False):
+        with self._lock:
+            self.esperas += 1
+            self.espera_total_s += segundos
+            if segundos > self.espera_max_s:
+                self.espera_max_s = segundos
+            if timeout:
+                self.timeouts += 1
+
+    def _incrementar(self, campo: str):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def escuchar(self, pool):
+        """Registra los eventos del pool indicado."""
+        self.pool = pool
+        event.listen(pool, "connect", lambda *a: self._incrementar("conexiones_creadas"))
+        event.listen(pool, "checkout", lambda *a: self._incrementar("checkouts"))
+        event.listen(pool, "checkin", lambda *a: self._incrementar("checkins"))
+        event.listen(pool, "invalidate", lambda *a: self._incrementar("conexiones_invalidadas"))
+
+    def instantanea(self) -> dict:
+        pool = self.pool
+        datos = {
+            "pool": self.nombre,
+            "pid": os.getpid(),
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "conexiones_creadas": self.conexiones_creadas,
+            "conexiones_invalidadas": self.conexiones_invalidadas,
+            "checkout_timeouts": self.timeouts,
+            "checkout_espera_media_ms": round(self.espera_total_s / self.esperas * 1000, 3) if self.esperas else 0.0,
+            "checkout_espera_max_ms": round(self.espera_max_s * 1000, 3),
+        }
+        # Solo QueuePool (y su variante async) expone tamaño y overflow
+        if pool is not None and hasattr(pool, "overflow"):
+            datos.update({
+                "tamano": pool.size(),
+                "en_uso": pool.checkedout(),
+                "disponibles": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "timeout_s": pool.timeout(),
+            })
+        return datos
+
+def pool_con_metricas(pool_cls, metricas: MetricasPool):
+    """Subclase de `pool_cls` que mide cuánto tarda cada checkout."""
+    class PoolConMetricas(pool_cls):
+        def _do_get(self):
+            inicio = time.perf_counter()
+            try:
+                conexion = super()._do_get()
+            except exc.TimeoutError:
+                metricas.registrar_espera(time.perf_counter() - inicio, timeout=True)
+                raise
+            metricas.registrar_espera(time.perf_counter() - inicio)
+            return conexion
+    PoolConMetricas.__name__ = f"{pool_cls.__name__}ConMetricas"
+    return PoolConMetricas
@@ -2,27 +2,108 @@
 # Endpoints de la API
 
 # Endpoints de la API para historial clínico
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from . import crud, schemas, models
-from .database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import datetime
+from . import crud, crud_async, schemas, models
+from .database import get_db, get_async_db, SessionLocal
+from .auth import get_current_doctor_id
 from .utils import verify_password, create_access_token
-from .email_service import enviar_correo_confirmacion_cita, enviar_tres_correos_demo
+from .outbox import trabajador_correo
+from .serializacion import columnas, a_dicts, a_json, respuesta_filas, SERIALIZACION_VALIDAR
 import logging
-from app.feedback_submitter import guardar_feedback
+from app.feedback_submitter import fila_feedback, insertar_feedbacks, loteador_feedback, FEEDBACK_BULK_MAX
 from pydantic import BaseModel
 
 router = APIRouter()
 logger = logging.getLogger("uvicorn.error")
 
+# ==================== PAGINACIÓN ====================
+class Paginacion:
+    """
+    Parámetros comunes de los listados.
+    - `cursor`: último id recibido; se devuelven las filas con id mayor.
+    - `limit`: tamaño de página (acotado por crud.LIMITE_MAXIMO).
+    - `stream`: si es true se devuelve toda la colección como NDJSON, leída por lotes.
+    - `total`: si es true se publica en `X-Total-Count` el número de filas del
+      listado (con sus filtros), para contadores que no necesitan las filas
+      (p. ej. `?limit=1&total=true`).
+    """
+    def __init__(
+        self,
+        cursor: Optional[int] = Query(None, ge=0),
+        limit: int = Query(crud.LIMITE_POR_DEFECTO, ge=1, le=crud.LIMITE_MAXIMO),
+        stream: bool = False,
+        total: bool = False,
+    ):
+        self.cursor = cursor
+        self.limit = limit
+        self.stream = stream
+        self.total = total
+
+def pagina(schema, modelo, filas, paginacion: Paginacion, total: int = None):
+    """
+    Respuesta JSON de una página leída con `columnas(schema, modelo)` (ver
+    serializacion.py). Publica el cursor de la siguiente página en
+    `X-Next-Cursor` si la página está llena, y `total` en `X-Total-Count`.
+    """
+    respuesta = respuesta_filas(schema, modelo, filas)
+    if len(filas) == paginacion.limit:
+        respuesta.headers["X-Next-Cursor"] = str(filas[-1].id)
+    if total is not None:
+        respuesta.headers["X-Total-Count"] = str(total)
+    return respuesta
+
+def listado(db: Session, modelo, schema, paginacion: Paginacion, *criterios):
+    """Página de `modelo` filtrada por `criterios`, seleccionando solo las columnas de `schema`."""
+    query = db.query(*columnas(schema, modelo)).filter(*criterios)
+    filas = crud.paginar(query, modelo, paginacion.cursor, paginacion.limit)
+    total = crud.contar(db, modelo, *criterios) if paginacion.total else None
+    return pagina(schema, modelo, filas, paginacion, total)
+
+def stream_ndjson(modelo, schema, paginacion: Paginacion, *criterios):
+    """
+    Serializa la consulta fila a fila como NDJSON. Usa su propia sesión porque
+    el cuerpo se genera después de que la ruta haya devuelto la respuesta.
+    """
+    def generar():
+        db = SessionLocal()
+        try:
+            query = db.query(*columnas(schema, modelo)).filter(*criterios)
+            for lote in _lotes(crud.iterar(query, modelo, paginacion.cursor)):
+                datos = a_dicts(schema, modelo, lote)
+                if SERIALIZACION_VALIDAR:
+                    yield b"".join(schema.model_validate(d).model_dump_json().encode() + b"\n" for d in datos)
+                else:
+                    yield b"".join(a_json(d) + b"\n" for d in datos)
+        finally:
+            db.close()
+    return StreamingResponse(generar(), media_type="application/x-ndjson")
+
+def _lotes(filas):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) == crud.FILAS_POR_LOTE_STREAM:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
 # Endpoints Usuario
 @router.post("/usuarios", response_model=schemas.Usuario)
-def create_usuario(usuario: schemas.UsuarioCreate, db: Session = Depends(get_db)):
-    return crud.create_usuario(db, usuario)
+async def create_usuario(usuario: schemas.UsuarioCreate, db: AsyncSession = Depends(get_async_db)):
+    return await crud_async.create_usuario(db, usuario)
 
 @router.get("/usuarios", response_model=list[schemas.Usuario])
-def read_usuarios(db: Session = Depends(get_db)):
-    return crud.get_usuarios(db)
+def read_usuarios(paginacion: Paginacion = Depends(), db: Session = Depends(get_db)):
+    if paginacion.stream:
+        return stream_ndjson(models.Usuario, schemas.Usuario, paginacion)
+    return listado(db, models.Usuario, schemas.Usuario, paginacion)
 
 # ==================== DOCTORES ====================
 @router.post("/doctores", response_model=schemas.Doctor)
@@ -30,8 +111,10 @@ def create_doctor(doctor: schemas.DoctorCreate, db: Session = Depends(get_db)):
     return crud.create_doctor(db, doctor)
 
 @router.get("/doctores", response_model=list[schemas.Doctor])
-def read_doctores(db: Session = Depends(get_db)):
-    return crud.get_doctores(db)
+def read_doctores(paginacion: Paginacion = Depends(), db: Session = Depends(get_db)):
+    if paginacion.stream:
+        return stream_ndjson(models.Doctor, schemas.Doctor, paginacion)
+    return listado(db, models.Doctor, schemas.Doctor, paginacion)
 
 # ==================== PACIENTES ====================
 @router.post("/pacientes", response_model=schemas.Paciente)
@@ -39,14 +122,23 @@ def create_paciente(paciente: schemas.PacienteCreate, db: Session = Depends(get_
     return crud.create_paciente(db, paciente)
 
 @router.get("/pacientes", response_model=list[schemas.Paciente])
-def read_pacientes(db: Session = Depends(get_db)):
+def read_pacientes(paginacion: Paginacion = Depends(), db: Session = Depends(get_db)):
     # Si quisieras filtrar globalmente aquí, pero el dashboard usa /pacientes/doctor/{id}
-    return crud.get_pacientes(db)
+    if paginacion.stream:
+        return stream_ndjson(models.Paciente, schemas.Paciente, paginacion)
+    return listado(db, models.Paciente, schemas.Paciente, paginacion)
+
+@router.get("/pacientes/doctor/me", response_model=list[schemas.Paciente])
+def read_pacientes_doctor_actual(paginacion: Paginacion = Depends(), doctor_id: int = Depends(get_current_doctor_id), db: Session = Depends(get_db)):
+    """Pacientes del doctor autenticado (doctor_id tomado del token, sin consultar al doctor)"""
+    return read_pacientes_by_doctor(doctor_id, paginacion, db)
 
 @router.get("/pacientes/doctor/{doctor_id}", response_model=list[schemas.Paciente])
-def read_pacientes_by_doctor(doctor_id: int, db: Session = Depends(get_db)):
-    """Obtiene todos los pacientes asignados a un doctor específico"""
-    return db.query(models.Paciente).filter(models.Paciente.doctor_id == doctor_id).all()
+def read_pacientes_by_doctor(doctor_id: int, paginacion: Paginacion = Depends(), db: Session = Depends(get_db)):
+    """Obtiene los pacientes asignados a un doctor específico"""
+    if paginacion.stream:
+        return stream_ndjson(models.Paciente, schemas.Paciente, paginacion, models.Paciente.doctor_id == doctor_id)
+    return listado(db, models.Paciente, schemas.Paciente, paginacion, models.Paciente.doctor_id == doctor_id)
 
 @router.get("/pacientes/{paciente_id}", response_model=schemas.Paciente)
 def read_paciente(paciente_id: int, db: Session = Depends(get_db)):
@@ -61,8 +153,10 @@ def post_feedback(feedback: schemas.FeedbackCreate, db: Session = Depends(get_db
     return crud.create_feedback(db, feedback)
 
 @router.get("/feedback/paciente/{paciente_id}", response_model=list[schemas.Feedback])
-def get_feedback_paciente(paciente_id: int, db: Session = Depends(get_db)):
-    return crud.get_feedback_by_paciente(db, paciente_id)
+def get_feedback_paciente(paciente_id: int, paginacion: Paginacion = Depends(), db: Session = Depends(get_db)):
+    if paginacion.stream:
+        return stream_ndjson(models.Feedback, schemas.Feedback, paginacion, models.Feedback.paciente_id == paciente_id)
+    return listado(db, models.Feedback, schemas.Feedback, paginacion, models.Feedback.paciente_id == paciente_id)
     paciente = db.query(models.Paciente).filter(models.Paciente.id == paciente_id).first()
     if not paciente:
         raise HTTPException(status_code=404, detail="Paciente no encontrado")
@@ -88,16 +182,23 @@ def create_historial(historial: schemas.HistorialClinicoCreate, db: Session = De
     return crud.create_historial(db, historial)
 
 @router.get("/historiales", response_model=list[schemas.HistorialClinico])
-def read_historiales(db: Session = Depends(get_db)):
-    return crud.get_historiales(db)
+def read_historiales(paginacion: Paginacion = Depends(), db: Session = Depends(get_db)):
+    if paginacion.stream:
+        return stream_ndjson(models.HistorialClinico, schemas.HistorialClinico, paginacion)
+    return listado(db, models.HistorialClinico, schemas.HistorialClinico, paginacion)
 
 @router.get("/historiales/paciente/{paciente_id}", response_model=list[schemas.HistorialClinico])
-def read_historiales_paciente(paciente_id: int, db: Session = Depends(get_db)):
-    """Obtiene todos los historiales clínicos de un paciente específico"""
+def read_historiales_paciente(paciente_id: int, paginacion: Paginacion = Depends(), db: Session = Depends(get_db)):
+    """Obtiene los historiales clínicos de un paciente específico"""
     paciente = crud.get_paciente(db, paciente_id)
     if not paciente:
         raise HTTPException(status_code=404, detail="Paciente no encontrado")
-    return crud.get_historiales_by_paciente(db, paciente_id)
+    if paginacion.stream:
+        return stream_ndjson(
+            models.HistorialClinico, schemas.HistorialClinico, paginacion,
+            models.HistorialClinico.paciente_id == paciente_id,
+        )
+    return listado(db, models.HistorialClinico, schemas.HistorialClinico, paginacion, models.HistorialClinico.paciente_id == paciente_id)
 
 @router.get("/historiales/{historial_id}", response_model=schemas.HistorialClinico)
 def read_historial(historial_id: int, db: Session = Depends(get_db)):
@@ -136,66 +237,55 @@ def confirmar_llegada(data: CheckInRequest, db: Session = Depends(get_db)):
 
 
 @router.post("/citas", response_model=schemas.Cita)
-async def create_cita(cita: schemas.CitaCreate, db: Session = Depends(get_db)):
+async def create_cita(cita: schemas.CitaCreate, db: AsyncSession = Depends(get_async_db)):
     # Antes de crear, validar que el paciente sea propiedad de este doctor?
     # Por ahora simplemente permitimos crearlo, pero si no se especifica doctor_id,
     # podriamos heredar el del paciente
     if not cita.doctor_id and cita.paciente_id:
-        paciente = crud.get_paciente(db, cita.paciente_id)
+        paciente = await crud_async.get_paciente(db, cita.paciente_id)
         if paciente:
             cita.doctor_id = paciente.doctor_id
 
-    # Crear la cita
-    nueva_cita = crud.create_cita(db, cita)
-
-    # Enviar correo de confirmación si hay email
+    # Crear la cita; sus correos quedan en el outbox dentro de la misma transacción
+    nueva_cita = await crud_async.create_cita(db, cita)
     if cita.correo_electronico:
-        try:
-            # Obtener información del paciente
-            paciente = crud.get_paciente(db, cita.paciente_id)
-            if paciente:
-                nombre_completo = f"{paciente.nombre} {paciente.apellidos}"
-
-                # Extraer hora de fecha_cita si es datetime, o usar un valor por defecto
-                fecha_str = str(cita.fecha_cita)
-                hora_str = "Por confirmar"
-
-                # Si fecha_cita incluye hora (formato: "YYYY-MM-DD HH:MM:SS")
-                if " " in fecha_str:
-                    partes = fecha_str.split(" ")
-                    fecha_str = partes[0]
-                    hora_str = partes[1][:5] if len(partes) > 1 else hora_str
-
-                # Enviar los tres correos de demostración inmediatamente.
-                # En producción estos deberían programarse para enviarse más tarde.
-                await enviar_tres_correos_demo(
-                    destinatario=cita.correo_electronico,
-                    nombre_paciente=nombre_completo,
-                    fecha_cita=fecha_str,
-                    hora_cita=hora_str,
-                    motivo=cita.detalle_cita or "Consulta general",
-                    procedimiento=cita.detalle_cita or "Consulta",
-                    paciente_id=paciente.id  # <-- PASA EL ID DEL PACIENTE AQUÍ
-                )
-                logger.info(f"Correos demo enviados a {cita.correo_electronico}")
-        except Exception as e:
-            # No fallar la creación de la cita si falla el correo
-            logger.warning(f"No se pudo enviar correo de confirmación: {e}")
+        # La confirmación sale ya; los seguimientos cuando les toque
+        trabajador_correo.avisar()
 
     return nueva_cita
 
 @router.get("/citas", response_model=list[schemas.Cita])
-def read_citas(db: Session = Depends(get_db)):
-    return db.query(models.Cita).all()
+async def read_citas(
+    paginacion: Paginacion = Depends(),
+    doctor_id: Optional[int] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Citas paginadas por id. Filtros opcionales: `doctor_id` y el intervalo
+    [`desde`, `hasta`) de `fecha_cita` (agenda del día, de la semana o del mes).
+    """
+    criterios = []
+    if doctor_id is not None:
+        criterios.append(models.Cita.doctor_id == doctor_id)
+    if desde is not None:
+        criterios.append(models.Cita.fecha_cita >= desde)
+    if hasta is not None:
+        criterios.append(models.Cita.fecha_cita < hasta)
+    if paginacion.stream:
+        return stream_ndjson(models.Cita, schemas.Cita, paginacion, *criterios)
+    stmt = select(*columnas(schemas.Cita, models.Cita)).where(*criterios)
+    filas = await crud_async.paginar_filas(db, stmt, models.Cita, paginacion.cursor, paginacion.limit)
+    total = await crud_async.contar(db, models.Cita, *criterios) if paginacion.total else None
+    return pagina(schemas.Cita, models.Cita, filas, paginacion, total)
 
 @router.delete("/citas/{cita_id}")
-def delete_cita(cita_id: int, db: Session = Depends(get_db)):
+async def delete_cita(cita_id: int, db: AsyncSession = Depends(get_async_db)):
     """Eliminar una cita por ID"""
-    cita = db.query(models.Cita).filter(models.Cita.id == cita_id).first()
+    cita = await crud_async.delete_cita(db, cita_id)
     if not cita:
         raise HTTPException(status_code=404, detail="Cita no encontrada")
-    db.delete(cita)
-    db.commit()
     return {"message": "Cita eliminada exitosamente"}
 
 # ==================== CONSULTORIOS ====================
@@ -204,8 +294,10 @@ def create_consultorio(consultorio: schemas.ConsultorioCreate, db: Session = Dep
     return crud.create_consultorio(db, consultorio)
 
 @router.get("/consultorios", response_model=list[schemas.Consultorio])
-def read_consultorios(db: Session = Depends(get_db)):
-    return crud.get_consultorios(db)
+def read_consultorios(paginacion: Paginacion = Depends(), db: Session = Depends(get_db)):
+    if paginacion.stream:
+        return stream_ndjson(models.Consultorio, schemas.Consultorio, paginacion)
+    return listado(db, models.Consultorio, schemas.Consultorio, paginacion)
 
 # ==================== DOCTOR CONSULTORIO ====================
 @router.post("/doctor_consultorios", response_model=schemas.DoctorConsultorio)
@@ -213,8 +305,10 @@ def create_doctor_consultorio(dc: schemas.DoctorConsultorioCreate, db: Session =
     return crud.create_doctor_consultorio(db, dc)
 
 @router.get("/doctor_consultorios", response_model=list[schemas.DoctorConsultorio])
-def read_doctor_consultorios(db: Session = Depends(get_db)):
-    return crud.get_doctor_consultorios(db)
+def read_doctor_consultorios(paginacion: Paginacion = Depends(), db: Session = Depends(get_db)):
+    if paginacion.stream:
+        return stream_ndjson(models.DoctorConsultorio, schemas.DoctorConsultorio, paginacion)
+    return listado(db, models.DoctorConsultorio, schemas.DoctorConsultorio, paginacion)
 
 # ==================== FEEDBACK FORM ====================
 class FeedbackInput(BaseModel):
@@ -230,6 +324,24 @@ class FeedbackInput(BaseModel):
     doctor_id: int | None = None
 
 @router.post("/feedback-form", status_code=201)
-def submit_feedback_form(feedback: FeedbackInput):
-    nuevo_feedback = guardar_feedback(**feedback.dict())
-    return {"message": "Feedback guardado", "feedback_id": nuevo_feedback.id}
+async def submit_feedback_form(feedback: FeedbackInput):
+    # Se agrupa con otros envíos simultáneos en un solo INSERT
+    feedback_id = await loteador_feedback.guardar(fila_feedback(**feedback.dict()))
+    return {"message": "Feedback guardado", "feedback_id": feedback_id}
+
+@router.post("/feedback-form/bulk", status_code=201)
+def submit_feedback_form_bulk(feedbacks: list[FeedbackInput]):
+    """
+    Carga en lote de encuestas post-operatorias (una transacción, INSERT multi-fila).
+    Admite hasta FEEDBACK_BULK_MAX encuestas por petición (1000 por defecto); con
+    más se responde 413 y hay que partir la carga en varias peticiones.
+    """
+    if not feedbacks:
+        raise HTTPException(status_code=400, detail="La lista de feedback está vacía")
+    if len(feedbacks) > FEEDBACK_BULK_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Demasiadas encuestas en una petición: {len(feedbacks)} (máximo {FEEDBACK_BULK_MAX})",
+        )
+    ids = insertar_feedbacks([fila_feedback(**feedback.dict()) for feedback in feedbacks])
+    return {"message": f"{len(ids)} feedback guardados", "feedback_ids": ids}
@@ -1,10 +1,14 @@
 """
 Rutas para el envío de correos electrónicos
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import get_async_db
 from .email_service import enviar_correo_confirmacion_cita
+from . import crud_async, campanas
 import logging
 
 router = APIRouter()
@@ -50,3 +54,73 @@ async def enviar_confirmacion_cita(request: EmailCitaRequest):
             status_code=500,
             detail=f"Error al enviar correo: {str(e)}"
         )
+
+
+class CorreoSaliente(BaseModel):
+    id: int
+    tipo: str
+    destinatario: str
+    estado: str
+    intentos: int
+    programado_para: datetime
+    enviado_en: Optional[datetime] = None
+    ultimo_error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+@router.get("/outbox/cita/{cita_id}", response_model=list[CorreoSaliente])
+async def correos_de_cita(cita_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Estado de entrega de los correos programados para una cita
+    """
+    return await crud_async.get_correos_de_cita(db, cita_id)
+
+
+class CampanaRecordatoriosRequest(BaseModel):
+    # Sin fechas: las citas de mañana
+    desde: Optional[datetime] = None
+    hasta: Optional[datetime] = None
+
+
+async def _informe_campana(campana_id: int):
+    campana = await campanas.obtener_campana(campana_id)
+    if campana is None:
+        raise HTTPException(status_code=404, detail="Campaña no encontrada")
+    return campanas.informe(campana)
+
+
+@router.post("/campanas/recordatorios", status_code=202)
+async def crear_campana_recordatorios(request: CampanaRecordatoriosRequest):
+    """
+    Crea una campaña de recordatorios para las citas de la ventana y la envía en segundo plano
+    """
+    desde, hasta = campanas.ventana_manana()
+    try:
+        campana = await campanas.crear_campana(request.desde or desde, request.hasta or hasta)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    campanas.lanzar(campana.id)
+    return campanas.informe(campana)
+
+
+@router.get("/campanas/{campana_id}")
+async def estado_campana(campana_id: int):
+    """
+    Progreso, rendimiento (mensajes/s) y fallos de una campaña
+    """
+    return await _informe_campana(campana_id)
+
+
+@router.post("/campanas/{campana_id}/reanudar", status_code=202)
+async def reanudar_campana(campana_id: int):
+    """
+    Reanuda una campaña interrumpida desde su último punto de control
+    """
+    datos = await _informe_campana(campana_id)
+    if datos["estado"] == campanas.COMPLETADA:
+        return datos
+    if not campanas.lanzar(campana_id):
+        raise HTTPException(status_code=409, detail="La campaña ya se está ejecutando")
+    return datos
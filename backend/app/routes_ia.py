@@ -1,14 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
-import os
+from datetime import datetime
 import json
 import logging
-import httpx
-import re
-from sqlalchemy.orm import Session
-from .database import get_db
-from . import crud, models, schemas
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import get_async_db
+from . import crud_async, openrouter, cache_ia, analisis_lote, analisis_stream, trabajos_ia
 
 router = APIRouter()
 logger = logging.getLogger("uvicorn.error")
@@ -21,108 +20,162 @@ class AnalisisRequest(BaseModel):
     historiales: Optional[List[dict]] = None
 
 
+CABECERA_CACHE = {
+    cache_ia.MEMORIA: "HIT-MEMORIA",
+    cache_ia.BD: "HIT-BD",
+    openrouter.ORIGEN_AGRUPADA: "COALESCED",
+    openrouter.ORIGEN_OPENROUTER: "MISS",
+}
+
+
 @router.post("/analyze")
-async def analyze(req: AnalisisRequest):
+async def analyze(req: AnalisisRequest, response: Response):
     """
     Analiza un diagnóstico dental con IA usando OpenRouter.
     Devuelve JSON con resumen, recomendaciones y riesgos.
+    La cabecera X-Cache indica si vino de la caché (HIT-MEMORIA / HIT-BD), de una
+    petición idéntica en curso (COALESCED) o de OpenRouter (MISS).
     """
     diagnostico = (req.diagnostico or "").strip()
     
     if not diagnostico:
         raise HTTPException(status_code=400, detail="El diagnóstico no puede estar vacío")
     
-    # Obtener API key
-    api_key = os.getenv("API_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="API_KEY no configurada")
-    
-    # Modelo gratuito recomendado
-    model = os.getenv("OPENROUTER_MODEL", "meta-llama/llama-3.2-3b-instruct:free")
-    
-    # Construir prompt simple
-    prompt = f"""Eres un asistente dental. Analiza el diagnóstico y responde SOLO con JSON válido.
-    
-    Diagnóstico: {diagnostico}
-    
-    Formato de respuesta (copia y completa EXACTAMENTE):
-    {{"resumen": "tu análisis aquí", "recomendaciones": ["rec1", "rec2", "rec3"], "riesgos": ["riesgo1", "riesgo2"]}}"""
-    
-    # Llamar a OpenRouter usando el código oficial
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": model,
-        "messages": [
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
-    }
-    
     try:
-        async with httpx.AsyncClient(timeout=60) as client:
-            response = await client.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            data = response.json()
-        
-        # Extraer contenido
-        try:
-            content = data["choices"][0]["message"]["content"].strip()
-        except (KeyError, IndexError) as e:
-            logger.error("Estructura inesperada de OpenRouter: %s", data)
-            raise HTTPException(status_code=502, detail="Respuesta inválida de OpenRouter")
-        
-        if not content:
-            raise HTTPException(status_code=502, detail="OpenRouter devolvió respuesta vacía")
-        
-        # Limpiar el contenido antes de parsear
-        # Extraer solo el JSON válido usando regex
-        json_match = re.search(r'\{[\s\S]*\}', content)
-        if json_match:
-            content = json_match.group(0)
-        
-        # Limpiar caracteres problemáticos
-        content = content.strip()
-        
-        # Parsear JSON del contenido
-        try:
-            resultado = json.loads(content)
-            
-            # Validar estructura básica
-            if not isinstance(resultado.get("resumen"), str):
-                resultado["resumen"] = content[:200]
-            if not isinstance(resultado.get("recomendaciones"), list):
-                resultado["recomendaciones"] = []
-            if not isinstance(resultado.get("riesgos"), list):
-                resultado["riesgos"] = []
-            
-            return resultado
-            
-        except json.JSONDecodeError:
-            logger.error("Content no es JSON válido después de limpieza: %s", content[:500])
-            # Fallback: devolver contenido como resumen
-            return {
-                "resumen": content,
-                "recomendaciones": ["Revisar análisis manual"],
-                "riesgos": []
-            }
-    
-    except httpx.HTTPStatusError as e:
-        logger.error("OpenRouter HTTP error: %s - %s", e.response.status_code, e.response.text)
-        raise HTTPException(status_code=502, detail=f"Error de OpenRouter: {e.response.status_code}")
-    except httpx.RequestError as e:
-        logger.error("Error de conexión con OpenRouter: %s", e)
-        raise HTTPException(status_code=502, detail="No se pudo conectar con OpenRouter")
+        # Caché de dos niveles; si falla, cliente HTTP compartido (keep-alive)
+        resultado, origen = await openrouter.analizar_diagnostico(diagnostico)
+        response.headers["X-Cache"] = CABECERA_CACHE[origen]
+        return resultado
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Error inesperado: %s", e)
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
 
+@router.post("/analyze/stream")
+async def analyze_stream(req: AnalisisRequest):
+    """
+    Variante en streaming de /analyze (Server-Sent Events).
+    Eventos: `token` (texto del modelo según llega), `resumen`, `recomendacion` y
+    `riesgo` en cuanto se completan, `final` con el análisis completo o `error`.
+    """
+    diagnostico = (req.diagnostico or "").strip()
+
+    if not diagnostico:
+        raise HTTPException(status_code=400, detail="El diagnóstico no puede estar vacío")
+    if not openrouter.configuracion.api_key:
+        raise HTTPException(status_code=500, detail="API_KEY no configurada")
+
+    async def generar():
+        try:
+            async for evento, datos in analisis_stream.eventos_analisis(diagnostico):
+                yield f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.exception("Error inesperado: %s", e)
+            yield f"event: error\ndata: {json.dumps({'status_code': 500, 'detail': 'Error interno del servidor'})}\n\n"
+
+    return StreamingResponse(
+        generar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class AnalisisLoteRequest(BaseModel):
+    consulta_ids: Optional[List[int]] = None
+    paciente_id: Optional[int] = None
+    doctor_id: Optional[int] = None
+    todas: bool = False
+    solo_pendientes: bool = True
+    concurrencia: int = analisis_lote.IA_LOTE_CONCURRENCIA
+
+
+@router.post("/analyze-batch")
+async def analyze_batch(req: AnalisisLoteRequest):
+    """
+    Analiza con IA las consultas del filtro y guarda cada resultado en `analisis_ia`.
+    Devuelve NDJSON: una línea por consulta según terminan y una línea final `resumen_lote`.
+    """
+    filtro = analisis_lote.FiltroLote(
+        consulta_ids=req.consulta_ids,
+        paciente_id=req.paciente_id,
+        doctor_id=req.doctor_id,
+        todas=req.todas,
+        solo_pendientes=req.solo_pendientes,
+    )
+    try:
+        filtro.validar()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def generar():
+        async for linea in analisis_lote.analizar_lote(filtro, req.concurrencia):
+            yield json.dumps(linea, ensure_ascii=False, default=str) + "\n"
+    return StreamingResponse(generar(), media_type="application/x-ndjson")
+
+
+class TrabajoAnalisisRequest(BaseModel):
+    consulta_id: int
+
+
+class TrabajoAnalisis(BaseModel):
+    id: int
+    consulta_id: int
+    estado: str
+    intentos: int
+    resultado: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    terminado_en: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+@router.post("/trabajos", response_model=TrabajoAnalisis, status_code=202)
+async def crear_trabajo_analisis(req: TrabajoAnalisisRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Encola el análisis de IA de una consulta y devuelve el trabajo al momento.
+    El resultado se guarda solo en `analisis_ia`; consultar GET /ia/trabajos/{id}.
+    """
+    return await trabajos_ia.encolar(db, req.consulta_id)
+
+
+@router.get("/trabajos/{trabajo_id}", response_model=TrabajoAnalisis)
+async def obtener_trabajo_analisis(trabajo_id: int, esperar: float = Query(0, ge=0, le=60)):
+    """
+    Estado del trabajo. Con `esperar=N` la respuesta espera hasta N segundos
+    a que el trabajo termine (long polling).
+    """
+    if esperar:
+        trabajo = await trabajos_ia.pool_trabajos_ia.esperar(trabajo_id, esperar)
+    else:
+        trabajo = await trabajos_ia.obtener(trabajo_id)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo
+
+
+@router.get("/cache")
+async def estado_cache():
+    """
+    Aciertos/fallos de la caché de análisis en este worker, tiempo ahorrado estimado
+    y llamadas agrupadas con otra idéntica en curso.
+    """
+    return {**cache_ia.cache_analisis.estadisticas(), "vuelo_unico": openrouter.vuelos_analisis.estadisticas()}
+
+
+@router.get("/modelos")
+async def estado_modelos():
+    """Latencia (EWMA y p95), tasa de errores y circuito de cada modelo en este worker."""
+    return {
+        "presupuesto_s": openrouter.configuracion.presupuesto_s,
+        "hedge": openrouter.configuracion.hedge,
+        "modelos": openrouter.enrutador_modelos.estadisticas(),
+    }
+
+
 class GuardarAnalisisRequest(BaseModel):
     consulta_id: int
     resumen: str
@@ -131,43 +184,37 @@ class GuardarAnalisisRequest(BaseModel):
 
 
 @router.post("/guardar-analisis")
-async def guardar_analisis(req: GuardarAnalisisRequest, db: Session = Depends(get_db)):
+async def guardar_analisis(req: GuardarAnalisisRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Guarda el análisis de IA en la base de datos asociado a una consulta.
     """
     try:
-        consulta = db.query(models.HistorialClinico).filter(
-            models.HistorialClinico.id == req.consulta_id
-        ).first()
-        
-        if not consulta:
-            raise HTTPException(status_code=404, detail="Consulta no encontrada")   
-        
-        # Guardar análisis como JSON en un campo nuevo o actualizar campos existentes
-        # Opción 1: Si tienes campo 'analisis_ia' en el modelo (JSON)
-        consulta.analisis_ia = {
+        # Guardar análisis como JSON en el campo 'analisis_ia'
+        consulta = await crud_async.guardar_analisis_ia(db, req.consulta_id, {
             "resumen": req.resumen,
             "recomendaciones": req.recomendaciones,
             "riesgos": req.riesgos
-        }
+        })
+        
+        if not consulta:
+            raise HTTPException(status_code=404, detail="Consulta no encontrada")   
         
-        db.commit()
         return {"message": "Análisis guardado exitosamente"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Error guardando análisis: %s", e)
         raise HTTPException(status_code=500, detail="Error guardando análisis")
 
 
 @router.get("/obtener-analisis/{consulta_id}")
-async def obtener_analisis(consulta_id: int, db: Session = Depends(get_db)):
+async def obtener_analisis(consulta_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Obtiene el análisis de IA guardado para una consulta específica.
     """
     try:
-        consulta = db.query(models.HistorialClinico).filter(
-            models.HistorialClinico.id == consulta_id
-        ).first()
+        consulta = await crud_async.get_historial(db, consulta_id)
         
         if not consulta:
             raise HTTPException(status_code=404, detail="Consulta no encontrada")
@@ -178,6 +225,8 @@ async def obtener_analisis(consulta_id: int, db: Session = Depends(get_db)):
         
         return consulta.analisis_ia
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Error obteniendo análisis: %s", e)
         raise HTTPException(status_code=500, detail="Error obteniendo análisis")
\ No newline at end of file
@@ -0,0 +1,80 @@
+# serializacion.py
+"""
+Camino rápido de serialización para los listados grandes.
+
+Con `response_model`, FastAPI recibe objetos ORM completos, los valida uno a
+uno con `from_attributes`, los vuelca a dicts y los codifica con `json`. Para
+páginas de cientos o miles de filas eso domina el tiempo de la petición. Aquí:
+
+- `columnas(schema, modelo)`: solo las columnas que expone el esquema, que se
+  seleccionan como tuplas (sin identity map ni objetos ORM). Como el esquema
+  decide las columnas, los campos internos (p. ej. `contrasena`) no se leen.
+- Las filas vienen de nuestra propia base de datos y su tipo lo fija la
+  columna, así que por defecto no se revalidan. Con SERIALIZACION_VALIDAR=true
+  se validan y serializan con un `TypeAdapter(list[schema])` cacheado.
+- `RespuestaJSON`: codifica con orjson si está instalado (si no, con `json`).
+
+El JSON resultante es el mismo que con `response_model`; el esquema sigue
+declarado en la ruta para la documentación de OpenAPI.
+"""
+import os
+import json
+from functools import lru_cache
+from fastapi import Response
+from pydantic import TypeAdapter
+from sqlalchemy import inspect
+
+try:
+    import orjson
+    ORJSON_DISPONIBLE = True
+except ImportError:
+    ORJSON_DISPONIBLE = False
+
+SERIALIZACION_VALIDAR = os.getenv("SERIALIZACION_VALIDAR", "false").lower() in ("1", "true", "yes", "si")
+
+
+def _por_defecto(valor):
+    # Solo para el camino sin orjson (datetime, date y time)
+    if hasattr(valor, "isoformat"):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def a_json(contenido) -> bytes:
+    if ORJSON_DISPONIBLE:
+        return orjson.dumps(contenido)
+    return json.dumps(contenido, ensure_ascii=False, separators=(",", ":"), default=_por_defecto).encode("utf-8")
+
+
+class RespuestaJSON(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return a_json(content)
+
+
+@lru_cache(maxsize=None)
+def columnas(schema, modelo) -> tuple:
+    """Atributos de columna de `modelo` que corresponden a campos de `schema`, en el orden del esquema."""
+    disponibles = inspect(modelo).column_attrs
+    return tuple(getattr(modelo, campo) for campo in schema.model_fields if campo in disponibles)
+
+
+@lru_cache(maxsize=None)
+def adaptador(schema) -> TypeAdapter:
+    return TypeAdapter(list[schema])
+
+
+def a_dicts(schema, modelo, filas) -> list:
+    """Tuplas de `columnas(schema, modelo)` -> lista de dicts listos para codificar."""
+    claves = tuple(columna.key for columna in columnas(schema, modelo))
+    return [dict(zip(claves, fila)) for fila in filas]
+
+
+def respuesta_filas(schema, modelo, filas, validar: bool = None) -> Response:
+    """Respuesta JSON de una lista de filas seleccionadas con `columnas(schema, modelo)`."""
+    datos = a_dicts(schema, modelo, filas)
+    if SERIALIZACION_VALIDAR if validar is None else validar:
+        tipo = adaptador(schema)
+        return Response(tipo.dump_json(tipo.validate_python(datos)), media_type="application/json")
+    return RespuestaJSON(datos)
@@ -0,0 +1,214 @@
+# trabajos_ia.py
+"""
+Trabajos asíncronos de análisis de IA.
+
+`encolar` guarda un trabajo en `trabajo_analisis_ia` y devuelve su id al
+momento; un pool acotado de workers asyncio (IA_TRABAJOS_WORKERS por
+proceso) reclama los trabajos pendientes (FOR UPDATE SKIP LOCKED), analiza el
+diagnóstico de la consulta y guarda el resultado en `analisis_ia` en la misma
+transacción que marca el trabajo como completado. Cerrar el navegador ya no
+pierde el análisis: el cliente solo consulta el estado del trabajo.
+
+Los errores de OpenRouter se reintentan con espera exponencial hasta
+IA_TRABAJOS_MAX_INTENTOS; una consulta inexistente o sin diagnóstico falla
+sin reintentos. Un trabajo `en_curso` cuyo reclamo caduca (proceso caído)
+se vuelve a reclamar.
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy import select, update, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, openrouter
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger("uvicorn.error")
+
+IA_TRABAJOS_WORKERS = int(os.getenv("IA_TRABAJOS_WORKERS", 4))
+IA_TRABAJOS_MAX_INTENTOS = int(os.getenv("IA_TRABAJOS_MAX_INTENTOS", 3))
+IA_TRABAJOS_REINTENTO_BASE_S = float(os.getenv("IA_TRABAJOS_REINTENTO_BASE_S", 10))
+IA_TRABAJOS_INTERVALO_S = float(os.getenv("IA_TRABAJOS_INTERVALO_S", 2))
+IA_TRABAJOS_RECLAMO_CADUCA_S = float(os.getenv("IA_TRABAJOS_RECLAMO_CADUCA_S", 300))
+
+PENDIENTE = "pendiente"
+EN_CURSO = "en_curso"
+COMPLETADO = "completado"
+FALLIDO = "fallido"
+TERMINADOS = (COMPLETADO, FALLIDO)
+
+
+class ErrorDefinitivo(Exception):
+    """El trabajo no puede completarse: no se reintenta."""
+
+
+async def encolar(db: AsyncSession, consulta_id: int) -> models.TrabajoAnalisisIA:
+    """Crea el trabajo de la consulta o devuelve el que ya esté pendiente o en curso."""
+    if await db.get(models.HistorialClinico, consulta_id) is None:
+        raise HTTPException(status_code=404, detail="Consulta no encontrada")
+    existente = (await db.execute(
+        select(models.TrabajoAnalisisIA)
+        .where(models.TrabajoAnalisisIA.consulta_id == consulta_id,
+               models.TrabajoAnalisisIA.estado.in_((PENDIENTE, EN_CURSO)))
+        .order_by(models.TrabajoAnalisisIA.id)
+    )).scalars().first()
+    if existente:
+        return existente
+    trabajo = models.TrabajoAnalisisIA(
+        consulta_id=consulta_id, estado=PENDIENTE, intentos=0, programado_para=datetime.utcnow()
+    )
+    db.add(trabajo)
+    await db.commit()
+    await db.refresh(trabajo)
+    pool_trabajos_ia.avisar()
+    return trabajo
+
+
+async def obtener(trabajo_id: int):
+    async with AsyncSessionLocal() as db:
+        return await db.get(models.TrabajoAnalisisIA, trabajo_id)
+
+
+class PoolTrabajosIA:
+    """Workers asyncio que procesan la cola `trabajo_analisis_ia`."""
+
+    def __init__(self, workers: int = IA_TRABAJOS_WORKERS):
+        self.workers = workers
+        self._tareas = []
+        self._despertar = None
+        # trabajo_id -> asyncio.Event, para las esperas de este proceso
+        self._esperas = {}
+        self.completados = 0
+        self.fallidos = 0
+
+    async def reclamar(self):
+        """Marca como en curso el trabajo vencido más antiguo y lo devuelve (o None)."""
+        ahora = datetime.utcnow()
+        caducado = ahora - timedelta(seconds=IA_TRABAJOS_RECLAMO_CADUCA_S)
+        Trabajo = models.TrabajoAnalisisIA
+        async with AsyncSessionLocal() as db:
+            async with db.begin():
+                trabajo = (await db.execute(
+                    select(Trabajo)
+                    .where(or_(
+                        and_(Trabajo.estado == PENDIENTE, Trabajo.programado_para <= ahora),
+                        and_(Trabajo.estado == EN_CURSO, Trabajo.reclamado_en < caducado),
+                    ))
+                    .order_by(Trabajo.id)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                )).scalars().first()
+                if trabajo is not None:
+                    trabajo.estado = EN_CURSO
+                    trabajo.reclamado_en = ahora
+                    trabajo.intentos += 1
+        return trabajo
+
+    async def _analizar(self, trabajo: models.TrabajoAnalisisIA):
+        async with AsyncSessionLocal() as db:
+            historial = await db.get(models.HistorialClinico, trabajo.consulta_id)
+            if historial is None:
+                raise ErrorDefinitivo("Consulta no encontrada")
+            diagnostico = (historial.diagnostico or "").strip()
+        if not diagnostico:
+            raise ErrorDefinitivo("La consulta no tiene diagnóstico")
+        try:
+            analisis, _ = await openrouter.analizar_diagnostico(diagnostico)
+        except HTTPException as e:
+            if e.status_code < 500 or e.detail == "API_KEY no configurada":
+                raise ErrorDefinitivo(e.detail)
+            raise RuntimeError(e.detail)
+        return analisis
+
+    async def procesar(self, trabajo: models.TrabajoAnalisisIA):
+        Trabajo = models.TrabajoAnalisisIA
+        try:
+            analisis = await self._analizar(trabajo)
+        except Exception as e:
+            definitivo = isinstance(e, ErrorDefinitivo) or trabajo.intentos >= IA_TRABAJOS_MAX_INTENTOS
+            logger.warning(f"Trabajo de análisis {trabajo.id} (consulta {trabajo.consulta_id}) falló: {e}")
+            if definitivo:
+                valores = {"estado": FALLIDO, "terminado_en": datetime.utcnow()}
+                self.fallidos += 1
+            else:
+                espera = IA_TRABAJOS_REINTENTO_BASE_S * 2 ** (trabajo.intentos - 1)
+                valores = {"estado": PENDIENTE, "programado_para": datetime.utcnow() + timedelta(seconds=espera)}
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(Trabajo).where(Trabajo.id == trabajo.id).values(error=str(e)[:1000], **valores))
+                await db.commit()
+        else:
+            # Resultado del trabajo y análisis de la consulta en la misma transacción
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(models.HistorialClinico)
+                    .where(models.HistorialClinico.id == trabajo.consulta_id)
+                    .values(analisis_ia=analisis)
+                )
+                await db.execute(
+                    update(Trabajo).where(Trabajo.id == trabajo.id)
+                    .values(estado=COMPLETADO, resultado=analisis, error=None, terminado_en=datetime.utcnow())
+                )
+                await db.commit()
+            self.completados += 1
+        evento = self._esperas.get(trabajo.id)
+        if evento is not None:
+            evento.set()
+
+    async def _worker(self):
+        while True:
+            try:
+                trabajo = await self.reclamar()
+                if trabajo is not None:
+                    await self.procesar(trabajo)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error en el worker de trabajos de análisis")
+            # Nada pendiente: esperar a un aviso o al siguiente intervalo
+            try:
+                await asyncio.wait_for(self._despertar.wait(), timeout=IA_TRABAJOS_INTERVALO_S)
+            except asyncio.TimeoutError:
+                pass
+            self._despertar.clear()
+
+    def avisar(self):
+        if self._despertar is not None:
+            self._despertar.set()
+
+    async def esperar(self, trabajo_id: int, timeout: float):
+        """Espera (como mucho `timeout` s) a que el trabajo termine y lo devuelve."""
+        limite = asyncio.get_running_loop().time() + timeout
+        while True:
+            trabajo = await obtener(trabajo_id)
+            restante = limite - asyncio.get_running_loop().time()
+            if trabajo is None or trabajo.estado in TERMINADOS or restante <= 0:
+                self._esperas.pop(trabajo_id, None)
+                return trabajo
+            evento = self._esperas.setdefault(trabajo_id, asyncio.Event())
+            try:
+                # Si lo procesa otro proceso no llega aviso: se vuelve a consultar cada intervalo
+                await asyncio.wait_for(evento.wait(), timeout=min(restante, IA_TRABAJOS_INTERVALO_S))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if evento.is_set():
+                    self._esperas.pop(trabajo_id, None)
+
+    def iniciar(self):
+        self._despertar = asyncio.Event()
+        self._tareas = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def detener(self):
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self._tareas = []
+        self._despertar = None
+
+    def estadisticas(self) -> dict:
+        return {"workers": len(self._tareas), "completados": self.completados, "fallidos": self.fallidos}
+
+
+pool_trabajos_ia = PoolTrabajosIA()
@@ -1,5 +1,9 @@
 from passlib.context import CryptContext
+import asyncio
+import multiprocessing
 import jwt
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
 import os
 
@@ -7,18 +11,78 @@ SECRET_KEY = os.getenv("SECRET_KEY", "tu_clave_secreta_super_segura_cambiar_en_p
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Coste de bcrypt. Los hashes con otro coste se marcan como obsoletos y se
+# regeneran de forma transparente en el siguiente login correcto.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Procesos dedicados a bcrypt y número máximo de operaciones en curso (incluidas las en cola)
+HASH_PROCESOS = int(os.getenv("HASH_PROCESOS", min(os.cpu_count() or 2, 4)))
+HASH_CONCURRENCIA = int(os.getenv("HASH_CONCURRENCIA", HASH_PROCESOS * 4))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password, hashed_password):
+    """Devuelve (valida, nuevo_hash); nuevo_hash no es None si el hash debe actualizarse."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# ==================== BCRYPT FUERA DEL EVENT LOOP ====================
+# bcrypt consume ~250 ms de CPU por llamada: se ejecuta en un pool de procesos
+# acotado para no bloquear el event loop ni el threadpool de Starlette.
+_hash_executor = None
+_hash_semaforo = None
+
+def _get_hash_executor():
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ProcessPoolExecutor(
+            max_workers=HASH_PROCESOS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _hash_executor
+
+async def _en_pool_hash(func, *args):
+    global _hash_semaforo
+    if _hash_semaforo is None:
+        _hash_semaforo = asyncio.Semaphore(HASH_CONCURRENCIA)
+    async with _hash_semaforo:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(_get_hash_executor(), func, *args)
+        except BrokenProcessPool:
+            # Un proceso del pool murió: se recrea el pool y se reintenta una vez
+            cerrar_pool_hash(semaforo=False)
+            return await loop.run_in_executor(_get_hash_executor(), func, *args)
+
+async def verify_and_update_password_async(plain_password, hashed_password):
+    return await _en_pool_hash(verify_and_update_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await _en_pool_hash(get_password_hash, password)
+
+def cerrar_pool_hash(semaforo: bool = True):
+    global _hash_executor, _hash_semaforo
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+    if semaforo:
+        _hash_semaforo = None
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    now = datetime.utcnow()
+    expire = now + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode.update({"exp": expire, "iat": now})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -0,0 +1,72 @@
+"""
+Benchmark del renderizado de correos: mensajes por segundo por plantilla.
+
+Compara las plantillas precompiladas (`email_templates`) con construir el
+mismo mensaje como árbol `MIMEMultipart` y serializarlo, que es lo que se
+hacía antes en cada envío. No envía nada ni necesita base de datos.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_email_templates [--mensajes 5000]
+"""
+import argparse
+import time
+from email import message_from_bytes
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from app.email_service import (
+    generar_mensaje_confirmacion_cita,
+    generar_mensaje_seguimiento_rutinario,
+    generar_mensaje_postoperatorio_feedback,
+)
+
+REMITENTE = "clinica@ejemplo.com"
+
+CASOS = {
+    "confirmacion_cita": lambda i: generar_mensaje_confirmacion_cita(
+        f"paciente{i}@ejemplo.com", f"Paciente {i} Pérez", "2025-06-01", "10:30", "Limpieza dental"),
+    "seguimiento_rutinario": lambda i: generar_mensaje_seguimiento_rutinario(
+        f"paciente{i}@ejemplo.com", f"Paciente {i} Pérez", "Extracción", "2_hours"),
+    "feedback_postoperatorio": lambda i: generar_mensaje_postoperatorio_feedback(
+        f"paciente{i}@ejemplo.com", f"Paciente {i} Pérez", "Extracción", 24, i),
+}
+
+
+def como_mime(mensaje, texto: str, html: str) -> bytes:
+    """Mismo contenido construido con `email.mime`, como antes de las plantillas."""
+    mime = MIMEMultipart("alternative")
+    mime["Subject"] = mensaje.asunto
+    mime["To"] = mensaje.destinatario
+    mime["From"] = REMITENTE
+    mime.attach(MIMEText(texto, "plain", "utf-8"))
+    mime.attach(MIMEText(html, "html", "utf-8"))
+    return mime.as_bytes()
+
+
+def medir(funcion, mensajes: int) -> float:
+    inicio = time.perf_counter()
+    for i in range(mensajes):
+        funcion(i)
+    return mensajes / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mensajes", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'plantilla':<26}{'plantillas msg/s':>18}{'MIMEMultipart msg/s':>22}{'x':>7}")
+    for nombre, generar in CASOS.items():
+        # Texto y HTML de referencia para el camino MIMEMultipart (fuera de la medición)
+        referencia = generar(0)
+        muestra = message_from_bytes(referencia.como_bytes(REMITENTE))
+        texto, html = (parte.get_payload(decode=True).decode("utf-8") for parte in muestra.get_payload())
+
+        rapido = medir(lambda i: generar(i).como_bytes(REMITENTE), args.mensajes)
+        # Sin coste de sustitución: solo construir y serializar el árbol MIME
+        lento = medir(lambda i: como_mime(referencia, texto, html), args.mensajes)
+        print(f"{nombre:<26}{rapido:>18,.0f}{lento:>22,.0f}{rapido / lento:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
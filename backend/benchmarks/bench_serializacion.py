@@ -0,0 +1,127 @@
+"""
+Benchmark del camino de serialización de los listados (app/serializacion.py).
+
+Siembra --filas pacientes, historiales y citas con `benchmarks.generar_datos`
+(por defecto en un SQLite temporal) y mide, para cada tabla, leer y codificar
+--filas filas de tres maneras:
+
+- orm: objetos ORM completos validados con `from_attributes`, volcados a
+  dicts y codificados con `json`, como hacía `response_model` en los listados.
+- columnas+validar: selección de las columnas del esquema como tuplas,
+  `TypeAdapter(list[schema])` cacheado y `dump_json` (SERIALIZACION_VALIDAR=true).
+- columnas: selección de columnas sin revalidar y codificación con orjson
+  (el camino por defecto).
+
+Comprueba que los tres producen el mismo JSON e imprime el mejor tiempo de
+--repeticiones, filas/s y la mejora respecto a `orm`.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_serializacion [--filas 10000] [--repeticiones 7] [--salida serializacion.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+
+def sembrar(database_url: str, filas: int):
+    subprocess.run(
+        [sys.executable, "-m", "benchmarks.generar_datos", "--database-url", database_url,
+         "--doctores", "50", "--consultorios", "10", "--pacientes", str(filas),
+         "--historiales", str(filas), "--citas", str(filas), "--feedback", "1"],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def medir(funcion, repeticiones: int):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return resultado, min(tiempos), statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="base de datos ya sembrada (por defecto, SQLite temporal sembrado aquí)")
+    parser.add_argument("--filas", type=int, default=10_000)
+    parser.add_argument("--repeticiones", type=int, default=7)
+    parser.add_argument("--salida", help="fichero JSON con los resultados")
+    args = parser.parse_args()
+
+    directorio = None
+    if not args.database_url:
+        directorio = tempfile.TemporaryDirectory()
+        args.database_url = f"sqlite:///{os.path.join(directorio.name, 'serializacion.db')}"
+        sembrar(args.database_url, args.filas)
+    # Antes de importar `app.database`, que lee la URL al cargarse
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from app import models, schemas
+    from app.database import SessionLocal
+    from app.serializacion import columnas, adaptador, respuesta_filas
+
+    def orm(modelo, schema):
+        with SessionLocal() as db:
+            objetos = db.query(modelo).order_by(modelo.id).limit(args.filas).all()
+            tipo = adaptador(schema)
+            datos = tipo.dump_python(tipo.validate_python(objetos, from_attributes=True), mode="json")
+            return json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def por_columnas(modelo, schema, validar):
+        with SessionLocal() as db:
+            filas = db.query(*columnas(schema, modelo)).order_by(modelo.id).limit(args.filas).all()
+            return respuesta_filas(schema, modelo, filas, validar=validar).body
+
+    caminos = {
+        "orm": lambda m, s: orm(m, s),
+        "columnas+validar": lambda m, s: por_columnas(m, s, True),
+        "columnas": lambda m, s: por_columnas(m, s, False),
+    }
+    tablas = {
+        "pacientes": (models.Paciente, schemas.Paciente),
+        "historiales": (models.HistorialClinico, schemas.HistorialClinico),
+        "citas": (models.Cita, schemas.Cita),
+    }
+
+    resultados = {}
+    for tabla, (modelo, schema) in tablas.items():
+        resultados[tabla] = {}
+        referencia = None
+        for camino, funcion in caminos.items():
+            cuerpo, mejor, mediana = medir(lambda: funcion(modelo, schema), args.repeticiones)
+            if referencia is None:
+                referencia = cuerpo
+            elif cuerpo != referencia:
+                sys.exit(f"{tabla}: el camino '{camino}' no produce el mismo JSON que 'orm'")
+            filas = len(json.loads(cuerpo))
+            resultados[tabla][camino] = {
+                "filas": filas,
+                "bytes": len(cuerpo),
+                "mejor_ms": round(mejor * 1000, 2),
+                "mediana_ms": round(mediana * 1000, 2),
+                "filas_s": round(filas / mejor),
+            }
+
+    print(f"{'tabla':<14}{'camino':<19}{'filas':>8}{'mejor ms':>11}{'mediana ms':>12}{'filas/s':>12}{'mejora':>9}")
+    for tabla, por_camino in resultados.items():
+        base = por_camino["orm"]["mejor_ms"]
+        for camino, r in por_camino.items():
+            r["mejora"] = round(base / r["mejor_ms"], 2)
+            print(f"{tabla:<14}{camino:<19}{r['filas']:>8,}{r['mejor_ms']:>11.1f}{r['mediana_ms']:>12.1f}"
+                  f"{r['filas_s']:>12,}{r['mejora']:>8.2f}x")
+
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump({"filas": args.filas, "resultados": resultados}, f, indent=2)
+    if directorio is not None:
+        directorio.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+"""
+Prueba de carga sin servicios externos.
+
+Arranca la aplicación contra SQLite (por defecto, en un directorio temporal)
+o contra la base de datos de --database-url, con un OpenRouter falso de
+latencia y errores configurables y un sumidero SMTP (aiosmtpd) en lugar del
+servidor de correo. Siembra doctores, pacientes, citas de hoy e historiales y
+lanza --usuarios clientes concurrentes con una mezcla realista de peticiones
+(login, check-in, listado de pacientes, crear cita, análisis de IA) durante
+--duracion segundos.
+
+Resultado en JSON (latencia p50/p95/p99 en ms, peticiones/s y códigos de
+estado por endpoint) para comparar entre commits con --comparar.
+
+Uso (desde backend/):
+    python -m benchmarks.carga [--usuarios 20] [--duracion 30] [--salida carga.json]
+    python -m benchmarks.carga --comparar base.json --salida actual.json
+    python -m benchmarks.carga --modo uvicorn          # servidor real en otro proceso
+
+Con MySQL conviene una base de datos vacía dedicada: se crean las tablas y
+se añaden los datos de prueba.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy.engine import make_url
+
+from benchmarks.servicios_falsos import OpenRouterFalso, SumideroSMTP, puerto_libre
+
+CONTRASENA = "carga-1234"
+MEZCLA_POR_DEFECTO = "login=5,checkin=15,pacientes=40,cita=25,analyze=15"
+DIAGNOSTICOS = [
+    "Caries profunda en pieza {n}",
+    "Gingivitis generalizada grado {n}",
+    "Fractura coronaria en pieza {n}",
+    "Periodontitis crónica en sector {n}",
+    "Pulpitis irreversible en pieza {n}",
+]
+
+
+def percentil(ordenadas, p: float) -> float:
+    if not ordenadas:
+        return None
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p))]
+
+
+def configurar_entorno(args, openrouter: OpenRouterFalso, smtp: SumideroSMTP) -> dict:
+    """Variables de entorno de la aplicación (antes de importar `app`)."""
+    entorno = {
+        "DATABASE_URL": args.database_url,
+        "API_KEY": "carga",
+        "OPENROUTER_URL": openrouter.url,
+        "OPENROUTER_HTTP2": "false",
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": str(smtp.puerto),
+        "SMTP_STARTTLS": "false",
+        "SMTP_USER": "",
+        "FROM_EMAIL": "clinica@carga.local",
+    }
+    os.environ.update(entorno)
+    return entorno
+
+
+def sembrar(args) -> dict:
+    """Crea las tablas y los datos de prueba; devuelve lo que necesitan los clientes."""
+    from sqlalchemy import text
+    from app import database, models
+    from app.utils import get_password_hash
+
+    database.Base.metadata.create_all(database.engine)
+    if args.database_url.startswith("sqlite"):
+        # Lecturas concurrentes con escrituras
+        with database.engine.connect() as conexion:
+            conexion.execute(text("PRAGMA journal_mode=WAL"))
+
+    ejecucion = datetime.now().strftime("%Y%m%d%H%M%S")
+    hash_contrasena = get_password_hash(CONTRASENA)
+    hoy = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+    db = database.SessionLocal()
+    try:
+        correos, doctores = [], []
+        for i in range(args.doctores):
+            correo = f"doctor{i}-{ejecucion}@carga.local"
+            db.add(models.Usuario(nombre=f"Doctor {i}", apellidos="Carga", correo_electronico=correo,
+                                  profesion="Odontólogo", contrasena=hash_contrasena))
+            doctor = models.Doctor(nombre=f"Doctor {i}", apellidos="Carga", profesion="Odontólogo",
+                                   correo_electronico=correo)
+            db.add(doctor)
+            correos.append(correo)
+            doctores.append(doctor)
+        db.flush()
+
+        pacientes = []
+        for i in range(args.pacientes):
+            pacientes.append(models.Paciente(
+                nombre=f"Paciente {i}", apellidos="Carga", edad=random.randint(5, 90),
+                telefono=f"9{ejecucion[-6:]}{i:05d}", correo_electronico=f"paciente{i}@carga.local",
+                doctor_id=random.choice(doctores).id,
+            ))
+        db.add_all(pacientes)
+        db.flush()
+
+        for paciente in pacientes:
+            db.add(models.Cita(
+                fecha_cita=hoy + timedelta(minutes=random.randrange(0, 600, 15)),
+                paciente_id=paciente.id, doctor_id=paciente.doctor_id, telefono=paciente.telefono,
+                detalle_cita="Revisión", estado="Pendiente",
+            ))
+            db.add(models.HistorialClinico(
+                paciente_id=paciente.id, doctor_id=paciente.doctor_id,
+                diagnostico=random.choice(DIAGNOSTICOS).format(n=random.randint(11, 48)),
+            ))
+        db.commit()
+        return {
+            "correos": correos,
+            "pacientes": [(p.id, p.telefono) for p in pacientes],
+        }
+    finally:
+        db.close()
+
+
+class Estadisticas:
+    def __init__(self):
+        self.latencias = {}  # endpoint -> [s]
+        self.estados = {}    # endpoint -> {codigo: n}
+        self.activa = False
+
+    def registrar(self, endpoint: str, estado, segundos: float):
+        if not self.activa:
+            return
+        self.latencias.setdefault(endpoint, []).append(segundos)
+        codigos = self.estados.setdefault(endpoint, {})
+        codigos[str(estado)] = codigos.get(str(estado), 0) + 1
+
+    def informe(self, duracion: float) -> dict:
+        endpoints = {}
+        todas = []
+        for endpoint, latencias in sorted(self.latencias.items()):
+            ordenadas = sorted(latencias)
+            todas.extend(ordenadas)
+            errores = sum(n for codigo, n in self.estados[endpoint].items() if not codigo.startswith("2"))
+            endpoints[endpoint] = {
+                "peticiones": len(ordenadas),
+                "rps": round(len(ordenadas) / duracion, 2),
+                "errores": errores,
+                "estados": self.estados[endpoint],
+                "p50_ms": round(percentil(ordenadas, 0.50) * 1000, 2),
+                "p95_ms": round(percentil(ordenadas, 0.95) * 1000, 2),
+                "p99_ms": round(percentil(ordenadas, 0.99) * 1000, 2),
+                "max_ms": round(ordenadas[-1] * 1000, 2),
+            }
+        todas.sort()
+        total = {
+            "peticiones": len(todas),
+            "rps": round(len(todas) / duracion, 2),
+            "errores": sum(e["errores"] for e in endpoints.values()),
+        }
+        if todas:
+            total.update({
+                "p50_ms": round(percentil(todas, 0.50) * 1000, 2),
+                "p95_ms": round(percentil(todas, 0.95) * 1000, 2),
+                "p99_ms": round(percentil(todas, 0.99) * 1000, 2),
+            })
+        return {"endpoints": endpoints, "total": total}
+
+
+class Usuario:
+    """Cliente virtual: elige cada petición según la mezcla y la ejecuta en bucle."""
+
+    def __init__(self, cliente: httpx.AsyncClient, datos: dict, mezcla: dict, estadisticas: Estadisticas, args):
+        self.cliente = cliente
+        self.datos = datos
+        self.estadisticas = estadisticas
+        self.args = args
+        self.acciones = list(mezcla)
+        self.pesos = [mezcla[a] for a in self.acciones]
+
+    async def login(self):
+        return await self.cliente.post("/login", data={
+            "username": random.choice(self.datos["correos"]), "password": CONTRASENA,
+        })
+
+    async def checkin(self):
+        _, telefono = random.choice(self.datos["pacientes"])
+        return await self.cliente.post("/check-in", json={"telefono": telefono})
+
+    async def pacientes(self):
+        parametros = {"limit": 50}
+        if random.random() < 0.5:
+            parametros["cursor"] = random.choice(self.datos["pacientes"])[0]
+        return await self.cliente.get("/pacientes", params=parametros)
+
+    async def cita(self):
+        paciente_id, telefono = random.choice(self.datos["pacientes"])
+        fecha = datetime.now() + timedelta(days=random.randint(3, 30), minutes=random.randrange(0, 600, 15))
+        return await self.cliente.post("/citas", json={
+            "paciente_id": paciente_id, "fecha_cita": fecha.isoformat(), "detalle_cita": "Limpieza",
+            "telefono": telefono, "correo_electronico": f"paciente{paciente_id}@carga.local",
+        })
+
+    async def analyze(self):
+        # Diagnósticos repetidos en la proporción que permita --ia-diagnosticos (aciertos de caché)
+        n = random.randrange(self.args.ia_diagnosticos)
+        diagnostico = DIAGNOSTICOS[n % len(DIAGNOSTICOS)].format(n=n)
+        return await self.cliente.post("/ia/analyze", json={"diagnostico": diagnostico})
+
+    async def ejecutar(self, hasta: float):
+        loop = asyncio.get_running_loop()
+        while loop.time() < hasta:
+            accion = random.choices(self.acciones, self.pesos)[0]
+            inicio = time.perf_counter()
+            try:
+                estado = (await getattr(self, accion)()).status_code
+            except httpx.HTTPError as e:
+                estado = type(e).__name__
+            self.estadisticas.registrar(accion, estado, time.perf_counter() - inicio)
+            if self.args.pausa_ms:
+                await asyncio.sleep(random.expovariate(1000 / self.args.pausa_ms))
+
+
+async def generar_carga(cliente: httpx.AsyncClient, datos: dict, args) -> dict:
+    mezcla = {}
+    for parte in args.mezcla.split(","):
+        nombre, _, peso = parte.partition("=")
+        if float(peso) > 0:
+            mezcla[nombre.strip()] = float(peso)
+    estadisticas = Estadisticas()
+    usuarios = [Usuario(cliente, datos, mezcla, estadisticas, args) for _ in range(args.usuarios)]
+
+    loop = asyncio.get_running_loop()
+    inicio = loop.time()
+    medicion = inicio + args.calentamiento
+    hasta = medicion + args.duracion
+    tareas = [asyncio.create_task(u.ejecutar(hasta)) for u in usuarios]
+    await asyncio.sleep(args.calentamiento)
+    estadisticas.activa = True
+    await asyncio.gather(*tareas)
+    return estadisticas.informe(loop.time() - medicion)
+
+
+async def esperar_servidor(url: str, proceso: subprocess.Popen, timeout: float = 30):
+    limite = time.monotonic() + timeout
+    async with httpx.AsyncClient() as cliente:
+        while time.monotonic() < limite:
+            if proceso.poll() is not None:
+                raise RuntimeError("uvicorn terminó al arrancar")
+            try:
+                if (await cliente.get(url + "/openapi.json")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn no respondió a tiempo")
+
+
+async def ejecutar(args) -> dict:
+    openrouter = OpenRouterFalso(args.ia_latencia_ms, args.ia_jitter_ms, args.ia_errores)
+    smtp = SumideroSMTP()
+    entorno = configurar_entorno(args, openrouter, smtp)
+    await openrouter.iniciar()
+    smtp.iniciar()
+    try:
+        datos = sembrar(args)
+        limites = httpx.Limits(max_connections=args.usuarios, max_keepalive_connections=args.usuarios)
+        timeout = httpx.Timeout(args.timeout)
+        if args.modo == "uvicorn":
+            puerto = puerto_libre()
+            url = f"http://127.0.0.1:{puerto}"
+            proceso = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(puerto),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                env={**os.environ, **entorno},
+            )
+            try:
+                await esperar_servidor(url, proceso)
+                async with httpx.AsyncClient(base_url=url, limits=limites, timeout=timeout) as cliente:
+                    informe = await generar_carga(cliente, datos, args)
+            finally:
+                proceso.terminate()
+                proceso.wait(timeout=10)
+        else:
+            from main import app
+            transporte = httpx.ASGITransport(app=app)
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transporte, base_url="http://carga", timeout=timeout) as cliente:
+                    informe = await generar_carga(cliente, datos, args)
+        # Margen para que el outbox entregue las confirmaciones pendientes
+        await asyncio.sleep(0.5)
+    finally:
+        await openrouter.detener()
+        smtp.detener()
+
+    informe["servicios"] = {
+        "openrouter_peticiones": openrouter.peticiones,
+        "openrouter_errores": openrouter.respuestas_error,
+        "smtp_mensajes": smtp.mensajes,
+    }
+    return informe
+
+
+def commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def imprimir(informe: dict, salida=sys.stderr):
+    print(f"{'endpoint':<12}{'pet.':>8}{'rps':>9}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}", file=salida)
+    for nombre, e in list(informe["endpoints"].items()) + [("TOTAL", informe["total"])]:
+        print(f"{nombre:<12}{e['peticiones']:>8}{e['rps']:>9}{e['errores']:>6}"
+              f"{e.get('p50_ms', '-'):>10}{e.get('p95_ms', '-'):>10}{e.get('p99_ms', '-'):>10}", file=salida)
+    print(f"servicios: {informe['servicios']}", file=salida)
+
+
+def comparar(base: dict, actual: dict, tolerancia: float) -> bool:
+    """Imprime la variación de p95 y rps por endpoint; False si alguno empeora más que `tolerancia`."""
+    correcto = True
+    print(f"\n{'endpoint':<12}{'p95 base':>10}{'p95 act.':>10}{'Δ p95':>9}{'rps base':>10}{'rps act.':>10}", file=sys.stderr)
+    for nombre, e in actual["endpoints"].items():
+        b = base["endpoints"].get(nombre)
+        if b is None:
+            continue
+        delta = (e["p95_ms"] - b["p95_ms"]) / b["p95_ms"] if b["p95_ms"] else 0.0
+        regresion = delta > tolerancia
+        correcto &= not regresion
+        print(f"{nombre:<12}{b['p95_ms']:>10}{e['p95_ms']:>10}{delta:>+9.0%}{b['rps']:>10}{e['rps']:>10}"
+              f"{'  REGRESIÓN' if regresion else ''}", file=sys.stderr)
+    return correcto
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modo", choices=("asgi", "uvicorn"), default="asgi",
+                        help="asgi: aplicación en este proceso (sin red); uvicorn: servidor real en otro proceso")
+    parser.add_argument("--workers", type=int, default=1, help="workers de uvicorn (--modo uvicorn)")
+    parser.add_argument("--database-url", default=None, help="por defecto, SQLite en un directorio temporal")
+    parser.add_argument("--usuarios", type=int, default=20, help="clientes concurrentes")
+    parser.add_argument("--duracion", type=float, default=30, help="segundos medidos")
+    parser.add_argument("--calentamiento", type=float, default=3, help="segundos iniciales sin medir")
+    parser.add_argument("--pausa-ms", type=float, default=0, help="pausa media entre peticiones de un cliente")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--mezcla", default=MEZCLA_POR_DEFECTO, help="pesos por acción")
+    parser.add_argument("--doctores", type=int, default=10)
+    parser.add_argument("--pacientes", type=int, default=1000)
+    parser.add_argument("--ia-latencia-ms", type=float, default=800)
+    parser.add_argument("--ia-jitter-ms", type=float, default=400)
+    parser.add_argument("--ia-errores", type=float, default=0.02, help="fracción de respuestas 503 de OpenRouter")
+    parser.add_argument("--ia-diagnosticos", type=int, default=200, help="diagnósticos distintos en /ia/analyze")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--salida", help="fichero JSON de resultados (por defecto, salida estándar)")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.15, help="empeoramiento de p95 admitido con --comparar")
+    args = parser.parse_args()
+
+    random.seed(args.semilla)
+    if args.database_url is None:
+        args.database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='carga-'), 'carga.db')}"
+
+    informe = asyncio.run(ejecutar(args))
+    resultado = {
+        "commit": commit_actual(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "parametros": {
+            **{k: v for k, v in vars(args).items() if k not in ("salida", "comparar")},
+            "database_url": make_url(args.database_url).render_as_string(hide_password=True),
+        },
+        **informe,
+    }
+    imprimir(resultado)
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        if not comparar(base, resultado, args.tolerancia):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
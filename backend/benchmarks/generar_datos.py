@@ -0,0 +1,327 @@
+"""
+Generador de datos sintéticos de la clínica para pruebas de escala.
+
+Crea doctores (con su usuario para el login), consultorios, pacientes, citas,
+historiales con diagnósticos realistas en español y feedback. El reparto es
+sesgado como en una clínica real: unos pocos doctores tienen la mayoría de
+los pacientes y unos pocos pacientes acumulan la mayoría de citas,
+historiales y feedback (Zipf con exponente --sesgo; 0 = uniforme).
+
+Las filas se generan por lotes y se insertan con INSERT multi-fila
+(executemany) a través de las tablas de `models.Base`, con los ids asignados
+aquí para no tener que leerlos de vuelta. En SQLite se desactiva la
+sincronización y en MySQL las comprobaciones de claves ajenas y unicidad
+durante la carga.
+
+Tamaño con --escala 1 (~100.000 filas): 100 doctores, 20 consultorios,
+20.000 pacientes, 40.000 citas, 30.000 historiales y 10.000 feedback;
+--escala 10 y --escala 100 (~10 millones de filas) lo multiplican.
+
+Uso (desde backend/, con DATABASE_URL o las variables DB_* del .env):
+    python -m benchmarks.generar_datos --escala 10 [--sesgo 1.1] [--lote 10000]
+    python -m benchmarks.generar_datos --database-url sqlite:////tmp/escala.db --pacientes 500000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import itertools
+from array import array
+from datetime import datetime, timedelta, time as hora
+
+from sqlalchemy import func, insert, select, text
+
+BASE = {
+    "doctores": 100,
+    "consultorios": 20,
+    "pacientes": 20_000,
+    "citas": 40_000,
+    "historiales": 30_000,
+    "feedback": 10_000,
+}
+
+NOMBRES = [
+    "María", "José", "Carmen", "Antonio", "Ana", "Manuel", "Laura", "Francisco", "Lucía", "David",
+    "Marta", "Javier", "Elena", "Daniel", "Sofía", "Carlos", "Paula", "Miguel", "Isabel", "Alejandro",
+    "Cristina", "Pablo", "Rosa", "Sergio", "Pilar", "Jorge", "Raquel", "Luis", "Teresa", "Adrián",
+]
+APELLIDOS = [
+    "García", "Rodríguez", "González", "Fernández", "López", "Martínez", "Sánchez", "Pérez", "Gómez",
+    "Martín", "Jiménez", "Ruiz", "Hernández", "Díaz", "Moreno", "Muñoz", "Álvarez", "Romero", "Alonso",
+    "Gutiérrez", "Navarro", "Torres", "Domínguez", "Vázquez", "Ramos", "Gil", "Ramírez", "Serrano",
+]
+PIEZAS = [c * 10 + u for c in (1, 2, 3, 4) for u in range(1, 9)]
+CORDALES = [18, 28, 38, 48]
+ZONAS = [
+    "sector anterosuperior", "sector anteroinferior", "sector posterosuperior derecho",
+    "sector posterosuperior izquierdo", "sector posteroinferior derecho", "sector posteroinferior izquierdo",
+    "arcada superior", "arcada inferior", "boca completa",
+]
+GRAVEDAD = ["leve", "moderada", "severa"]
+DIAGNOSTICOS = [
+    "Caries {gravedad} en pieza {pieza}",
+    "Caries interproximal en piezas {pieza} y {pieza2}",
+    "Gingivitis {gravedad} en {zona}",
+    "Periodontitis crónica {gravedad} en {zona}",
+    "Pulpitis irreversible en pieza {pieza}",
+    "Necrosis pulpar en pieza {pieza}",
+    "Absceso periapical en pieza {pieza}",
+    "Fractura coronaria no complicada en pieza {pieza}",
+    "Tercer molar incluido en pieza {cordal}",
+    "Pericoronaritis en pieza {cordal}",
+    "Bruxismo con desgaste oclusal generalizado",
+    "Maloclusión clase {clase} de Angle",
+    "Lesión cervical no cariosa en pieza {pieza}",
+    "Hipersensibilidad dentinaria en {zona}",
+    "Movilidad dental grado {grado} en pieza {pieza}",
+    "Restauración filtrada en pieza {pieza}",
+]
+HALLAZGOS = [
+    "", "", "",
+    "; sangrado al sondaje",
+    "; el paciente refiere dolor al frío",
+    "; dolor a la percusión",
+    "; acúmulo de placa y cálculo",
+    "; se observa lesión radiolúcida en la radiografía periapical",
+    "; sin antecedentes de traumatismo",
+]
+TRATAMIENTOS = [
+    "Obturación con resina compuesta", "Endodoncia", "Raspado y alisado radicular", "Profilaxis",
+    "Exodoncia", "Exodoncia quirúrgica", "Férula de descarga nocturna", "Corona de zirconio",
+    "Aplicación de barniz de flúor", "Tartrectomía", "Derivación a ortodoncia", "Control en 6 meses",
+]
+MEDICAMENTOS = [
+    None, None,
+    "Ibuprofeno 600 mg cada 8 h durante 3 días",
+    "Paracetamol 1 g cada 8 h si dolor",
+    "Amoxicilina 500 mg cada 8 h durante 7 días",
+    "Amoxicilina/ácido clavulánico 875/125 mg cada 12 h durante 7 días",
+    "Colutorio de clorhexidina al 0,12 % dos veces al día",
+    "Dexketoprofeno 25 mg cada 8 h durante 2 días",
+]
+NOTAS = [
+    None, None, "Paciente colaborador", "Revisar en la próxima cita", "Se explican instrucciones de higiene",
+    "Ansiedad dental: valorar sedación", "Alergia a penicilina referida", "Fumador",
+]
+DETALLES_CITA = ["Revisión", "Limpieza dental", "Endodoncia", "Extracción", "Empaste", "Urgencia", "Control postoperatorio"]
+
+
+def pesos_zipf(n: int, sesgo: float):
+    """Pesos acumulados de Zipf para n elementos en orden aleatorio (el rango no depende del id)."""
+    pesos = [1 / (i + 1) ** sesgo for i in range(n)]
+    random.shuffle(pesos)
+    return list(itertools.accumulate(pesos))
+
+
+def elegir(ids_inicio: int, acumulados, k: int):
+    """k ids (desde ids_inicio) elegidos según los pesos acumulados."""
+    return [ids_inicio + i for i in random.choices(range(len(acumulados)), cum_weights=acumulados, k=k)]
+
+
+def diagnostico() -> str:
+    pieza, pieza2 = random.sample(PIEZAS, 2)
+    texto = random.choice(DIAGNOSTICOS).format(
+        gravedad=random.choice(GRAVEDAD), pieza=pieza, pieza2=pieza2, zona=random.choice(ZONAS),
+        cordal=random.choice(CORDALES), clase=random.choice(("I", "II", "III")), grado=random.randint(1, 3),
+    )
+    return texto + random.choice(HALLAZGOS)
+
+
+def telefono(paciente_id: int) -> str:
+    return f"6{paciente_id:08d}"
+
+
+class Cargador:
+    """Inserta lotes de filas por tabla con una sola conexión y mide el ritmo."""
+
+    def __init__(self, engine, lote: int):
+        self.engine = engine
+        self.lote = lote
+        self.conexion = None
+        self.total = 0
+
+    def __enter__(self):
+        self.conexion = self.engine.connect()
+        dialecto = self.engine.dialect.name
+        if dialecto == "sqlite":
+            self.conexion.execute(text("PRAGMA journal_mode=WAL"))
+            self.conexion.execute(text("PRAGMA synchronous=OFF"))
+        elif dialecto == "mysql":
+            self.conexion.execute(text("SET foreign_key_checks=0, unique_checks=0"))
+        self.conexion.commit()
+        return self
+
+    def __exit__(self, *exc):
+        if self.engine.dialect.name == "mysql":
+            # La conexión vuelve al pool: se restauran las comprobaciones
+            self.conexion.rollback()
+            self.conexion.execute(text("SET foreign_key_checks=1, unique_checks=1"))
+            self.conexion.commit()
+        self.conexion.close()
+
+    def siguiente_id(self, modelo) -> int:
+        return (self.conexion.execute(select(func.max(modelo.id))).scalar() or 0) + 1
+
+    def cargar(self, modelo, filas):
+        """Inserta las filas (un iterable) en lotes de `self.lote` con commit por lote."""
+        tabla = modelo.__table__
+        inicio = time.perf_counter()
+        n = 0
+        filas = iter(filas)
+        while True:
+            bloque = list(itertools.islice(filas, self.lote))
+            if not bloque:
+                break
+            self.conexion.execute(insert(tabla), bloque)
+            self.conexion.commit()
+            n += len(bloque)
+            print(f"\r{tabla.name:<20}{n:>12,} filas", end="", file=sys.stderr)
+        segundos = time.perf_counter() - inicio
+        print(f"\r{tabla.name:<20}{n:>12,} filas {segundos:>8.1f} s {n / segundos if segundos else 0:>10,.0f} filas/s",
+              file=sys.stderr)
+        self.total += n
+        return n
+
+
+def generar(args):
+    from app import database, models
+    from app.utils import get_password_hash
+
+    database.Base.metadata.create_all(database.engine)
+    contrasena = get_password_hash(args.contrasena)
+    ahora = datetime.now().replace(second=0, microsecond=0)
+    hoy = ahora.replace(hour=0, minute=0)
+    n = {tabla: getattr(args, tabla) or int(BASE[tabla] * args.escala) for tabla in BASE}
+    inicio = time.perf_counter()
+
+    with Cargador(database.engine, args.lote) as cargador:
+        # Consultorios
+        primer_consultorio = cargador.siguiente_id(models.Consultorio)
+        cargador.cargar(models.Consultorio, (
+            {"id": primer_consultorio + i, "nombre_consultorio": f"Consultorio {primer_consultorio + i}",
+             "capacidad_doctores": random.randint(1, 6), "horario": hora(random.choice((8, 9, 10))),
+             "numero_contacto": f"91{random.randint(0, 9999999):07d}"}
+            for i in range(n["consultorios"])
+        ))
+
+        # Doctores, su usuario (para /login) y su consultorio
+        primer_doctor = cargador.siguiente_id(models.Doctor)
+        doctores = [
+            {"id": primer_doctor + i, "nombre": random.choice(NOMBRES), "apellidos": " ".join(random.sample(APELLIDOS, 2)),
+             "profesion": "Odontólogo", "telefono_celular": f"6{random.randint(0, 99999999):08d}",
+             "consultorio": f"Consultorio {primer_consultorio + i % n['consultorios']}",
+             "correo_electronico": f"doctor{primer_doctor + i}@clinica.ejemplo"}
+            for i in range(n["doctores"])
+        ]
+        cargador.cargar(models.Doctor, doctores)
+        cargador.cargar(models.Usuario, (
+            {"nombre": d["nombre"], "apellidos": d["apellidos"], "correo_electronico": d["correo_electronico"],
+             "profesion": "Odontólogo", "contrasena": contrasena, "created_at": ahora}
+            for d in doctores
+        ))
+        cargador.cargar(models.DoctorConsultorio, (
+            {"doctor_id": primer_doctor + i, "consultorio_id": primer_consultorio + i % n["consultorios"]}
+            for i in range(n["doctores"])
+        ))
+
+        # Pacientes repartidos entre doctores con sesgo; se guarda el doctor de cada uno
+        primer_paciente = cargador.siguiente_id(models.Paciente)
+        doctor_de = array("i", elegir(primer_doctor, pesos_zipf(n["doctores"], args.sesgo), n["pacientes"]))
+
+        def pacientes():
+            for i in range(n["pacientes"]):
+                paciente_id = primer_paciente + i
+                edad = random.randint(3, 92)
+                yield {
+                    "id": paciente_id, "nombre": random.choice(NOMBRES),
+                    "apellidos": " ".join(random.sample(APELLIDOS, 2)),
+                    "genero": random.choice(("Femenino", "Masculino")), "edad": edad,
+                    "its": random.random() < 0.02, "problemas_cardíacos": random.random() < 0.08,
+                    "diabetes": random.random() < 0.1, "telefono": telefono(paciente_id),
+                    "correo_electronico": f"paciente{paciente_id}@correo.ejemplo",
+                    "fecha_nacimiento": hoy - timedelta(days=365 * edad + random.randint(0, 364)),
+                    "doctor_id": doctor_de[i],
+                }
+        cargador.cargar(models.Paciente, pacientes())
+
+        # Citas, historiales y feedback concentrados en los pacientes "frecuentes"
+        acumulados = pesos_zipf(n["pacientes"], args.sesgo)
+
+        def por_paciente(total: int):
+            while total > 0:
+                k = min(args.lote, total)
+                total -= k
+                yield from elegir(primer_paciente, acumulados, k)
+
+        def citas():
+            for paciente_id in por_paciente(n["citas"]):
+                if random.random() < args.citas_hoy:
+                    fecha = hoy + timedelta(minutes=random.randrange(8 * 60, 20 * 60, 15))
+                else:
+                    fecha = hoy + timedelta(days=random.randint(-args.dias, args.dias),
+                                            minutes=random.randrange(8 * 60, 20 * 60, 15))
+                if fecha.date() < hoy.date():
+                    estado = random.choices(("Completada", "Cancelada", "No asistió"), (85, 10, 5))[0]
+                else:
+                    estado = "Pendiente"
+                yield {
+                    "fecha_cita": fecha, "paciente_id": paciente_id, "doctor_id": doctor_de[paciente_id - primer_paciente],
+                    "consultorio_id": primer_consultorio + random.randrange(n["consultorios"]),
+                    "telefono": telefono(paciente_id), "detalle_cita": random.choice(DETALLES_CITA),
+                    "correo_electronico": f"paciente{paciente_id}@correo.ejemplo", "estado": estado,
+                }
+        cargador.cargar(models.Cita, citas())
+
+        def historiales():
+            for paciente_id in por_paciente(n["historiales"]):
+                yield {
+                    "paciente_id": paciente_id, "doctor_id": doctor_de[paciente_id - primer_paciente],
+                    "diagnostico": diagnostico(), "tratamiento": random.choice(TRATAMIENTOS),
+                    "medicamento": random.choice(MEDICAMENTOS), "notas": random.choice(NOTAS),
+                }
+        cargador.cargar(models.HistorialClinico, historiales())
+
+        def feedback():
+            for paciente_id in por_paciente(n["feedback"]):
+                dolor = min(10, int(random.expovariate(0.5)))
+                yield {
+                    "paciente_id": paciente_id, "doctor_id": doctor_de[paciente_id - primer_paciente],
+                    "nivel_dolor": dolor,
+                    "control_medicacion": random.choices(("Sí", "Parcialmente", "No"), (70, 20, 10))[0],
+                    "sangrado": random.choices(("Nulo", "Mancha leve", "Activo"), (70, 25, 5))[0],
+                    "inflamacion": random.choices(("Normal", "Un poco hinchada", "Muy hinchada"), (65, 30, 5))[0],
+                    "fiebre": random.random() < 0.03, "dificultad_tragar": random.random() < 0.05,
+                    "mal_sabor": random.random() < 0.1, "entumecimiento": random.random() < 0.08,
+                    "fecha_registro": ahora - timedelta(minutes=random.randint(0, args.dias * 24 * 60)),
+                }
+        cargador.cargar(models.Feedback, feedback())
+
+    segundos = time.perf_counter() - inicio
+    print(f"{'total':<20}{cargador.total:>12,} filas {segundos:>8.1f} s {cargador.total / segundos:>10,.0f} filas/s",
+          file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="por defecto, la de la aplicación (DATABASE_URL o DB_* del .env)")
+    parser.add_argument("--escala", type=float, default=1, help="multiplicador de los tamaños base")
+    for tabla in BASE:
+        parser.add_argument(f"--{tabla}", type=int, help=f"filas de {tabla} (sustituye a la escala)")
+    parser.add_argument("--sesgo", type=float, default=1.1, help="exponente de Zipf del reparto (0 = uniforme)")
+    parser.add_argument("--citas-hoy", type=float, default=0.01, help="fracción de citas con fecha de hoy (check-in)")
+    parser.add_argument("--dias", type=int, default=365, help="las citas se reparten en ±días alrededor de hoy")
+    parser.add_argument("--lote", type=int, default=10_000, help="filas por INSERT/commit")
+    parser.add_argument("--contrasena", default="doctor-1234", help="contraseña de los usuarios de los doctores")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.database_url:
+        # Antes de importar `app.database`, que lee la URL al cargarse
+        os.environ["DATABASE_URL"] = args.database_url
+    random.seed(args.semilla)
+    generar(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Sustitutos locales de los servicios externos para los benchmarks.
+
+- `OpenRouterFalso`: servidor HTTP/1.1 (asyncio, keep-alive) que responde a
+  /api/v1/chat/completions como OpenRouter, con latencia y tasa de errores
+  configurables. Devuelve siempre un análisis JSON válido.
+- `SumideroSMTP`: servidor aiosmtpd que acepta y cuenta los correos sin
+  enviarlos (aiosmtpd está en requirements-dev.txt).
+"""
+import json
+import random
+import socket
+import asyncio
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class OpenRouterFalso:
+    def __init__(self, latencia_ms: float = 800, jitter_ms: float = 400, errores: float = 0.0, puerto: int = None):
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.errores = errores
+        self.puerto = puerto or puerto_libre()
+        self.peticiones = 0
+        self.respuestas_error = 0
+        self._servidor = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.puerto}/api/v1/chat/completions"
+
+    async def iniciar(self):
+        self._servidor = await asyncio.start_server(self._atender, "127.0.0.1", self.puerto)
+
+    async def detener(self):
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+
+    def _responder(self, cuerpo: dict):
+        modelo = cuerpo.get("model", "")
+        if cuerpo.get("stream"):
+            # Streaming no simulado: el benchmark usa /ia/analyze normal
+            return 400, {"error": {"message": "stream no soportado"}}
+        if random.random() < self.errores:
+            self.respuestas_error += 1
+            return 503, {"error": {"message": "Proveedor saturado"}}
+        analisis = {
+            "resumen": f"Análisis simulado ({modelo})",
+            "recomendaciones": ["Higiene oral diaria", "Revisión en 6 meses"],
+            "riesgos": ["Progresión de la lesión"],
+        }
+        contenido = json.dumps(analisis, ensure_ascii=False)
+        return 200, {"choices": [{"message": {"role": "assistant", "content": contenido}}]}
+
+    async def _atender(self, lector, escritor):
+        try:
+            while True:
+                linea = await lector.readline()
+                if not linea:
+                    break
+                cabeceras = {}
+                while True:
+                    cabecera = await lector.readline()
+                    if cabecera in (b"\r\n", b"\n", b""):
+                        break
+                    nombre, _, valor = cabecera.decode("latin-1").partition(":")
+                    cabeceras[nombre.strip().lower()] = valor.strip()
+                datos = await lector.readexactly(int(cabeceras.get("content-length", 0)))
+                self.peticiones += 1
+
+                latencia = max(0.0, random.gauss(self.latencia_ms, self.jitter_ms / 2)) / 1000
+                await asyncio.sleep(latencia)
+                try:
+                    estado, cuerpo = self._responder(json.loads(datos or b"{}"))
+                except json.JSONDecodeError:
+                    estado, cuerpo = 400, {"error": {"message": "JSON inválido"}}
+                salida = json.dumps(cuerpo).encode()
+                escritor.write(
+                    f"HTTP/1.1 {estado} X\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(salida)}\r\n\r\n".encode() + salida
+                )
+                await escritor.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            escritor.close()
+
+
+class SumideroSMTP:
+    def __init__(self, puerto: int = None):
+        self.puerto = puerto or puerto_libre()
+        self.mensajes = 0
+        self._controlador = None
+
+    async def handle_DATA(self, server, session, envelope):
+        self.mensajes += 1
+        return "250 OK"
+
+    def iniciar(self):
+        from aiosmtpd.controller import Controller
+        self._controlador = Controller(self, hostname="127.0.0.1", port=self.puerto)
+        self._controlador.start()
+
+    def detener(self):
+        if self._controlador is not None:
+            self._controlador.stop()
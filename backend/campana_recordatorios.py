@@ -0,0 +1,57 @@
+"""
+Envía una campaña de recordatorios de cita desde la línea de comandos.
+
+Uso:
+    python campana_recordatorios.py                          # citas de mañana
+    python campana_recordatorios.py --desde 2025-06-01 --hasta 2025-06-08
+    python campana_recordatorios.py --reanudar 3             # continúa la campaña 3
+
+Al terminar imprime el informe (enviados, fallidos, mensajes/s). Si el
+proceso se interrumpe, la campaña se puede reanudar con --reanudar.
+"""
+import sys
+import json
+import asyncio
+import argparse
+from datetime import datetime
+
+from app import campanas
+from app.email_service import cerrar_pool_smtp
+
+
+async def ejecutar(args):
+    try:
+        if args.reanudar:
+            campana_id = args.reanudar
+        else:
+            desde, hasta = campanas.ventana_manana()
+            campana = await campanas.crear_campana(args.desde or desde, args.hasta or hasta)
+            campana_id = campana.id
+            print(f"Campaña {campana_id}: {campana.total} citas entre {campana.desde} y {campana.hasta}")
+        return await campanas.ejecutar_campana(campana_id, concurrencia=args.concurrencia)
+    finally:
+        await cerrar_pool_smtp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--desde", type=datetime.fromisoformat, help="Inicio de la ventana (incluido)")
+    parser.add_argument("--hasta", type=datetime.fromisoformat, help="Fin de la ventana (excluido)")
+    parser.add_argument("--reanudar", type=int, metavar="ID", help="Reanuda una campaña existente")
+    parser.add_argument("--concurrencia", type=int, default=campanas.CAMPANA_CONCURRENCIA)
+    args = parser.parse_args()
+
+    try:
+        informe = asyncio.run(ejecutar(args))
+    except KeyboardInterrupt:
+        print("✗ Interrumpida: reanúdala con --reanudar <id>")
+        return 1
+    except ValueError as e:
+        print(f"✗ {e}")
+        return 1
+    print(json.dumps(informe, indent=2, default=str, ensure_ascii=False))
+    return 0 if informe["fallidos"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Comprueba con EXPLAIN que las consultas de las rutas calientes usan índice.
+
+Falla (código de salida 1) si alguna vuelve a recorrer la tabla completa:
+  - MySQL: fila de EXPLAIN con type = ALL sobre la tabla consultada.
+  - SQLite: EXPLAIN QUERY PLAN con "SCAN <tabla>" sin índice.
+
+Las consultas se construyen con los mismos modelos que usa la API y se
+compilan con valores literales de ejemplo. Conviene ejecutarlo contra una
+base con datos realistas (ver el generador de datos sintéticos): con tablas
+vacías MySQL puede preferir un recorrido completo aunque exista el índice.
+
+Uso:
+    python check_query_plans.py
+"""
+import sys
+from datetime import date, timedelta
+from sqlalchemy import select, text
+
+from app.database import engine
+from app import models
+
+hoy = date.today()
+
+# (descripción, tabla que debe resolverse por índice, sentencia)
+CONSULTAS_CALIENTES = [
+    (
+        "check-in: paciente por teléfono",
+        "paciente",
+        select(models.Paciente).where(models.Paciente.telefono == "5550000000"),
+    ),
+    (
+        "/pacientes/doctor/{id}",
+        "paciente",
+        select(models.Paciente).where(models.Paciente.doctor_id == 1, models.Paciente.id > 0)
+        .order_by(models.Paciente.id).limit(100),
+    ),
+    (
+        "check-in: cita de hoy del paciente",
+        "cita",
+        select(models.Cita).where(
+            models.Cita.paciente_id == 1,
+            models.Cita.fecha_cita >= hoy,
+            models.Cita.fecha_cita < hoy + timedelta(days=1),
+        ),
+    ),
+    (
+        "agenda del día (check-in en memoria)",
+        "cita",
+        select(models.Cita.id).where(
+            models.Cita.fecha_cita >= hoy,
+            models.Cita.fecha_cita < hoy + timedelta(days=1),
+        ),
+    ),
+    (
+        "/feedback/paciente/{id}",
+        "feedback",
+        select(models.Feedback).where(models.Feedback.paciente_id == 1).order_by(models.Feedback.id).limit(100),
+    ),
+    (
+        "/historiales/paciente/{id}",
+        "historial_clinico",
+        select(models.HistorialClinico).where(models.HistorialClinico.paciente_id == 1)
+        .order_by(models.HistorialClinico.id).limit(100),
+    ),
+    (
+        "login: doctor por correo",
+        "doctor",
+        select(models.Doctor.id).where(models.Doctor.correo_electronico == "doctor@ejemplo.com"),
+    ),
+]
+
+
+def compilar(stmt) -> str:
+    return str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+
+
+def recorrido_completo_mysql(connection, sql: str, tabla: str):
+    filas = connection.execute(text(f"EXPLAIN {sql}")).mappings().all()
+    for fila in filas:
+        if fila.get("table") == tabla and fila.get("type") == "ALL":
+            return f"type=ALL (possible_keys={fila.get('possible_keys')})"
+    return None
+
+
+def recorrido_completo_sqlite(connection, sql: str, tabla: str):
+    for fila in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")):
+        detalle = fila[-1]
+        if detalle.startswith(f"SCAN {tabla}") and "INDEX" not in detalle:
+            return detalle
+    return None
+
+
+def check_query_plans():
+    if engine.dialect.name == "mysql":
+        recorrido_completo = recorrido_completo_mysql
+    elif engine.dialect.name == "sqlite":
+        recorrido_completo = recorrido_completo_sqlite
+    else:
+        print(f"✗ Motor no soportado: {engine.dialect.name}")
+        return False
+
+    ok = True
+    with engine.connect() as connection:
+        for descripcion, tabla, stmt in CONSULTAS_CALIENTES:
+            problema = recorrido_completo(connection, compilar(stmt), tabla)
+            if problema:
+                ok = False
+                print(f"✗ {descripcion}: recorrido completo de '{tabla}' -> {problema}")
+            else:
+                print(f"✓ {descripcion}")
+    return ok
+
+
+if __name__ == "__main__":
+    success = check_query_plans()
+    sys.exit(0 if success else 1)
@@ -1,19 +1,47 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-import jwt
-from sqlalchemy.orm import Session
-from app.database import SessionLocal
-from app import models
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db, metricas_pool, metricas_pool_async
+from app import crud_async
 from app.models import Usuario
-from app.utils import verify_password, create_access_token, decode_access_token, SECRET_KEY, ALGORITHM
+from app.utils import (
+    create_access_token,
+    verify_and_update_password_async, get_password_hash_async, cerrar_pool_hash,
+)
+from app.auth import get_current_user, get_token_claims, Principal, TokenClaims, ROL_DOCTOR, ROL_USUARIO
 from app.routes import router as api_router
 from app.routes_ia import router as ia_router
 from app.routes_email import router as email_router
+from app.email_service import cerrar_pool_smtp
+from app.outbox import trabajador_correo
+from app.feedback_submitter import loteador_feedback
+from app import campanas, openrouter
+from app.trabajos_ia import pool_trabajos_ia
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from app.metricas import registro, lineas_de, MiddlewareMetricas
+from app.instrumentacion_sql import MiddlewareSQL
+from app.cache_ia import cache_analisis
 from app.schemas import RegisterData
-from passlib.context import CryptContext
 
-app = FastAPI(title="Proyecto API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Trabajador del outbox de correos, cliente HTTP de OpenRouter y workers de
+    # análisis de IA mientras viva la aplicación
+    trabajador_correo.iniciar()
+    openrouter.abrir_cliente()
+    pool_trabajos_ia.iniciar()
+    yield
+    await loteador_feedback.detener()
+    await pool_trabajos_ia.detener()
+    await openrouter.cerrar_cliente()
+    await trabajador_correo.detener()
+    await campanas.detener()
+    await cerrar_pool_smtp()
+    cerrar_pool_hash()
+
+app = FastAPI(title="Proyecto API", lifespan=lifespan)
 app.include_router(api_router)
 app.include_router(ia_router, prefix="/ia", tags=["ia"])
 app.include_router(email_router, prefix="/email", tags=["email"])
@@ -23,48 +51,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cursor de la siguiente página; acierto de caché de /ia/analyze; consultas SQL (SQL_DEBUG_CABECERAS)
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Cache", "X-SQL-Consultas", "X-SQL-Tiempo-Ms", "X-SQL-N-Mas-1"],
 )
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=401,
-        detail="No autorizado",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    payload = decode_access_token(token)
-    if payload is None:
-        raise credentials_exception
-    
-    email: str = payload.get("sub")
-    if email is None:
-        raise credentials_exception
-    
-    user = db.query(Usuario).filter(Usuario.correo_electronico == email).first()
-    if user is None:
-        raise credentials_exception
-    return user
+app.add_middleware(MiddlewareSQL)
+# Último en añadirse = más externo: mide también el tiempo de CORS
+app.add_middleware(MiddlewareMetricas)
 
 @app.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(Usuario).filter(Usuario.correo_electronico == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.contrasena):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    # Usuario y doctor asociado en una sola consulta
+    user, doctor_id = await crud_async.get_usuario_con_doctor(db, form_data.username)
+    if not user:
         raise HTTPException(status_code=400, detail="Credenciales incorrectas")
-    
-    # Buscar el ID del doctor asociado a este usuario
-    doctor = db.query(models.Doctor).filter(models.Doctor.correo_electronico == user.correo_electronico).first()
-    doctor_id = doctor.id if doctor else None
-
-    access_token = create_access_token(data={"sub": user.correo_electronico})
+    valida, nuevo_hash = await verify_and_update_password_async(form_data.password, user.contrasena)
+    if not valida:
+        raise HTTPException(status_code=400, detail="Credenciales incorrectas")
+    if nuevo_hash:
+        # El coste de bcrypt cambió: se guarda el hash con el coste actual
+        user.contrasena = nuevo_hash
+        await db.commit()
+
+    # doctor_id y rol viajan en el token para que las rutas no tengan que consultarlos
+    access_token = create_access_token(data={
+        "sub": user.correo_electronico,
+        "doctor_id": doctor_id,
+        "rol": ROL_DOCTOR if doctor_id else ROL_USUARIO,
+    })
     return {
         "access_token": access_token, 
         "token_type": "bearer",
@@ -77,16 +90,15 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     }
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 @app.post("/register")
-def register(data: RegisterData, db: Session = Depends(get_db)):
+async def register(data: RegisterData, db: AsyncSession = Depends(get_async_db)):
     # Verificar si ya existe
-    existing = db.query(Usuario).filter(Usuario.correo_electronico == data.correo_electronico).first()
+    existing = await crud_async.get_usuario_by_email(db, data.correo_electronico)
     if existing:
         raise HTTPException(status_code=400, detail="Usuario ya existe")
 
-    # Hashear password
-    hashed = pwd_context.hash(data.contrasena)
+    # Hashear password (en el pool de procesos de bcrypt)
+    hashed = await get_password_hash_async(data.contrasena)
 
     # Crear usuario
     nuevo = Usuario(
@@ -96,14 +108,14 @@ def register(data: RegisterData, db: Session = Depends(get_db)):
         contrasena=hashed
     )
     db.add(nuevo)
-    db.commit()
-    db.refresh(nuevo)
+    await db.commit()
+    await db.refresh(nuevo)
 
     return {"message": "Usuario creado", "id": nuevo.id, "correo": nuevo.correo_electronico}
 
 
 @app.post("/logout")
-def logout(current_user: Usuario = Depends(get_current_user)):
+def logout(current_user: Principal = Depends(get_current_user)):
     """
     Endpoint de logout. En una implementación con JWT, el logout se maneja 
     principalmente en el cliente eliminando el token. Este endpoint confirma 
@@ -113,9 +125,46 @@ def logout(current_user: Usuario = Depends(get_current_user)):
 
 
 @app.get("/protected")
-def protected_route(current_user: Usuario = Depends(get_current_user)):
+def protected_route(current_user: Principal = Depends(get_current_user)):
     return {"message": f"Hola, {current_user.nombre}. Estás autenticado."}
 
+@app.get("/me")
+def me(claims: TokenClaims = Depends(get_token_claims)):
+    """Identidad del token (correo, doctor_id y rol) sin consultar la base de datos."""
+    return {"correo_electronico": claims.sub, "doctor_id": claims.doctor_id, "rol": claims.rol}
+
+@app.get("/db/pool")
+def estado_pool():
+    """Saturación de los pools de conexiones de este worker (síncrono y asíncrono)."""
+    return [metricas_pool.instantanea(), metricas_pool_async.instantanea()]
+
+@registro.recolector
+def _metricas_pools_y_cache():
+    pools = [metricas_pool.instantanea(), metricas_pool_async.instantanea()]
+    lineas = []
+    for campo, nombre, ayuda in (
+        ("en_uso", "db_pool_conexiones_en_uso", "Conexiones del pool prestadas"),
+        ("disponibles", "db_pool_conexiones_disponibles", "Conexiones libres en el pool"),
+        ("overflow", "db_pool_overflow", "Conexiones abiertas por encima del tamaño del pool"),
+    ):
+        lineas += lineas_de(nombre, ayuda, [((p["pool"],), p[campo]) for p in pools if campo in p], ("pool",))
+    for campo, nombre, ayuda in (
+        ("checkouts", "db_pool_checkouts_total", "Conexiones prestadas por el pool"),
+        ("checkout_timeouts", "db_pool_checkout_timeouts_total", "Esperas de conexión agotadas"),
+        ("conexiones_creadas", "db_pool_conexiones_creadas_total", "Conexiones abiertas con la base de datos"),
+    ):
+        lineas += lineas_de(nombre, ayuda, [((p["pool"],), p[campo]) for p in pools], ("pool",), tipo="counter")
+    cache = cache_analisis
+    lineas += lineas_de("ia_cache_consultas_total", "Consultas a la caché de análisis de IA", [
+        (("memoria",), cache.aciertos_memoria), (("bd",), cache.aciertos_bd), (("fallo",), cache.fallos),
+    ], ("resultado",), tipo="counter")
+    return lineas
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Métricas de este worker en formato de texto de Prometheus."""
+    return PlainTextResponse(registro.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Middleware y configuración de seguridad pueden agregarse aquí
 
 if __name__ == "__main__":
@@ -0,0 +1,102 @@
+"""
+Ejecuta las migraciones versionadas de `migrations/` (NNN_descripcion.sql) en orden.
+
+Las versiones aplicadas se registran en la tabla `schema_migrations`, de modo
+que cada archivo se ejecuta una sola vez. Si una sentencia falla porque el
+objeto ya existe (columna o índice creados a mano o por un script anterior)
+se considera aplicada y se continúa.
+
+Uso:
+    python migrate.py            # aplica las migraciones pendientes
+    python migrate.py --estado   # lista aplicadas y pendientes
+"""
+import re
+import sys
+from pathlib import Path
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from app.database import engine
+
+MIGRACIONES_DIR = Path(__file__).resolve().parent / "migrations"
+PATRON_MIGRACION = re.compile(r"^(\d+)_(.+)\.sql$")
+
+# Códigos MySQL que indican que el cambio ya estaba aplicado
+ER_DUP_FIELDNAME = 1060  # Duplicate column name
+ER_DUP_KEYNAME = 1061    # Duplicate key name
+ER_TABLE_EXISTS = 1050   # Table already exists
+YA_APLICADO = {ER_DUP_FIELDNAME, ER_DUP_KEYNAME, ER_TABLE_EXISTS}
+
+
+def listar_migraciones():
+    """Devuelve [(version, nombre, ruta)] ordenadas por versión."""
+    migraciones = []
+    for ruta in MIGRACIONES_DIR.glob("*.sql"):
+        coincidencia = PATRON_MIGRACION.match(ruta.name)
+        if coincidencia:
+            migraciones.append((int(coincidencia.group(1)), coincidencia.group(2), ruta))
+    return sorted(migraciones)
+
+
+def sentencias(sql: str):
+    """Divide el archivo en sentencias, ignorando comentarios `--`."""
+    sin_comentarios = "\n".join(
+        linea for linea in sql.splitlines() if not linea.strip().startswith("--")
+    )
+    return [s.strip() for s in sin_comentarios.split(";") if s.strip()]
+
+
+def versiones_aplicadas(connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            nombre VARCHAR(255) NOT NULL,
+            aplicada_en DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    connection.commit()
+    return {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def aplicar(connection, version, nombre, ruta):
+    print(f"Aplicando {ruta.name}...")
+    for sentencia in sentencias(ruta.read_text(encoding="utf-8")):
+        try:
+            connection.execute(text(sentencia))
+        except (OperationalError, ProgrammingError) as e:
+            codigo = e.orig.args[0] if e.orig and e.orig.args else None
+            if codigo not in YA_APLICADO:
+                raise
+            print(f"  · ya aplicado, se omite: {e.orig.args[1]}")
+    connection.execute(
+        text("INSERT INTO schema_migrations (version, nombre) VALUES (:version, :nombre)"),
+        {"version": version, "nombre": nombre},
+    )
+    connection.commit()
+    print(f"✓ {ruta.name}")
+
+
+def run_migrations(solo_estado: bool = False):
+    if engine.dialect.name != "mysql":
+        print(f"✗ Las migraciones SQL son para MySQL (motor actual: {engine.dialect.name}).")
+        print("  En SQLite el esquema se crea con Base.metadata.create_all().")
+        return False
+    try:
+        with engine.connect() as connection:
+            aplicadas = versiones_aplicadas(connection)
+            for version, nombre, ruta in listar_migraciones():
+                if version in aplicadas:
+                    print(f"✓ {ruta.name} (aplicada)")
+                elif solo_estado:
+                    print(f"· {ruta.name} (pendiente)")
+                else:
+                    aplicar(connection, version, nombre, ruta)
+        return True
+    except Exception as e:
+        print(f"✗ Error ejecutando migraciones: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    success = run_migrations(solo_estado="--estado" in sys.argv)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,21 @@
+-- Migration 002: índices para las rutas calientes
+-- Se crean en línea (ALGORITHM=INPLACE, LOCK=NONE): la tabla sigue aceptando
+-- lecturas y escrituras mientras se construye cada índice.
+
+-- Check-in por teléfono
+ALTER TABLE paciente ADD INDEX ix_paciente_telefono (telefono), ALGORITHM=INPLACE, LOCK=NONE;
+
+-- /pacientes/doctor/{id} paginado por id
+ALTER TABLE paciente ADD INDEX ix_paciente_doctor_id_id (doctor_id, id), ALGORITHM=INPLACE, LOCK=NONE;
+
+-- Cita de hoy de un paciente (check-in)
+ALTER TABLE cita ADD INDEX ix_cita_paciente_id_fecha_cita (paciente_id, fecha_cita), ALGORITHM=INPLACE, LOCK=NONE;
+
+-- Feedback de un paciente
+ALTER TABLE feedback ADD INDEX ix_feedback_paciente_id_fecha_registro (paciente_id, fecha_registro), ALGORITHM=INPLACE, LOCK=NONE;
+
+-- Historiales de un paciente paginados por id
+ALTER TABLE historial_clinico ADD INDEX ix_historial_clinico_paciente_id_id (paciente_id, id), ALGORITHM=INPLACE, LOCK=NONE;
+
+-- Login: doctor asociado al usuario por correo
+ALTER TABLE doctor ADD INDEX ix_doctor_correo_electronico (correo_electronico), ALGORITHM=INPLACE, LOCK=NONE;
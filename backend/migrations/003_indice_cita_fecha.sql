@@ -0,0 +1,2 @@
+-- Migration 003: índice por fecha de cita para cargar la agenda del día (check-in en memoria)
+ALTER TABLE cita ADD INDEX ix_cita_fecha_cita (fecha_cita), ALGORITHM=INPLACE, LOCK=NONE;
@@ -0,0 +1,18 @@
+-- Migration 004: outbox de correos (confirmaciones y seguimientos programados)
+CREATE TABLE correo_saliente (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    cita_id INT NULL,
+    tipo VARCHAR(50) NOT NULL,
+    destinatario VARCHAR(300) NOT NULL,
+    datos JSON NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+    intentos INT NOT NULL DEFAULT 0,
+    programado_para DATETIME NOT NULL,
+    reclamado_en DATETIME NULL,
+    enviado_en DATETIME NULL,
+    ultimo_error TEXT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_correo_saliente_cita_id (cita_id),
+    INDEX ix_correo_saliente_estado_programado (estado, programado_para),
+    CONSTRAINT fk_correo_saliente_cita FOREIGN KEY (cita_id) REFERENCES cita(id) ON DELETE SET NULL
+) ENGINE=InnoDB;
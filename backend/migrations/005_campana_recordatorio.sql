@@ -0,0 +1,15 @@
+-- Migration 005: campañas de recordatorios de cita (progreso reanudable)
+CREATE TABLE campana_recordatorio (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    desde DATETIME NOT NULL,
+    hasta DATETIME NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'en_curso',
+    ultimo_cita_id INT NOT NULL DEFAULT 0,
+    total INT NOT NULL DEFAULT 0,
+    enviados INT NOT NULL DEFAULT 0,
+    fallidos INT NOT NULL DEFAULT 0,
+    fallos JSON NULL,
+    duracion_s DOUBLE NOT NULL DEFAULT 0,
+    iniciada_en DATETIME DEFAULT CURRENT_TIMESTAMP,
+    terminada_en DATETIME NULL
+) ENGINE=InnoDB;
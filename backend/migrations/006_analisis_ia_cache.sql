@@ -0,0 +1,13 @@
+-- Migration 006: caché persistente de análisis de IA
+CREATE TABLE analisis_ia_cache (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    clave CHAR(64) NOT NULL,
+    modelo VARCHAR(200) NOT NULL,
+    version_prompt VARCHAR(20) NOT NULL,
+    diagnostico TEXT NOT NULL,
+    resultado JSON NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    expira_en DATETIME NOT NULL,
+    UNIQUE INDEX ix_analisis_ia_cache_clave (clave),
+    INDEX ix_analisis_ia_cache_expira_en (expira_en)
+) ENGINE=InnoDB;
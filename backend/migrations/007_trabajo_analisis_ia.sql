@@ -0,0 +1,16 @@
+-- Migration 007: cola persistente de trabajos de análisis de IA
+CREATE TABLE trabajo_analisis_ia (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    consulta_id INT NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+    intentos INT NOT NULL DEFAULT 0,
+    programado_para DATETIME NOT NULL,
+    reclamado_en DATETIME NULL,
+    terminado_en DATETIME NULL,
+    resultado JSON NULL,
+    error TEXT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_trabajo_analisis_ia_consulta_id (consulta_id),
+    INDEX ix_trabajo_analisis_ia_estado_programado (estado, programado_para),
+    CONSTRAINT fk_trabajo_analisis_ia_consulta FOREIGN KEY (consulta_id) REFERENCES historial_clinico(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
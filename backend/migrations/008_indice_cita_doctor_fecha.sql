@@ -0,0 +1,2 @@
+-- Migration 008: agenda de un doctor por intervalo de fechas (/citas?doctor_id=&desde=&hasta=)
+ALTER TABLE cita ADD INDEX ix_cita_doctor_id_fecha_cita (doctor_id, fecha_cita), ALGORITHM=INPLACE, LOCK=NONE;
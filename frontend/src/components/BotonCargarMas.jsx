@@ -0,0 +1,15 @@
+// Botón "Cargar más" de los listados paginados (ver paginacion.js)
+export default function BotonCargarMas({ listado, texto = 'Cargar más' }) {
+  if (!listado.siguiente) return null;
+
+  return (
+    <button
+      type="button"
+      onClick={listado.cargarMas}
+      disabled={listado.cargando}
+      className="w-full mt-2 text-sm font-medium text-blue-600 bg-blue-50 hover:bg-blue-100 py-2 rounded-lg transition duration-150 disabled:opacity-50"
+    >
+      {listado.cargando ? 'Cargando...' : texto}
+    </button>
+  );
+}
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { 
   startOfMonth, 
   endOfMonth, 
@@ -13,17 +13,35 @@ import {
   parseISO 
 } from 'date-fns';
 import { es } from 'date-fns/locale';
+import BotonCargarMas from './BotonCargarMas';
+import { conParametros, contar, fechaLocal, useListadoPaginado } from '../paginacion';
 
 const API_URL = "http://localhost:8000";
 
+// Días que muestra la rejilla del mes: de domingo a domingo (fin exclusivo)
+const rangoVisible = (fecha) => ({
+  inicio: startOfWeek(startOfMonth(fecha), { weekStartsOn: 0 }),
+  fin: addDays(startOfWeek(endOfMonth(fecha), { weekStartsOn: 0 }), 7)
+});
+
 export default function Calendario() {
   const [currentDate, setCurrentDate] = useState(new Date());
   const [selectedDate, setSelectedDate] = useState(new Date());
   const [showModal, setShowModal] = useState(false);
-  const [citas, setCitas] = useState([]);
-  const [pacientes, setPacientes] = useState([]);
-  const [doctores, setDoctores] = useState([]);
+  const citas = useListadoPaginado();
+  const pacientes = useListadoPaginado();
+  const doctores = useListadoPaginado();
+  // Pacientes de la agenda que no están en la página cargada, pedidos por id
+  const [pacientesAgenda, setPacientesAgenda] = useState({});
+  const [estadisticas, setEstadisticas] = useState({
+    totalPacientes: 0,
+    citasEsteMes: 0,
+    citasPendientes: 0
+  });
   const [loading, setLoading] = useState(true);
+  // Mes visible también para el listener de 'citaCreada', registrado al montar
+  const mesVisible = useRef(currentDate);
+  mesVisible.current = currentDate;
 
   const [nuevaCita, setNuevaCita] = useState({
     paciente_id: '',
@@ -40,8 +58,9 @@ export default function Calendario() {
     
     // Listener para recargar cuando se crea una cita nueva
     const handleCitaCreada = (e) => {
-      console.log('✅ Nueva cita detectada:', e.detail.mensaje);
+      console.log('✅ Nueva cita detectada:', e.detail?.mensaje);
       cargarDatosIniciales();
+      cargarMes();
     };
     
     window.addEventListener('citaCreada', handleCitaCreada);
@@ -52,6 +71,11 @@ export default function Calendario() {
     };
   }, []);
 
+  // Citas y estadísticas del mes visible
+  useEffect(() => {
+    cargarMes();
+  }, [currentDate]);
+
   const getAuthHeaders = () => {
     const token = localStorage.getItem('token');
     return {
@@ -64,7 +88,6 @@ export default function Calendario() {
     try {
       setLoading(true);
       await Promise.all([
-        cargarCitas(),
         cargarPacientes(),
         cargarDoctores()
       ]);
@@ -75,54 +98,79 @@ export default function Calendario() {
     }
   };
 
+  const cargarMes = () => Promise.all([cargarCitas(), cargarEstadisticas()]);
+
   const cargarCitas = async () => {
     try {
-      const response = await fetch(`${API_URL}/citas`, {
+      // Solo las citas de los días visibles; si hay más de una página, "Cargar más"
+      const { inicio, fin } = rangoVisible(mesVisible.current);
+      const { ok } = await citas.cargar(conParametros(`${API_URL}/citas`, {
+        desde: fechaLocal(inicio),
+        hasta: fechaLocal(fin)
+      }), {
         headers: getAuthHeaders()
       });
 
-      if (!response.ok) throw new Error('Error al cargar citas');
-
-      const data = await response.json();
-      setCitas(data);
+      if (!ok) throw new Error('Error al cargar citas');
     } catch (err) {
       console.error('Error:', err);
-      setCitas([]);
+      citas.setDatos([]);
+    }
+  };
+
+  const cargarEstadisticas = async () => {
+    try {
+      const opciones = { headers: getAuthHeaders() };
+      const inicioMes = startOfMonth(mesVisible.current);
+
+      // Solo los totales (X-Total-Count), sin descargar las filas
+      const [totalPacientes, citasEsteMes, citasPendientes] = await Promise.all([
+        contar(`${API_URL}/pacientes`, opciones),
+        contar(conParametros(`${API_URL}/citas`, {
+          desde: fechaLocal(inicioMes),
+          hasta: fechaLocal(addMonths(inicioMes, 1))
+        }), opciones),
+        contar(conParametros(`${API_URL}/citas`, { desde: fechaLocal(new Date()) }), opciones)
+      ]);
+
+      setEstadisticas({
+        totalPacientes: totalPacientes ?? 0,
+        citasEsteMes: citasEsteMes ?? 0,
+        citasPendientes: citasPendientes ?? 0
+      });
+    } catch (err) {
+      console.error('Error al cargar estadísticas:', err);
     }
   };
 
   const cargarPacientes = async () => {
     try {
-      const response = await fetch(`${API_URL}/pacientes`, {
+      const { ok } = await pacientes.cargar(`${API_URL}/pacientes`, {
         headers: getAuthHeaders()
       });
 
-      if (!response.ok) throw new Error('Error al cargar pacientes');
-
-      const data = await response.json();
-      setPacientes(data);
+      if (!ok) throw new Error('Error al cargar pacientes');
     } catch (err) {
       console.error('Error:', err);
-      setPacientes([]);
+      pacientes.setDatos([]);
     }
   };
 
   const cargarDoctores = async () => {
     try {
-      const response = await fetch(`${API_URL}/doctores`, {
+      const { ok } = await doctores.cargar(`${API_URL}/doctores`, {
         headers: getAuthHeaders()
       });
 
-      if (!response.ok) throw new Error('Error al cargar doctores');
-
-      const data = await response.json();
-      setDoctores(data);
+      if (!ok) throw new Error('Error al cargar doctores');
     } catch (err) {
       console.error('Error:', err);
-      setDoctores([]);
+      doctores.setDatos([]);
     }
   };
 
+  const buscarPaciente = (id) => pacientesAgenda[id] || pacientes.datos.find(p => p.id === id);
+
   // Generar días del calendario
   const generarDiasCalendario = () => {
     const monthStart = startOfMonth(currentDate);
@@ -143,7 +191,7 @@ export default function Calendario() {
 
   // Obtener citas de un día específico
   const obtenerCitasDelDia = (fecha) => {
-    return citas.filter(cita => {
+    return citas.datos.filter(cita => {
       const fechaCita = new Date(cita.fecha_cita);
       return isSameDay(fechaCita, fecha);
     });
@@ -201,7 +249,7 @@ export default function Calendario() {
         throw new Error(errorData.detail || 'Error al crear cita');
       }
 
-      await cargarCitas();
+      await cargarMes();
       
       // Disparar evento para que Dashboard se actualice
       window.dispatchEvent(new CustomEvent('citaCreada'));
@@ -235,7 +283,7 @@ export default function Calendario() {
 
       if (!response.ok) throw new Error('Error al eliminar cita');
 
-      await cargarCitas();
+      await cargarMes();
     } catch (err) {
       alert('Error al eliminar cita: ' + err.message);
     }
@@ -243,7 +291,7 @@ export default function Calendario() {
 
   // Auto-completar datos del paciente
   const handlePacienteChange = (pacienteId) => {
-    const paciente = pacientes.find(p => p.id === parseInt(pacienteId));
+    const paciente = pacientes.datos.find(p => p.id === parseInt(pacienteId));
     if (paciente) {
       setNuevaCita({
         ...nuevaCita,
@@ -262,10 +310,26 @@ export default function Calendario() {
   const dias = generarDiasCalendario();
   const citasDelDiaSeleccionado = obtenerCitasDelDia(selectedDate);
 
-  // Calcular estadísticas
-  const totalPacientes = pacientes.length;
-  const citasEsteMes = citas.filter(c => isSameMonth(new Date(c.fecha_cita), currentDate)).length;
-  const citasPendientes = citas.filter(c => new Date(c.fecha_cita) > new Date()).length;
+  // Pedir los pacientes de la agenda del día que no estén ya cargados
+  useEffect(() => {
+    const faltantes = [...new Set(citasDelDiaSeleccionado.map(c => c.paciente_id))]
+      .filter(id => id && !buscarPaciente(id));
+    if (faltantes.length === 0) return;
+
+    Promise.all(faltantes.map(id =>
+      fetch(`${API_URL}/pacientes/${id}`, { headers: getAuthHeaders() })
+        .then(response => response.ok ? response.json() : null)
+        .catch(() => null)
+    )).then(encontrados => {
+      setPacientesAgenda(previos => {
+        const nuevos = { ...previos };
+        encontrados.filter(Boolean).forEach(paciente => { nuevos[paciente.id] = paciente; });
+        return nuevos;
+      });
+    });
+  }, [selectedDate, citas.datos]);
+
+  const { totalPacientes, citasEsteMes, citasPendientes } = estadisticas;
 
   if (loading) {
     return (
@@ -362,7 +426,7 @@ export default function Calendario() {
                 citasDelDiaSeleccionado
                   .sort((a, b) => new Date(a.fecha_cita) - new Date(b.fecha_cita))
                   .map(cita => {
-                    const paciente = pacientes.find(p => p.id === cita.paciente_id);
+                    const paciente = buscarPaciente(cita.paciente_id);
                     return (
                       <div 
                         key={cita.id} 
@@ -394,6 +458,7 @@ export default function Calendario() {
                     );
                   })
               )}
+              <BotonCargarMas listado={citas} texto="Cargar más citas del mes" />
             </div>
             
             <button 
@@ -448,12 +513,13 @@ export default function Calendario() {
                   className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
                 >
                   <option value="">Seleccione un paciente</option>
-                  {pacientes.map(paciente => (
+                  {pacientes.datos.map(paciente => (
                     <option key={paciente.id} value={paciente.id}>
                       {paciente.nombre} {paciente.apellidos}
                     </option>
                   ))}
                 </select>
+                <BotonCargarMas listado={pacientes} texto="Cargar más pacientes" />
               </div>
 
               <div>
@@ -466,12 +532,13 @@ export default function Calendario() {
                   className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
                 >
                   <option value="">Sin asignar</option>
-                  {doctores.map(doctor => (
+                  {doctores.datos.map(doctor => (
                     <option key={doctor.id} value={doctor.id}>
                       {doctor.nombre} {doctor.apellidos} - {doctor.profesion}
                     </option>
                   ))}
                 </select>
+                <BotonCargarMas listado={doctores} texto="Cargar más doctores" />
               </div>
 
               <div>
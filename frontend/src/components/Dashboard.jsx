@@ -1,12 +1,26 @@
 import { useNavigate } from 'react-router-dom';
 import { useState, useEffect } from 'react';
 import NuevaConsulta from './pop-ups/NuevaConsulta';
+import BotonCargarMas from './BotonCargarMas';
+import { conParametros, contar, fechaLocal, useListadoPaginado } from '../paginacion';
 
 const API_URL = import.meta.env.VITE_API_URL || "http://localhost:8000";
 
+const inicioDelDia = (fecha) => {
+  const inicio = new Date(fecha);
+  inicio.setHours(0, 0, 0, 0);
+  return inicio;
+};
+
+const sumarDias = (fecha, dias) => {
+  const resultado = new Date(fecha);
+  resultado.setDate(resultado.getDate() + dias);
+  return resultado;
+};
+
 export default function Dashboard() {
   const navigate = useNavigate();
-  const [citasHoy, setCitasHoy] = useState([]);
+  const citasHoy = useListadoPaginado();
   const [pacienteSeleccionado, setPacienteSeleccionado] = useState(null);
   const [loading, setLoading] = useState(true);
   const [showModalNuevaCita, setShowModalNuevaCita] = useState(false);
@@ -73,43 +87,34 @@ export default function Dashboard() {
       const user = userStr ? JSON.parse(userStr) : null;
       const doctorId = user?.doctor_id;
 
-      let url = `${API_URL}/citas`;
-      // Si tenemos doctorId, podriamos filtrar en backend, 
-      // pero por ahora filtramos en frontend para no romper otros componentes
+      // Citas de hoy filtradas en el servidor (por doctor y por fecha)
+      const hoy = inicioDelDia(new Date());
+      const url = conParametros(`${API_URL}/citas`, {
+        desde: fechaLocal(hoy),
+        hasta: fechaLocal(sumarDias(hoy, 1)),
+        doctor_id: doctorId
+      });
 
-      const response = await fetch(url, {
+      const { ok, datos } = await citasHoy.cargar(url, {
         headers: getAuthHeaders()
       });
 
-      if (!response.ok) throw new Error('Error al cargar citas');
-
-      let todasCitas = await response.json();
-      console.log("Citas raw del servidor:", todasCitas.map(c => ({ id: c.id, estado: c.estado })));
-
-      // FILTRADO POR DOCTOR
-      if (doctorId) {
-        todasCitas = todasCitas.filter(cita => cita.doctor_id === doctorId);
-      }
-
-      // Filtrar citas de hoy
-      const hoy = new Date().toISOString().split('T')[0];
-      const citasDeHoy = todasCitas.filter(cita => {
-        const fechaCita = new Date(cita.fecha_cita).toISOString().split('T')[0];
-        return fechaCita === hoy;
-      }).sort((a, b) => new Date(a.fecha_cita) - new Date(b.fecha_cita));
-
-      setCitasHoy(citasDeHoy);
+      if (!ok) throw new Error('Error al cargar citas');
 
       // Cargar datos del primer paciente si hay citas
+      const citasDeHoy = ordenarPorHora(datos);
       if (citasDeHoy.length > 0) {
         await cargarDatosPaciente(citasDeHoy[0].paciente_id);
       }
     } catch (err) {
       console.error('Error:', err);
-      setCitasHoy([]);
+      citasHoy.setDatos([]);
     }
   };
 
+  const ordenarPorHora = (citas) =>
+    [...citas].sort((a, b) => new Date(a.fecha_cita) - new Date(b.fecha_cita));
+
   const getEstadoCita = (cita) => {
     // en sala de espera/confirmado
     const estadoActual = cita.estado ? cita.estado.trim() : "";
@@ -156,57 +161,30 @@ export default function Dashboard() {
       const userStr = localStorage.getItem('user');
       const user = userStr ? JSON.parse(userStr) : null;
       const doctorId = user?.doctor_id;
+      const opciones = { headers: getAuthHeaders() };
 
-      // Cargar pacientes
-      let urlPacientes = `${API_URL}/pacientes`;
-      if (doctorId) {
-        urlPacientes = `${API_URL}/pacientes/doctor/${doctorId}`;
-      }
+      // Solo se piden los totales (X-Total-Count), no las filas
+      const urlPacientes = doctorId ? `${API_URL}/pacientes/doctor/me` : `${API_URL}/pacientes`;
 
-      const pacientesResponse = await fetch(urlPacientes, {
-        headers: getAuthHeaders()
+      const hoy = inicioDelDia(new Date());
+      const inicioSemana = sumarDias(hoy, -hoy.getDay());
+      const citasEntre = (desde, hasta) => conParametros(`${API_URL}/citas`, {
+        desde: fechaLocal(desde),
+        hasta: fechaLocal(hasta),
+        doctor_id: doctorId
       });
 
-      if (pacientesResponse.ok) {
-        const pacientes = await pacientesResponse.json();
-
-        // Cargar todas las citas
-        const citasResponse = await fetch(`${API_URL}/citas`, {
-          headers: getAuthHeaders()
-        });
-
-        if (citasResponse.ok) {
-          let todasCitas = await citasResponse.json();
-
-          // FILTRADO POR DOCTOR
-          if (doctorId) {
-            todasCitas = todasCitas.filter(cita => cita.doctor_id === doctorId);
-          }
-
-          const hoy = new Date();
-          const inicioSemana = new Date(hoy);
-          inicioSemana.setDate(hoy.getDate() - hoy.getDay());
-          const finSemana = new Date(inicioSemana);
-          finSemana.setDate(inicioSemana.getDate() + 6);
-
-          const citasSemana = todasCitas.filter(cita => {
-            const fechaCita = new Date(cita.fecha_cita);
-            return fechaCita >= inicioSemana && fechaCita <= finSemana;
-          });
-
-          const citasHoyCount = todasCitas.filter(cita => {
-            const fechaCita = new Date(cita.fecha_cita).toISOString().split('T')[0];
-            const hoyStr = hoy.toISOString().split('T')[0];
-            return fechaCita === hoyStr;
-          });
-
-          setEstadisticas({
-            totalPacientes: pacientes.length,
-            citasHoy: citasHoyCount.length,
-            citasSemana: citasSemana.length
-          });
-        }
-      }
+      const [totalPacientes, citasHoyCount, citasSemana] = await Promise.all([
+        contar(urlPacientes, opciones),
+        contar(citasEntre(hoy, sumarDias(hoy, 1)), opciones),
+        contar(citasEntre(inicioSemana, sumarDias(inicioSemana, 7)), opciones)
+      ]);
+
+      setEstadisticas({
+        totalPacientes: totalPacientes ?? 0,
+        citasHoy: citasHoyCount ?? 0,
+        citasSemana: citasSemana ?? 0
+      });
     } catch (err) {
       console.error('Error al cargar estadísticas:', err);
     }
@@ -321,7 +299,7 @@ export default function Dashboard() {
           </div>
 
           <div className="space-y-4">
-            {citasHoy.length === 0 ? (
+            {citasHoy.datos.length === 0 ? (
               <div className="bg-white p-8 rounded-lg shadow-md text-center">
                 <svg xmlns="http://www.w3.org/2000/svg" className="h-16 w-16 text-gray-300 mx-auto mb-4" fill="none" viewBox="0 0 24 24" stroke="currentColor">
                   <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M8 7V3m8 4V3m-9 8h10M5 21h14a2 2 0 002-2V7a2 2 0 00-2-2H5a2 2 0 00-2 2v12a2 2 0 002 2z" />
@@ -335,7 +313,7 @@ export default function Dashboard() {
                 </button>
               </div>
             ) : (
-              citasHoy.map((cita) => {
+              ordenarPorHora(citasHoy.datos).map((cita) => {
                 // Llamamos función para obtener estado
                 const { texto, color } = getEstadoCita(cita);
 
@@ -379,6 +357,7 @@ export default function Dashboard() {
                 );
               })
             )}
+            <BotonCargarMas listado={citasHoy} texto="Cargar más citas" />
           </div>
         </section>
 
@@ -483,8 +462,8 @@ export default function Dashboard() {
 
 // Componente para el formulario de nueva cita
 function FormularioNuevaCita({ onCitaCreada, onCancelar }) {
-  const [pacientes, setPacientes] = useState([]);
-  const [doctores, setDoctores] = useState([]);
+  const pacientes = useListadoPaginado();
+  const doctores = useListadoPaginado();
   const [formData, setFormData] = useState({
     paciente_id: '',
     doctor_id: '',
@@ -508,20 +487,11 @@ function FormularioNuevaCita({ onCitaCreada, onCancelar }) {
 
   const cargarPacientesYDoctores = async () => {
     try {
-      const [pacientesRes, doctoresRes] = await Promise.all([
-        fetch(`${API_URL}/pacientes`, { headers: getAuthHeaders() }),
-        fetch(`${API_URL}/doctores`, { headers: getAuthHeaders() })
+      // Primera página de cada lista; el resto con "Cargar más"
+      await Promise.all([
+        pacientes.cargar(`${API_URL}/pacientes`, { headers: getAuthHeaders() }),
+        doctores.cargar(`${API_URL}/doctores`, { headers: getAuthHeaders() })
       ]);
-
-      if (pacientesRes.ok) {
-        const pacientesData = await pacientesRes.json();
-        setPacientes(pacientesData);
-      }
-
-      if (doctoresRes.ok) {
-        const doctoresData = await doctoresRes.json();
-        setDoctores(doctoresData);
-      }
     } catch (err) {
       console.error('Error al cargar datos:', err);
     }
@@ -570,7 +540,7 @@ function FormularioNuevaCita({ onCitaCreada, onCancelar }) {
 
     // Auto-llenar teléfono y correo cuando se selecciona un paciente
     if (name === 'paciente_id' && value) {
-      const paciente = pacientes.find(p => p.id === parseInt(value));
+      const paciente = pacientes.datos.find(p => p.id === parseInt(value));
       if (paciente) {
         setFormData(prev => ({
           ...prev,
@@ -595,12 +565,13 @@ function FormularioNuevaCita({ onCitaCreada, onCancelar }) {
           className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
         >
           <option value="">Seleccionar paciente</option>
-          {pacientes.map(paciente => (
+          {pacientes.datos.map(paciente => (
             <option key={paciente.id} value={paciente.id}>
               {paciente.nombre} {paciente.apellidos}
             </option>
           ))}
         </select>
+        <BotonCargarMas listado={pacientes} texto="Cargar más pacientes" />
       </div>
 
       <div>
@@ -615,12 +586,13 @@ function FormularioNuevaCita({ onCitaCreada, onCancelar }) {
           className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
         >
           <option value="">Seleccionar doctor</option>
-          {doctores.map(doctor => (
+          {doctores.datos.map(doctor => (
             <option key={doctor.id} value={doctor.id}>
               Dr. {doctor.usuario?.nombre} {doctor.usuario?.apellidos}
             </option>
           ))}
         </select>
+        <BotonCargarMas listado={doctores} texto="Cargar más doctores" />
       </div>
 
       <div>
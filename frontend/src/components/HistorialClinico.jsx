@@ -3,6 +3,8 @@ import { useNavigate, useLocation } from 'react-router-dom';
 import AnalisisIA from './pop-ups/AnalisisIA';
 import NuevaConsulta from './pop-ups/NuevaConsulta';
 import NuevoPaciente from './pop-ups/NuevoPaciente';
+import BotonCargarMas from './BotonCargarMas';
+import { useListadoPaginado } from '../paginacion';
 import EditarPaciente from './pop-ups/EditarPaciente';
 
 const API_URL = "http://localhost:8000";
@@ -12,9 +14,12 @@ export default function HistorialClinico() {
   const location = useLocation();
   const [showModalAnalisisIA, setShowModalAnalisisIA] = useState(false);
   const [consultaAnalisis, setConsultaAnalisis] = useState(null);
-  const [pacientes, setPacientes] = useState([]);
+  // Listados paginados: primera página al cargar, el resto con "Cargar más"
+  const listaPacientes = useListadoPaginado();
+  const pacientes = listaPacientes.datos;
   const [pacienteSeleccionado, setPacienteSeleccionado] = useState(null);
-  const [historiales, setHistoriales] = useState([]);
+  const listaHistoriales = useListadoPaginado();
+  const historiales = listaHistoriales.datos;
   const [showModalConsulta, setShowModalConsulta] = useState(false);
   const [showModalPaciente, setShowModalPaciente] = useState(false);
   const [showModalEditarPaciente, setShowModalEditarPaciente] = useState(false);
@@ -123,14 +128,11 @@ export default function HistorialClinico() {
   const cargarPacientes = async () => {
     try {
       setLoading(true);
-      const response = await fetch(`${API_URL}/pacientes`, {
+      const { ok, datos: data } = await listaPacientes.cargar(`${API_URL}/pacientes`, {
         headers: getAuthHeaders()
       });
 
-      if (!response.ok) throw new Error('Error al cargar pacientes');
-
-      const data = await response.json();
-      setPacientes(data);
+      if (!ok) throw new Error('Error al cargar pacientes');
       
       if (data.length > 0 && !pacienteSeleccionado) {
         setPacienteSeleccionado(data[0]);
@@ -145,17 +147,14 @@ export default function HistorialClinico() {
 
   const cargarHistoriales = async (pacienteId) => {
     try {
-      const response = await fetch(`${API_URL}/historiales/paciente/${pacienteId}`, {
+      const { ok } = await listaHistoriales.cargar(`${API_URL}/historiales/paciente/${pacienteId}`, {
         headers: getAuthHeaders()
       });
 
-      if (!response.ok) throw new Error('Error al cargar historiales');
-
-      const data = await response.json();
-      setHistoriales(data);
+      if (!ok) throw new Error('Error al cargar historiales');
     } catch (err) {
       console.error('Error:', err);
-      setHistoriales([]);
+      listaHistoriales.setDatos([]);
     }
   };
 
@@ -404,6 +403,7 @@ export default function HistorialClinico() {
                   </div>
                 ))
               )}
+              <BotonCargarMas listado={listaPacientes} texto="Cargar más pacientes" />
             </div>
           </div>
         </section>
@@ -513,6 +513,7 @@ export default function HistorialClinico() {
                     </div>
                   ))
                 )}
+                <BotonCargarMas listado={listaHistoriales} texto="Cargar más consultas" />
               </div>
             </>
           ) : (
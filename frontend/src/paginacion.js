@@ -0,0 +1,98 @@
+import { useCallback, useRef, useState } from 'react';
+
+// Los listados del backend están paginados: cada respuesta llena trae en
+// `X-Next-Cursor` el id desde el que sigue la siguiente página. Se carga una
+// página y las demás solo cuando el usuario las pide ("Cargar más"); los
+// contadores se piden con `total=true` y leen `X-Total-Count`, sin descargar filas.
+export const LIMITE_PAGINA = 100;
+
+// Una página del listado: { ok, datos, siguiente, total }
+export async function obtenerPagina(url, opciones = {}, { cursor = null, limite = LIMITE_PAGINA, total = false } = {}) {
+  const pagina = new URL(url);
+  pagina.searchParams.set('limit', limite);
+  if (cursor !== null) pagina.searchParams.set('cursor', cursor);
+  if (total) pagina.searchParams.set('total', 'true');
+
+  const response = await fetch(pagina, opciones);
+  if (!response.ok) {
+    return { ok: false, response, datos: [], siguiente: null, total: null };
+  }
+  const cabeceraTotal = response.headers.get('X-Total-Count');
+  return {
+    ok: true,
+    datos: await response.json(),
+    siguiente: response.headers.get('X-Next-Cursor'),
+    total: cabeceraTotal === null ? null : parseInt(cabeceraTotal, 10),
+  };
+}
+
+// Número de filas del listado (con sus filtros), o null si falla la petición
+export async function contar(url, opciones = {}) {
+  const { ok, total } = await obtenerPagina(url, opciones, { limite: 1, total: true });
+  return ok ? total : null;
+}
+
+// URL con los filtros indicados (se omiten los nulos o vacíos)
+export function conParametros(url, parametros) {
+  const conFiltros = new URL(url);
+  for (const [nombre, valor] of Object.entries(parametros)) {
+    if (valor !== null && valor !== undefined && valor !== '') conFiltros.searchParams.set(nombre, valor);
+  }
+  return conFiltros.toString();
+}
+
+// Fecha local sin zona horaria ("2025-01-31T00:00:00"), como se guarda `fecha_cita`
+export function fechaLocal(fecha) {
+  const dos = (n) => String(n).padStart(2, '0');
+  return `${fecha.getFullYear()}-${dos(fecha.getMonth() + 1)}-${dos(fecha.getDate())}` +
+    `T${dos(fecha.getHours())}:${dos(fecha.getMinutes())}:${dos(fecha.getSeconds())}`;
+}
+
+// Estado de un listado paginado: `cargar` pide la primera página de una URL y
+// `cargarMas` añade la siguiente. Si llega la respuesta de una URL que ya no
+// es la actual (p. ej. se cambió de mes en el calendario) se descarta.
+export function useListadoPaginado() {
+  const [datos, setDatos] = useState([]);
+  const [siguiente, setSiguiente] = useState(null);
+  const [total, setTotal] = useState(null);
+  const [cargando, setCargando] = useState(false);
+  const actual = useRef({ url: null, opciones: {}, siguiente: null });
+
+  const cargar = useCallback(async (url, opciones = {}, { conTotal = false } = {}) => {
+    actual.current = { url, opciones, siguiente: null };
+    setCargando(true);
+    try {
+      const pagina = await obtenerPagina(url, opciones, { total: conTotal });
+      if (actual.current.url !== url) return pagina;
+      if (pagina.ok) {
+        actual.current.siguiente = pagina.siguiente;
+        setDatos(pagina.datos);
+        setSiguiente(pagina.siguiente);
+        setTotal(pagina.total);
+      }
+      return pagina;
+    } finally {
+      setCargando(false);
+    }
+  }, []);
+
+  const cargarMas = useCallback(async () => {
+    const { url, opciones, siguiente: cursor } = actual.current;
+    if (!url || !cursor) return null;
+    setCargando(true);
+    try {
+      const pagina = await obtenerPagina(url, opciones, { cursor });
+      if (actual.current.url !== url || actual.current.siguiente !== cursor) return pagina;
+      if (pagina.ok) {
+        actual.current.siguiente = pagina.siguiente;
+        setDatos(previos => [...previos, ...pagina.datos]);
+        setSiguiente(pagina.siguiente);
+      }
+      return pagina;
+    } finally {
+      setCargando(false);
+    }
+  }, []);
+
+  return { datos, setDatos, siguiente, total, cargando, cargar, cargarMas };
+}